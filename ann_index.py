@@ -0,0 +1,199 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from retrieval import VectorIndex, normalize_rows, top_k
+from store_format import DEFAULT_STORE_DIR, load_npz, load_store
+
+# 이 크기 이상의 카탈로그에서만 근사 최근접 이웃(ANN) 인덱스를 만들고 사용합니다.
+ANN_MIN_CATALOG_SIZE = 50_000
+ANN_INDEX_PATH = 'ann_index.npz'
+
+# 재현율/지연시간 조절 파라미터 기본값
+DEFAULT_NPROBE = 8          # 질의마다 살펴볼 클러스터 수 (클수록 정확하지만 느림)
+KMEANS_ITERATIONS = 20
+TRAIN_POINTS_PER_LIST = 256  # 클러스터 하나당 학습에 사용할 최대 샘플 수
+ASSIGN_CHUNK_SIZE = 65_536
+
+
+def default_nlist(n_vectors):
+    """카탈로그 크기에 맞는 기본 클러스터 수(약 4·√N)를 반환합니다."""
+    return max(1, min(n_vectors, int(4 * np.sqrt(n_vectors))))
+
+
+def _assign(vectors, centroids):
+    """
+    각 벡터를 가장 가까운(내적이 가장 큰) 중심점에 배정합니다.
+    vectors는 float32 배열 또는 VectorIndex이며, 메모리 사용을 줄이기 위해 나눠서 계산합니다.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        stop = min(start + ASSIGN_CHUNK_SIZE, len(vectors))
+        if isinstance(vectors, VectorIndex):
+            chunk = vectors.rows(slice(start, stop))
+        else:
+            chunk = vectors[start:stop]
+        assignments[start:stop] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vector_index, nlist, n_iter=KMEANS_ITERATIONS, seed=0):
+    """정규화된 벡터에 대해 구면(spherical) k-means를 수행하여 클러스터 중심점을 학습합니다."""
+    rng = np.random.default_rng(seed)
+    n = len(vector_index)
+    train_size = min(n, nlist * TRAIN_POINTS_PER_LIST)
+    sample_rows = np.sort(rng.choice(n, size=train_size, replace=False)) if train_size < n else slice(None)
+    sample = vector_index.rows(sample_rows)
+
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        # 비어 있는 클러스터는 임의의 샘플로 다시 초기화합니다.
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    IVF(Inverted File) 방식의 근사 최근접 이웃 인덱스입니다.
+    벡터를 nlist개의 클러스터로 나눠 두고, 질의 시에는 가장 가까운 nprobe개 클러스터 안의 책만 정확히 점수를 계산합니다.
+    클러스터별 책 목록은 (list_offsets, list_ids) CSR 형태의 배열로 보관합니다.
+    """
+
+    def __init__(self, vector_index, centroids, list_offsets, list_ids, nprobe=DEFAULT_NPROBE):
+        self.vector_index = vector_index
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_ids = np.asarray(list_ids, dtype=np.int64)
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return len(self.vector_index)
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, vector_index, nlist=None, n_iter=KMEANS_ITERATIONS, seed=0, nprobe=DEFAULT_NPROBE):
+        """VectorIndex의 정규화된 행렬로부터 IVF 인덱스를 생성합니다."""
+        nlist = nlist or default_nlist(len(vector_index))
+        centroids = train_centroids(vector_index, nlist, n_iter=n_iter, seed=seed)
+        assignments = _assign(vector_index, centroids)
+
+        list_ids = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(vector_index, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    def save(self, path=ANN_INDEX_PATH):
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids)
+
+    @classmethod
+    def load(cls, vector_index, path=ANN_INDEX_PATH, nprobe=DEFAULT_NPROBE):
+        """저장된 인덱스 파일을 불러옵니다. 인덱스가 현재 카탈로그와 맞지 않으면 ValueError를 발생시킵니다."""
+        data = load_npz(path)
+        index = cls(vector_index, data['centroids'], data['list_offsets'], data['list_ids'], nprobe=nprobe)
+        if len(index.list_ids) != len(vector_index) or index.centroids.shape[1] != vector_index.dim:
+            raise ValueError(f"'{path}' 인덱스가 현재 임베딩 행렬과 일치하지 않습니다. build_vector_store.py를 다시 실행해주세요.")
+        return index
+
+    def _candidates(self, query, nprobe):
+        probe = top_k(self.centroids @ query, nprobe)
+        return np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe])
+
+    def search(self, queries, k=5, nprobe=None, subset=None):
+        """
+        VectorIndex.search와 같은 형태로 (indices, scores)를 반환합니다.
+        subset(행 번호 배열)을 넘기면 탐색한 클러스터의 후보 중 subset에 속한 책만 점수를 계산합니다.
+        후보가 k개보다 적으면 남는 자리는 인덱스 -1, 점수 -inf로 채웁니다.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = normalize_rows(np.asarray(queries, dtype=np.float32))
+        single = queries.ndim == 1
+        if single:
+            queries = queries[np.newaxis, :]
+
+        allowed = None
+        if subset is not None:
+            allowed = np.zeros(len(self.vector_index), dtype=bool)
+            allowed[np.asarray(subset, dtype=np.int64)] = True
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for row, query in enumerate(queries):
+            candidates = self._candidates(query, nprobe)
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            candidate_scores = self.vector_index.rows(candidates) @ query
+            best = top_k(candidate_scores, k)
+            indices[row, :len(best)] = candidates[best]
+            scores[row, :len(best)] = candidate_scores[best]
+
+        if single:
+            return indices[0], scores[0]
+        return indices, scores
+
+
+def recall_report(ann_index, queries, k=5, nprobe_values=(1, 2, 4, 8, 16, 32, 64)):
+    """
+    nprobe 설정별로 정확 검색 대비 recall@k와 질의당 평균 지연시간을 측정합니다.
+    배포 환경마다 재현율과 지연시간 사이에서 적절한 nprobe를 고르는 데 사용합니다.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+
+    start = time.perf_counter()
+    exact_indices, _ = ann_index.vector_index.search(queries, k=k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = []
+    for nprobe in nprobe_values:
+        if nprobe > ann_index.nlist:
+            break
+        start = time.perf_counter()
+        approx_indices, _ = ann_index.search(queries, k=k, nprobe=nprobe)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx_indices, exact_indices))
+        report.append({
+            'nprobe': nprobe,
+            f'recall@{k}': hits / exact_indices.size,
+            'latency_ms': elapsed_ms,
+            'exact_latency_ms': exact_ms,
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN 인덱스의 재현율/지연시간 리포트를 출력합니다.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--queries', type=int, default=200, help="카탈로그에서 뽑아 노이즈를 섞을 질의 수")
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('-k', type=int, default=5)
+    args = parser.parse_args()
+
+    store = load_store(args.store)
+    vector_index = store.index()
+    ann_index = IVFIndex.load(vector_index, os.path.join(store.path, ANN_INDEX_PATH))
+
+    rng = np.random.default_rng(0)
+    picked = vector_index.rows(rng.choice(len(vector_index), size=min(args.queries, len(vector_index)), replace=False))
+    queries = picked + rng.normal(scale=args.noise, size=picked.shape).astype(np.float32)
+
+    print(f"카탈로그 {len(vector_index):,}권, 클러스터 {ann_index.nlist:,}개, 질의 {len(queries)}개")
+    for row in recall_report(ann_index, queries, k=args.k):
+        print(f"nprobe={row['nprobe']:>3}  recall@{args.k}={row[f'recall@{args.k}']:.3f}  "
+              f"{row['latency_ms']:.2f} ms/질의 (정확 검색 {row['exact_latency_ms']:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+JSONL 질의 파일로 여러 창업가의 추천을 한 번에 만드는 배치 실행기입니다. (코호트 입소 등)
+
+    python batch_recommend.py cohort.jsonl -o cohort_results.jsonl --concurrency 8
+
+입력 파일은 한 줄에 요청 하나입니다.
+    {"id": "founder-001", "growth_stage": "아이디어 검증", "challenge": "마케팅/영업", "user_problem": "...", "style": "ranked"}
+  - id가 없으면 줄 번호("line-12")를 ID로 씁니다. growth_stage 대신 stage 키도 받습니다.
+  - style은 'ranked'(기본값, new_app.py 형식) 또는 'single'(app.py 형식)입니다.
+
+출력 파일도 한 줄에 결과 하나입니다. {"id", "stage", "challenge", "style", "status", "source", "notice", "recommendation", "error", "request_id"}
+결과는 추천이 끝나는 대로 한 줄씩 추가하고 바로 flush하므로, 중간에 멈춘 뒤 같은 명령을 다시 실행하면
+status가 'ok'인 ID는 건너뛰고 나머지만 처리합니다. 같은 ID가 여러 줄 있으면 마지막 줄이 최종 결과입니다.
+
+요청을 chunk_size개씩 묶어 고민 문장은 한 번에 임베딩하고, 검색은 같은 (단계, 과제)끼리 행렬 곱 한 번으로 한 뒤,
+LLM 생성만 최대 concurrency개씩 동시에 진행합니다. (engine.RecommendationEngine.recommend_batch)
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from book_matrix import CHALLENGES, STAGES
+from engine import LLM_MAX_CONCURRENCY, RECOMMENDATION_STYLES, RecommendationEngine
+from resources import load_api_key
+from store_format import DEFAULT_STORE_DIR
+
+# 한 번에 임베딩/검색할 요청 수. 청크 점수 행렬이 (요청 수 × 청크 수)이므로 메모리 사용량도 이 값에 비례합니다.
+DEFAULT_CHUNK_SIZE = 100
+PROGRESS_EVERY = 25
+
+
+def parse_record(record, line_number):
+    """입력 한 줄을 recommend_batch()의 요청 dict로 바꿉니다. 형식이 맞지 않으면 ValueError를 발생시킵니다."""
+    if not isinstance(record, dict):
+        raise ValueError("JSON 객체가 아닙니다.")
+    stage = record.get('growth_stage', record.get('stage'))
+    if stage not in STAGES:
+        raise ValueError(f"성장 단계 '{stage}'는 {', '.join(STAGES)} 중 하나여야 합니다.")
+    challenge = record.get('challenge')
+    if challenge not in CHALLENGES:
+        raise ValueError(f"당면 과제 '{challenge}'는 {', '.join(CHALLENGES)} 중 하나여야 합니다.")
+    user_problem = record.get('user_problem')
+    if user_problem is not None and not isinstance(user_problem, str):
+        raise ValueError("'user_problem'은 문자열이어야 합니다.")
+    style = record.get('style', 'ranked')
+    if style not in RECOMMENDATION_STYLES:
+        raise ValueError(f"'style'은 {', '.join(RECOMMENDATION_STYLES)} 중 하나여야 합니다.")
+    record_id = record.get('id')
+    return {
+        'id': str(record_id) if record_id is not None else f"line-{line_number}",
+        'stage': stage,
+        'challenge': challenge,
+        'user_problem': user_problem,
+        'style': style,
+    }
+
+
+def read_requests(path):
+    """입력 파일을 읽어 (요청 목록, 건너뛴 줄 수)를 반환합니다. 잘못된 줄과 중복 ID는 경고를 출력하고 건너뜁니다."""
+    items, seen_ids, skipped = [], set(), 0
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = parse_record(json.loads(line), line_number)
+            except ValueError as e:  # json.JSONDecodeError도 ValueError입니다.
+                print(f"⚠️ {path}:{line_number} 줄을 건너뜁니다: {e}")
+                skipped += 1
+                continue
+            if item['id'] in seen_ids:
+                print(f"⚠️ {path}:{line_number} 줄을 건너뜁니다: ID '{item['id']}'가 중복되었습니다.")
+                skipped += 1
+                continue
+            seen_ids.add(item['id'])
+            items.append(item)
+    return items, skipped
+
+
+def read_completed_ids(path):
+    """
+    이전 실행의 출력 파일에서 최종 결과가 'ok'인 ID를 읽습니다.
+    실행이 중간에 끊겨 마지막 줄이 잘렸으면 그 줄은 무시하고, 해당 요청은 다시 처리합니다.
+    """
+    last_status = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'id' in record:
+                    last_status[record['id']] = record.get('status')
+    except FileNotFoundError:
+        pass
+    return {record_id for record_id, status in last_status.items() if status == 'ok'}
+
+
+def _open_for_append(path):
+    """출력 파일을 이어 쓰기로 엽니다. 이전 실행이 줄 중간에서 끊겼다면 줄바꿈을 먼저 넣어 새 줄부터 씁니다."""
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    f = open(path, 'a', encoding='utf-8')
+    if needs_newline:
+        f.write('\n')
+    return f
+
+
+def run_batch(engine, items, output_path, concurrency=LLM_MAX_CONCURRENCY, chunk_size=DEFAULT_CHUNK_SIZE):
+    """items를 chunk_size개씩 추천하며 결과를 output_path에 한 줄씩 추가합니다. status별 개수(Counter)를 반환합니다."""
+    counts = Counter()
+    write_lock = threading.Lock()
+    start = time.perf_counter()
+
+    with _open_for_append(output_path) as out:
+        for chunk_start in range(0, len(items), chunk_size):
+            chunk = items[chunk_start:chunk_start + chunk_size]
+
+            def write_result(position, result, chunk=chunk):
+                item = chunk[position]
+                record = {
+                    'id': item['id'],
+                    'stage': item['stage'],
+                    'challenge': item['challenge'],
+                    'style': item['style'],
+                    'status': result['status'],
+                    'source': result['source'],
+                    'notice': result['notice'],
+                    'recommendation': result['recommendation'],
+                    'error': result['error'],
+                    'request_id': result['request_id'],
+                }
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    out.flush()
+                    counts[result['status']] += 1
+                    done = sum(counts.values())
+                    if done % PROGRESS_EVERY == 0 or done == len(items):
+                        rate = done / (time.perf_counter() - start)
+                        summary = ' · '.join(f"{status} {count}" for status, count in sorted(counts.items()))
+                        print(f"⏳ {done:,}/{len(items):,}건 완료 ({summary}) · {rate:.1f}건/초")
+
+            engine.recommend_batch(chunk, max_concurrency=concurrency, app='batch', on_result=write_result)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSONL 질의 파일의 모든 요청에 대해 추천을 만들어 JSONL로 저장합니다.")
+    parser.add_argument('input', help="요청 JSONL 파일 (한 줄에 growth_stage, challenge, user_problem)")
+    parser.add_argument('-o', '--output', help="결과 JSONL 파일 (기본값: <입력 파일 이름>_results.jsonl)")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="벡터 저장소 디렉터리")
+    parser.add_argument('--concurrency', type=int, default=LLM_MAX_CONCURRENCY, help="동시에 진행할 LLM 생성 수")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="한 번에 임베딩/검색할 요청 수")
+    args = parser.parse_args()
+    output_path = args.output or f"{os.path.splitext(args.input)[0]}_results.jsonl"
+
+    items, skipped = read_requests(args.input)
+    completed_ids = read_completed_ids(output_path)
+    pending = [item for item in items if item['id'] not in completed_ids]
+    print(f"📋 요청 {len(items):,}건 중 완료 {len(items) - len(pending):,}건을 건너뛰고 {len(pending):,}건을 처리합니다."
+          + (f" (잘못된 줄 {skipped}개 제외)" if skipped else ""))
+    if not pending:
+        return 0
+
+    engine = RecommendationEngine(api_key=load_api_key(), store_dir=args.store)
+    if engine.client is None and any(item['user_problem'] for item in pending):
+        print("❌ OpenAI API 키가 설정되지 않았습니다. OPENAI_API_KEY 환경 변수나 .streamlit/secrets.toml 파일을 확인해주세요.")
+        return 1
+
+    start = time.perf_counter()
+    counts = run_batch(engine, pending, output_path, concurrency=args.concurrency, chunk_size=args.chunk_size)
+    print(f"✅ {sum(counts.values()):,}건을 {time.perf_counter() - start:.1f}초 만에 처리했습니다. 결과: {output_path}")
+    if counts['error'] or counts['degraded']:
+        print(f"⚠️ 실패 {counts['error']}건 · 큐레이션 대체 {counts['degraded']}건은 다시 실행하면 재시도합니다.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+"""
+로컬 가짜 embeddings 서버를 상대로 embedding_batcher.embed_texts의 임베딩 처리량을 측정합니다.
+API 키와 네트워크 없이 실행됩니다.
+
+    python -m benchmarks.bench_embedding_build
+    python -m benchmarks.bench_embedding_build --texts 20000 --latency-ms 200 --output embed.json
+"""
+import argparse
+import json
+import sys
+import time
+
+from openai import OpenAI
+
+from benchmarks.bench_retrieval import environment, make_catalog
+from benchmarks.fake_embeddings import FakeEmbeddingsServer
+from embedding_batcher import MAX_TOKENS_PER_REQUEST, MAX_WORKERS, embed_texts
+from tokens import count_tokens
+
+
+def bench_embedding_build(texts, workers, max_tokens_per_request, dim, latency_ms):
+    """가짜 서버를 띄우고 texts 전체를 임베딩하는 데 걸린 시간과 처리량을 측정합니다."""
+    with FakeEmbeddingsServer(dim=dim, latency_ms=latency_ms) as server:
+        client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+        start = time.perf_counter()
+        embeddings, errors = embed_texts(client, texts, model="fake-embedding", max_workers=workers,
+                                         max_tokens_per_request=max_tokens_per_request, verbose=False)
+        elapsed = time.perf_counter() - start
+        n_requests = server.requests
+
+    n_tokens = sum(count_tokens(text) for text in texts)
+    return {
+        'workers': workers,
+        'max_tokens_per_request': max_tokens_per_request,
+        'texts': len(texts),
+        'tokens': n_tokens,
+        'requests': n_requests,
+        'failed': sum(error is not None for error in errors),
+        'elapsed_sec': elapsed,
+        'texts_per_sec': len(texts) / elapsed,
+        'tokens_per_sec': n_tokens / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가짜 embeddings 서버로 임베딩 생성 처리량을 측정합니다.")
+    parser.add_argument('--texts', type=int, default=5000, help="임베딩할 합성 텍스트 수")
+    parser.add_argument('--workers', default=f"1,{MAX_WORKERS}", help="쉼표로 구분한 동시 요청 수 목록")
+    parser.add_argument('--max-tokens-per-request', type=int, default=MAX_TOKENS_PER_REQUEST)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--latency-ms', type=float, default=50, help="가짜 서버의 요청당 고정 지연 (네트워크 왕복 흉내)")
+    parser.add_argument('--output', help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.texts)
+    texts = ("책 소개: " + catalog['intro'] + "\n\n목차: " + catalog['name']).tolist()
+
+    results = {'benchmark': 'embedding_build', 'environment': environment(), 'config': vars(args), 'runs': []}
+    for workers in [int(w) for w in args.workers.split(',') if w.strip()]:
+        print(f"동시 요청 {workers}개로 측정 중...", file=sys.stderr)
+        results['runs'].append(bench_embedding_build(texts, workers, args.max_tokens_per_request,
+                                                     args.dim, args.latency_ms))
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
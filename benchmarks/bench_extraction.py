@@ -0,0 +1,100 @@
+"""
+저장된 상품 페이지로 HTML 추출 속도와 메모리를 비교하는 벤치마크입니다.
+
+    python crawling.py                          # crawl_cache/에 샘플 페이지 저장
+    python -m benchmarks.bench_extraction       # 기존 방식(전체 html.parser 파싱) vs extraction.extract_fields
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from crawl_cache import DEFAULT_CACHE_DIR
+from extraction import FIELD_SELECTORS, INDEX_OVERRIDES, PARSER_BACKEND, extract_fields
+
+
+def extract_fields_full_parse(html, code=None):
+    """기존 crawling.py 방식: 페이지 전체를 html.parser로 파싱한 뒤 필요한 요소를 찾습니다."""
+    soup = BeautifulSoup(html, 'html.parser')
+    intro_element = soup.find('div', class_="infoWrap_txtInner")
+    table_blocks = soup.find_all('div', class_="infoWrap_txt")
+    table_index = INDEX_OVERRIDES['table'].get(code, FIELD_SELECTORS['table']['index'])
+    cover_element = soup.find('meta', attrs={'property': 'og:image'})
+    return {
+        'intro': intro_element.text if intro_element else None,
+        'table': table_blocks[table_index].text if len(table_blocks) > table_index else None,
+        'cover': cover_element.get('content') if cover_element else None,
+    }
+
+
+def load_pages(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding='utf-8') as f:
+            pages.append((int(stem) if stem.isdigit() else stem, f.read()))
+    return pages
+
+
+def measure(extract, pages, repeat):
+    """페이지/초와 페이지 하나를 파싱할 때의 최대 메모리 사용량(tracemalloc 기준)을 측정합니다."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for code, html in pages:
+            extract(html, code)
+    elapsed = time.perf_counter() - start
+
+    peak_bytes = 0
+    for code, html in pages:
+        tracemalloc.start()
+        extract(html, code)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        'pages_per_sec': len(pages) * repeat / elapsed,
+        'ms_per_page': elapsed * 1000 / (len(pages) * repeat),
+        'peak_memory_kb_per_page': peak_bytes / 1024,
+    }
+
+
+def _normalize(fields):
+    return {k: ' '.join(v.split()) if isinstance(v, str) else v for k, v in fields.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML 추출 방식별 처리량과 메모리를 비교합니다.")
+    parser.add_argument('--pages-dir', default=DEFAULT_CACHE_DIR, help="*.html 샘플 페이지가 있는 디렉터리")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir)
+    if not pages:
+        parser.error(f"'{args.pages_dir}'에 샘플 페이지가 없습니다. 먼저 python crawling.py를 실행해주세요.")
+
+    mismatches = [code for code, html in pages
+                  if _normalize(extract_fields(html, code)) != _normalize(extract_fields_full_parse(html, code))]
+
+    results = {
+        'pages': len(pages),
+        'repeat': args.repeat,
+        'parser_backend': PARSER_BACKEND,
+        'full_parse': measure(extract_fields_full_parse, pages, args.repeat),
+        'targeted': measure(extract_fields, pages, args.repeat),
+        'mismatched_pages': mismatches,
+    }
+    results['speedup'] = results['targeted']['pages_per_sec'] / results['full_parse']['pages_per_sec']
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+재순위화기(reranker.py)의 지연시간을 측정하는 벤치마크입니다. API 키와 네트워크 없이 합성 특징으로 실행됩니다.
+
+    python -m benchmarks.bench_reranker
+    python -m benchmarks.bench_reranker --candidates 20,50 --batch-size 100 --output bench.json
+
+후보 수마다 다음을 측정해 JSON으로 출력합니다.
+  - 특징 행렬 만들기(feature_matrix)와 순위 계산(Reranker.rank)을 합친 질의 하나의 p50/p99
+  - batch_size개 질의의 특징 행렬을 한 번에 점수 매기는 배치 순위 계산의 p50/p99
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.bench_retrieval import latency_stats
+from reranker import RERANK_FEATURES, Reranker, feature_matrix
+
+DEFAULT_CANDIDATES = (5, 20, 50, 200)
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_REPEAT = 2000
+
+
+def make_features(n_candidates, rng):
+    """검색 단계가 넘겨주는 것과 같은 모양의 합성 특징(이름별 배열)을 만듭니다."""
+    return {
+        'dense': rng.uniform(0.2, 0.7, n_candidates).astype(np.float32),
+        'chunk': rng.uniform(0.2, 0.8, n_candidates).astype(np.float32),
+        # 목차 청크가 없는 책은 -inf입니다.
+        'table': np.where(rng.random(n_candidates) < 0.2, -np.inf, rng.uniform(0.1, 0.7, n_candidates)).astype(np.float32),
+        'lexical': rng.exponential(5.0, n_candidates).astype(np.float32),
+        'fusion': np.sort(rng.uniform(0.01, 0.05, n_candidates))[::-1].astype(np.float32),
+        'stage_tag': rng.random(n_candidates) < 0.5,
+        'challenge_tag': rng.random(n_candidates) < 0.5,
+    }
+
+
+def measure(n_candidates, batch_size, repeat, seed=0):
+    rng = np.random.default_rng(seed)
+    reranker = Reranker()
+    features = [make_features(n_candidates, rng) for _ in range(repeat)]
+
+    single = []
+    for query_features in features:
+        start = time.perf_counter()
+        reranker.rank(feature_matrix(n_candidates, **query_features))
+        single.append(time.perf_counter() - start)
+
+    matrices = np.stack([feature_matrix(n_candidates, **query_features) for query_features in features])
+    batched = []
+    for batch_start in range(0, repeat - batch_size + 1, batch_size):
+        start = time.perf_counter()
+        reranker.rank(matrices[batch_start:batch_start + batch_size])
+        batched.append(time.perf_counter() - start)
+
+    return {
+        'candidates': n_candidates,
+        'single': latency_stats(single),
+        'batch': latency_stats(batched, batch_size),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="재순위화기의 질의당 지연시간과 배치 처리량을 측정합니다.")
+    parser.add_argument('--candidates', default=','.join(map(str, DEFAULT_CANDIDATES)), help="쉼표로 구분한 후보 수 목록")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="후보 수마다 측정할 질의 수")
+    parser.add_argument('--output', help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    results = {
+        'features': list(RERANK_FEATURES),
+        'batch_size': args.batch_size,
+        'repeat': args.repeat,
+        'results': [measure(int(n), args.batch_size, args.repeat) for n in args.candidates.split(',')],
+    }
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+합성 카탈로그로 벡터 저장소/검색 성능을 측정하는 벤치마크입니다. API 키와 네트워크 없이 실행됩니다.
+
+    python -m benchmarks.bench_retrieval                                  # 20 / 1만 / 10만 / 100만 권
+    python -m benchmarks.bench_retrieval --sizes 20,10000 --output bench.json
+
+카탈로그 크기마다 다음을 측정해 JSON으로 출력합니다.
+  - 저장소 생성(save_store), BM25 역색인, IVF 인덱스 생성 시간
+  - 저장소 로드 시간과 RSS (로드 직후 / 첫 검색으로 페이지를 모두 읽은 뒤)
+  - 단일 질의와 배치 질의의 Top-K 지연시간 p50/p99 (정확 검색, 카탈로그가 크면 IVF도)
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from ann_index import ANN_MIN_CATALOG_SIZE, IVFIndex
+from lexical_index import LexicalIndex
+from retrieval import normalize_rows
+from store_format import STORE_DTYPES, load_store, save_store
+
+DEFAULT_SIZES = (20, 10_000, 100_000, 1_000_000)
+DEFAULT_DIM = 256
+N_CLUSTERS = 64
+CLUSTER_SPREAD = 0.8   # 군집 중심(노름 1) 주변 노이즈의 평균 노름
+
+# 합성 책 제목/소개를 만들 어휘 (BM25 역색인 생성 시간 측정용)
+_WORDS = ("스타트업 창업 투자 유치 마케팅 브랜드 고객 제품 전략 회계 재무 조직 문화 리더십 채용 성장 "
+          "시장 검증 아이디어 실험 지표 매출 영업 그로스 디자인 기술 개발 팀 설계 바이블").split()
+
+
+def current_rss_mb():
+    """현재 프로세스의 RSS(MB)를 반환합니다. /proc이 없으면 최대 RSS로 대신합니다."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+def make_vectors(n, dim, kind='clustered', seed=0):
+    """무작위(random) 또는 군집(clustered) 분포의 정규화된 벡터를 만듭니다."""
+    rng = np.random.default_rng(seed)
+    if kind == 'random':
+        return normalize_rows(rng.standard_normal((n, dim), dtype=np.float32))
+    centers = normalize_rows(rng.standard_normal((min(N_CLUSTERS, n), dim), dtype=np.float32))
+    assignments = rng.integers(0, len(centers), size=n)
+    vectors = centers[assignments] + CLUSTER_SPREAD * rng.standard_normal((n, dim), dtype=np.float32) / np.sqrt(dim)
+    return normalize_rows(vectors)
+
+
+def make_catalog(n, seed=0):
+    """벡터 저장소 메타데이터 형식의 합성 도서 데이터프레임을 만듭니다."""
+    rng = np.random.default_rng(seed)
+    words = np.array(_WORDS)
+    titles = [' '.join(row) for row in words[rng.integers(0, len(words), size=(n, 3))]]
+    intros = [' '.join(row) for row in words[rng.integers(0, len(words), size=(n, 12))]]
+    return pd.DataFrame({
+        'name': [f"{title} {i}" for i, title in enumerate(titles)],
+        'author': [f"저자 {i % 997}" for i in range(n)],
+        'intro': intros,
+        'table': [''] * n,
+    })
+
+
+def latency_stats(samples_seconds, n_queries_per_sample=1):
+    samples_ms = np.asarray(samples_seconds) * 1000
+    return {
+        'p50_ms': float(np.percentile(samples_ms, 50)),
+        'p99_ms': float(np.percentile(samples_ms, 99)),
+        'mean_ms': float(samples_ms.mean()),
+        'queries_per_sec': float(n_queries_per_sample * len(samples_ms) / (samples_ms.sum() / 1000)),
+    }
+
+
+def measure_queries(index, queries, k, batch_size, **search_kwargs):
+    """단일 질의(하나씩)와 배치 질의(batch_size개씩)의 지연시간 분포를 측정합니다."""
+    single = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k=k, **search_kwargs)
+        single.append(time.perf_counter() - start)
+
+    batches = []
+    for start_row in range(0, len(queries) - batch_size + 1, batch_size):
+        batch = queries[start_row:start_row + batch_size]
+        start = time.perf_counter()
+        index.search(batch, k=k, **search_kwargs)
+        batches.append(time.perf_counter() - start)
+
+    result = {'single': latency_stats(single)}
+    if batches:
+        result[f'batch_{batch_size}'] = latency_stats(batches, batch_size)
+    return result
+
+
+def bench_catalog(n, args, workdir):
+    """카탈로그 하나에 대한 생성/로드/검색 지표를 측정합니다."""
+    result = {'size': n, 'dim': args.dim, 'dtype': args.dtype, 'distribution': args.distribution}
+
+    vectors = make_vectors(n, args.dim, kind=args.distribution, seed=args.seed)
+    catalog = make_catalog(n, seed=args.seed)
+    store_path = os.path.join(workdir, f"store_{n}")
+
+    start = time.perf_counter()
+    save_store(store_path, catalog, vectors, dtype=args.dtype, embedding_model='synthetic')
+    result['store_build_sec'] = time.perf_counter() - start
+
+    if n <= args.lexical_max_size:
+        texts = (catalog['name'] + "\n" + catalog['intro']).tolist()
+        start = time.perf_counter()
+        LexicalIndex.build(texts)
+        result['lexical_build_sec'] = time.perf_counter() - start
+
+    # 질의: 카탈로그 벡터에 노이즈를 섞어 만듭니다. (로드 측정 전에 만들어 RSS에 섞이지 않게 합니다)
+    rng = np.random.default_rng(args.seed + 1)
+    picked = rng.choice(n, size=args.queries, replace=n < args.queries)
+    queries = normalize_rows(vectors[picked] + args.noise * rng.standard_normal((len(picked), args.dim), dtype=np.float32))
+    del vectors, catalog
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    store = load_store(store_path)
+    index = store.index()
+    result['load_sec'] = time.perf_counter() - start
+    result['rss_after_load_mb'] = current_rss_mb() - rss_before
+    index.search(queries[0], k=args.k)
+    result['rss_after_first_query_mb'] = current_rss_mb() - rss_before
+    result['store_bytes'] = sum(entry.stat().st_size for entry in os.scandir(store.path))
+
+    result['exact'] = measure_queries(index, queries, args.k, args.batch_size)
+
+    if ANN_MIN_CATALOG_SIZE <= n <= args.ann_max_size:
+        start = time.perf_counter()
+        ann_index = IVFIndex.build(index)
+        result['ivf_build_sec'] = time.perf_counter() - start
+        result['ivf_nlist'] = ann_index.nlist
+        result['ivf'] = measure_queries(ann_index, queries, args.k, args.batch_size)
+
+    shutil.rmtree(store_path, ignore_errors=True)
+    return result
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="합성 카탈로그로 벡터 저장소 로드/검색/인덱스 생성 성능을 측정합니다.")
+    parser.add_argument('--sizes', default=','.join(str(n) for n in DEFAULT_SIZES), help="쉼표로 구분한 카탈로그 크기 목록")
+    parser.add_argument('--dim', type=int, default=DEFAULT_DIM)
+    parser.add_argument('--dtype', choices=STORE_DTYPES, default='float32')
+    parser.add_argument('--distribution', choices=('random', 'clustered'), default='clustered')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--lexical-max-size', type=int, default=100_000, help="이 크기까지만 BM25 역색인 생성 시간을 측정합니다.")
+    parser.add_argument('--ann-max-size', type=int, default=100_000, help="이 크기까지만 IVF 인덱스를 만들어 측정합니다.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="임시 저장소를 만들 디렉터리 (기본값: 시스템 임시 디렉터리)")
+    parser.add_argument('--output', help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    workdir = tempfile.mkdtemp(prefix='bench_retrieval_', dir=args.workdir)
+    results = {'benchmark': 'retrieval', 'environment': environment(), 'config': vars(args), 'catalogs': []}
+    try:
+        for n in sizes:
+            print(f"카탈로그 {n:,}권 측정 중...", file=sys.stderr)
+            results['catalogs'].append(bench_catalog(n, args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
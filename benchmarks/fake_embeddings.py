@@ -0,0 +1,94 @@
+"""
+OpenAI embeddings API를 흉내 내는 로컬 서버입니다. 벤치마크를 API 키와 네트워크 없이 실행하기 위해 사용합니다.
+
+    with FakeEmbeddingsServer(dim=256) as server:
+        client = OpenAI(api_key="fake", base_url=server.base_url)
+
+같은 텍스트에는 항상 같은 벡터를 돌려주며, latency_ms로 요청마다 고정 지연을 줄 수 있습니다.
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text, dim):
+    """텍스트 해시를 시드로 만든 정규화된 float32 벡터입니다."""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/embeddings'):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        texts = body['input'] if isinstance(body['input'], list) else [body['input']]
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+
+        data = []
+        for i, text in enumerate(texts):
+            vector = fake_embedding(str(text), self.server.dim)
+            if body.get('encoding_format') == 'base64':
+                embedding = base64.b64encode(vector.tobytes()).decode('ascii')
+            else:
+                embedding = vector.tolist()
+            data.append({'object': 'embedding', 'index': i, 'embedding': embedding})
+
+        n_tokens = sum(len(str(text).encode('utf-8')) // 2 + 1 for text in texts)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.inputs += len(texts)
+        payload = json.dumps({
+            'object': 'list',
+            'data': data,
+            'model': body.get('model'),
+            'usage': {'prompt_tokens': n_tokens, 'total_tokens': n_tokens},
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeEmbeddingsServer:
+    """별도 스레드에서 실행되는 가짜 embeddings 서버입니다. base_url을 OpenAI 클라이언트에 넘겨 사용합니다."""
+
+    def __init__(self, dim=256, latency_ms=0, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.dim = dim
+        self.httpd.latency_ms = latency_ms
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.inputs = 0
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
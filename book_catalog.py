@@ -0,0 +1,144 @@
+"""
+도서 목록을 책 ID로 바로 찾을 수 있게 로드 시점에 한 번 색인해 두는 카탈로그입니다.
+  - 책 ID: yes24 상품 코드(code 컬럼)를 문자열로 씁니다. 저장소를 다시 빌드해도 바뀌지 않으므로 LLM 응답, 요청 로그,
+    화면 사이에서 책을 가리키는 값으로 씁니다. 코드가 없는 책은 정규화한 제목으로 대신합니다.
+  - 제목 색인: 정규화한 제목(공백·문장부호 제거, 소문자) → 책 ID 해시 색인으로 O(1)에 찾습니다.
+    괄호·콜론 뒤 부제를 뺀 제목도 함께 색인하므로 '제로 투 원'으로 '제로 투 원 (Zero to One)'을 찾습니다.
+  - 유사 제목 색인: 정확히 맞는 제목이 없으면 제목 문자 2-gram 역색인으로 후보만 모아 Dice 유사도가 가장 높은 책을 고릅니다.
+    한 제목이 다른 제목을 포함하면 짧은 쪽 기준의 겹침 비율로 비교합니다. ('린스타트업', '린 스타트업 개정판')
+  - 책 레코드: 도서 목록의 컬럼(name, author, intro, table 등)에 book_id와 표지 URL(cover)을 더한 dict입니다.
+"""
+import json
+import re
+import unicodedata
+from collections import Counter
+
+# yes24 상품 코드로 만드는 표지 이미지 URL (크롤링한 페이지에 표지가 없을 때도 사용)
+COVER_URL = 'https://image.yes24.com/goods/{code}/XL'
+# 유사 제목으로 인정할 최소 Dice 유사도 (제목 문자 2-gram 기준)
+FUZZY_MIN_SIMILARITY = 0.6
+# 포함 관계로 비교할 짧은 쪽 제목의 최소 글자 수 ('경영'처럼 짧은 제목이 아무 책에나 맞지 않도록)
+CONTAINMENT_MIN_LENGTH = 3
+
+_AUTHOR_SEPARATORS = re.compile(r'[,/·&]|\s+')
+_SUBTITLE = re.compile(r'\s*[(\[（［].*?[)\]）］]|\s*[:：].*$')
+
+
+def normalize_title(title):
+    """제목 비교용 키를 만듭니다. 유니코드 정규화(NFKC) 뒤 소문자로 바꾸고 글자와 숫자만 남깁니다."""
+    if not isinstance(title, str):
+        return ''
+    return ''.join(ch for ch in unicodedata.normalize('NFKC', title).casefold() if ch.isalnum())
+
+
+def strip_subtitle(title):
+    """괄호 안 부제와 콜론 뒤 부제를 뺀 제목을 반환합니다. ('제로 투 원 (Zero to One)' → '제로 투 원')"""
+    if not isinstance(title, str):
+        return ''
+    return _SUBTITLE.sub('', title).strip()
+
+
+def _bigrams(key):
+    return {key[i:i + 2] for i in range(len(key) - 1)} or {key}
+
+
+def _author_names(author):
+    if not isinstance(author, str):
+        return set()
+    return {normalize_title(name) for name in _AUTHOR_SEPARATORS.split(author) if len(normalize_title(name)) >= 2}
+
+
+class BookCatalog:
+    """
+    도서 목록(DataFrame)의 책 레코드를 책 ID, 행 번호, 제목으로 찾습니다. 색인은 만들 때 한 번만 계산하며,
+    반환하는 레코드는 복사본이므로 호출한 쪽에서 고쳐도 됩니다.
+    """
+
+    def __init__(self, books_df):
+        # NaN은 None으로 바뀌어 JSON으로 그대로 보낼 수 있습니다.
+        self.records = json.loads(books_df.to_json(orient='records', force_ascii=False))
+        self.ids = []
+        self._rows = {}
+        self._titles = {}
+        self._title_keys = []
+        self._title_grams = []
+        self._gram_index = {}
+        for row, record in enumerate(self.records):
+            title_key = normalize_title(record.get('name'))
+            code = record.get('code')
+            # 빈 칸이 있는 code 컬럼은 float로 읽히므로 정수로 되돌립니다.
+            if isinstance(code, float) and code.is_integer():
+                code = record['code'] = int(code)
+            book_id = str(code) if code is not None else f"title:{title_key or row}"
+            if book_id in self._rows:
+                book_id = f"{book_id}-{row}"
+            record['book_id'] = book_id
+            if not record.get('cover') and code is not None:
+                record['cover'] = COVER_URL.format(code=code)
+            record.setdefault('cover', None)
+            self.ids.append(book_id)
+            self._rows[book_id] = row
+            self._title_keys.append(title_key)
+            if title_key:
+                # 같은 제목이 여러 번 있으면 먼저 나온 책을 씁니다. 부제를 뺀 제목은 전체 제목보다 나중에 채웁니다.
+                self._titles.setdefault(title_key, book_id)
+            grams = _bigrams(title_key) if title_key else set()
+            self._title_grams.append(grams)
+            for gram in grams:
+                self._gram_index.setdefault(gram, []).append(row)
+        for book_id, record in zip(self.ids, self.records):
+            short_key = normalize_title(strip_subtitle(record.get('name')))
+            if short_key:
+                self._titles.setdefault(short_key, book_id)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, book_id):
+        return book_id in self._rows
+
+    def row(self, book_id):
+        """책 ID의 행 번호를 반환합니다. 없으면 None을 반환합니다."""
+        return self._rows.get(book_id)
+
+    def record(self, row):
+        """행 번호의 책 레코드(복사본)를 반환합니다."""
+        return dict(self.records[row])
+
+    def get(self, book_id):
+        """책 ID의 책 레코드(복사본)를 반환합니다. 없으면 None을 반환합니다."""
+        row = self._rows.get(str(book_id)) if book_id is not None else None
+        return self.record(row) if row is not None else None
+
+    def find(self, title, author=None):
+        """
+        제목으로 책 레코드(복사본)를 찾습니다. 정규화한 제목(또는 부제를 뺀 제목)이 같은 책을 먼저 찾고, 없으면 유사 제목 중
+        FUZZY_MIN_SIMILARITY 이상으로 가장 비슷한 책을 반환합니다. 한 제목이 다른 제목을 포함하면 Dice 대신
+        짧은 쪽 2-gram 수 대비 겹침 비율로 비교합니다. author를 주면 유사 제목 후보 중
+        저자 이름이 하나도 겹치지 않는 책은 제외합니다. (제목이 비슷한 다른 책을 잘못 고르지 않도록)
+        """
+        key = normalize_title(title)
+        if not key:
+            return None
+        for exact_key in (key, normalize_title(strip_subtitle(title))):
+            book_id = self._titles.get(exact_key)
+            if book_id is not None:
+                return self.get(book_id)
+
+        grams = _bigrams(key)
+        overlaps = Counter(row for gram in grams for row in self._gram_index.get(gram, ()))
+        authors = _author_names(author)
+        best_row, best_score = None, (0.0, 0.0)
+        for row, overlap in overlaps.most_common():
+            row_key, row_grams = self._title_keys[row], self._title_grams[row]
+            dice = 2 * overlap / (len(grams) + len(row_grams))
+            similarity = dice
+            if min(len(key), len(row_key)) >= CONTAINMENT_MIN_LENGTH and (key in row_key or row_key in key):
+                similarity = overlap / min(len(grams), len(row_grams))
+            # 포함 관계인 후보가 여럿이면 Dice가 높은(길이가 더 비슷한) 책을 고릅니다.
+            if similarity < FUZZY_MIN_SIMILARITY or (similarity, dice) <= best_score:
+                continue
+            if authors and not authors & _author_names(self.records[row].get('author')):
+                continue
+            best_row, best_score = row, (similarity, dice)
+        return self.record(best_row) if best_row is not None else None
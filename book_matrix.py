@@ -1,4 +1,13 @@
-{
+"""
+단계(stage) × 과제(challenge)별로 직접 고른 추천 도서 3권(추천 이유, VC 코멘트 포함) 목록입니다.
+LLM 없이 바로 답할 수 있는 큐레이션 추천으로 사용합니다.
+  - 사용자가 구체적인 고민 입력을 건너뛸 때
+  - LLM이 느리거나 동시 호출 한도를 넘었을 때 (degraded mode)
+  - 맞춤 추천을 생성하는 동안 먼저 보여줄 답변
+"""
+import copy
+
+BOOK_MATRIX = {
   "아이디어 검증": {
     "비즈니스 모델/전략": [
       { "title": "린 스타트업", "author": "에릭 리스", "reason": "불확실성이 높은 시장에서 '만들기-측정-학습' 사이클을 통해 비즈니스 모델의 가설을 가장 빠르게 검증하는 방법을 제시합니다.", "vc_comment": "투자자들은 '린 가설 검증 능력'을 핵심적으로 봅니다. 이 책의 개념을 어떻게 당신의 사업에 적용하여 가설을 검증했는지 보여주는 것이 중요합니다." },
@@ -107,4 +116,56 @@
       { "title": "재무제표 모르면 주식투자 절대로 하지마라", "author": "김수헌, 이재홍", "reason": "투자 유치를 넘어, 회사를 건강하게 운영하기 위해선 재무제표를 읽는 능력이 필수입니다. 회사의 재무 상태를 파악하는 기본기를 다질 수 있습니다.", "vc_comment": "창업가가 숫자에 밝고, 회사의 재무 건전성을 관리할 수 있다는 믿음을 줍니다. 이는 투자 리스크를 줄이는 중요한 요소입니다." }
     ]
   }
-}
\ No newline at end of file
+}
+
+
+STAGES = list(BOOK_MATRIX)
+CHALLENGES = list(next(iter(BOOK_MATRIX.values())))
+
+
+def _build_recommendation(books):
+    """큐레이션 도서 3권을 new_app.py의 추천 결과(JSON)와 같은 형식으로 바꿉니다."""
+    best_book, *other_books = books
+    return {
+        'source': 'curated',
+        'best_book': {'title': best_book['title'], 'author': best_book['author']},
+        'new_reason': best_book['reason'],
+        'application_points': f"💼 투자자 관점: {best_book['vc_comment']}",
+        'table_of_contents': None,
+        'second_and_third_books': [
+            {'title': book['title'], 'author': book['author'], 'reason': book['reason']} for book in other_books
+        ],
+    }
+
+
+# 모든 (단계, 과제) 조합의 추천 결과를 import 시점에 한 번만 만들어 둡니다.
+CURATED_RECOMMENDATIONS = {
+    (stage, challenge): _build_recommendation(books)
+    for stage, challenges in BOOK_MATRIX.items()
+    for challenge, books in challenges.items()
+}
+
+
+def get_curated_books(stage, challenge):
+    """(단계, 과제)에 해당하는 큐레이션 도서 목록을 반환합니다. 없으면 빈 리스트를 반환합니다."""
+    return copy.deepcopy(BOOK_MATRIX.get(stage, {}).get(challenge, []))
+
+
+def get_curated_recommendation(stage, challenge):
+    """(단계, 과제)에 해당하는 큐레이션 추천 결과를 반환합니다. 없으면 None을 반환합니다."""
+    recommendation = CURATED_RECOMMENDATIONS.get((stage, challenge))
+    return copy.deepcopy(recommendation) if recommendation is not None else None
+
+
+def get_curated_book(stage, challenge):
+    """(단계, 과제)의 1순위 큐레이션 도서를 app.py의 추천 결과(책 한 권)와 같은 형식으로 반환합니다. 없으면 None을 반환합니다."""
+    books = BOOK_MATRIX.get(stage, {}).get(challenge)
+    if not books:
+        return None
+    best_book = books[0]
+    return {
+        'name': best_book['title'],
+        'author': best_book['author'],
+        'ai_reason': f"{best_book['reason']}\n\n💼 투자자 관점: {best_book['vc_comment']}",
+        'source': 'curated',
+    }
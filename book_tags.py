@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+
+from book_catalog import BookCatalog
+from book_matrix import CHALLENGES, STAGES, get_curated_books
+from store_format import load_npz
+
+# --- 단계/과제 태그 파일 (벡터 저장소 디렉터리 안에 함께 저장합니다) ---
+# 책마다 단계 태그와 과제 태그를 비트셋(정수 하나)으로 저장합니다. i번째 비트 = STAGES[i] / CHALLENGES[i]
+BOOK_TAGS_FILE = 'book_tags.npz'
+
+# 라벨 설명문: 책 임베딩과의 유사도로 태그를 매길 때 라벨 대신 이 설명문을 임베딩합니다.
+STAGE_DESCRIPTIONS = {
+    "아이디어 검증": "창업 아이디어를 떠올리고, 고객 문제와 시장 가설을 빠르게 실험하고 검증하는 초기 단계",
+    "MVP 개발/초기 고객 확보": "최소 기능 제품(MVP)을 만들고 첫 고객과 초기 사용자를 모으며 피드백을 받는 단계",
+    "PMF(시장-제품 적합성) 탐색": "제품이 시장에 맞는지 지표로 확인하고, 고객 유지와 성장 엔진을 찾아가는 단계",
+    "스케일업/투자 유치": "조직과 매출을 빠르게 키우고, 시리즈 투자를 유치하며 회사를 확장하는 단계",
+}
+CHALLENGE_DESCRIPTIONS = {
+    "비즈니스 모델/전략": "비즈니스 모델, 수익 구조, 경쟁 전략, 사업 계획과 의사결정",
+    "제품/기술": "제품 기획, 사용자 경험, 디자인 씽킹, 프로토타입, 개발 프로세스와 기술",
+    "마케팅/영업": "마케팅, 브랜딩, 스토리텔링, 고객 획득, 세일즈와 그로스",
+    "팀/조직문화": "공동 창업자, 채용, 리더십, 인사(HR), 조직문화와 팀 운영",
+    "투자/재무": "투자 유치, 벤처캐피털, 자금 조달, 회계, 재무제표와 현금 관리",
+}
+
+# 유사도 기준으로 책마다 붙일 라벨 수 (book_matrix.py의 큐레이션 태그는 별도로 더해집니다)
+STAGE_LABELS_PER_BOOK = 2
+CHALLENGE_LABELS_PER_BOOK = 2
+
+# 필터링 결과가 이보다 적으면 조건을 완화합니다. (단계+과제 → 과제만 → 단계만 → 전체)
+MIN_FILTERED_BOOKS = 10
+
+
+def seed_bits_from_matrix(books_df):
+    """
+    book_matrix.py에 (단계, 과제) 추천으로 올라 있는 책에 해당 태그 비트를 켭니다. (stage_bits, challenge_bits)
+    큐레이션 책은 화면에 표지를 붙일 때와 같은 BookCatalog.find로 찾으므로, 표기가 조금 다른 제목도 같은 책으로 태그됩니다.
+    """
+    books = BookCatalog(books_df)
+    stage_bits = np.zeros(len(books), dtype=np.uint16)
+    challenge_bits = np.zeros(len(books), dtype=np.uint16)
+    for s, stage in enumerate(STAGES):
+        for c, challenge in enumerate(CHALLENGES):
+            for book in get_curated_books(stage, challenge):
+                record = books.find(book['title'], book.get('author'))
+                row = books.row(record['book_id']) if record is not None else None
+                if row is not None:
+                    stage_bits[row] |= 1 << s
+                    challenge_bits[row] |= 1 << c
+    return stage_bits, challenge_bits
+
+
+def similarity_bits(vector_index, label_embeddings, labels_per_book):
+    """책 임베딩과 라벨 설명문 임베딩의 유사도가 가장 높은 labels_per_book개 라벨의 비트를 켭니다."""
+    scores = vector_index.score(np.asarray(label_embeddings, dtype=np.float32))   # (라벨 수, 책 수)
+    labels_per_book = min(labels_per_book, scores.shape[0])
+    best_labels = np.argsort(-scores, axis=0)[:labels_per_book]                    # (labels_per_book, 책 수)
+    bits = np.zeros(scores.shape[1], dtype=np.uint16)
+    for labels in best_labels:
+        bits |= (1 << labels).astype(np.uint16)
+    return bits
+
+
+class BookTags:
+    """책별 단계/과제 태그 비트셋입니다. 질의 시 (단계, 과제)에 맞는 책만 골라내는 불리언 마스크를 만듭니다."""
+
+    def __init__(self, stage_bits, challenge_bits, stages=STAGES, challenges=CHALLENGES, build_id=None):
+        self.stage_bits = np.asarray(stage_bits, dtype=np.uint16)
+        self.challenge_bits = np.asarray(challenge_bits, dtype=np.uint16)
+        self.stages = list(stages)
+        self.challenges = list(challenges)
+        self.build_id = build_id
+
+    def __len__(self):
+        return len(self.stage_bits)
+
+    @classmethod
+    def build(cls, books_df, vector_index, stage_embeddings, challenge_embeddings, build_id=None):
+        """큐레이션 태그(book_matrix.py)와 라벨 설명문 유사도 태그를 합쳐 만듭니다. books_df는 벡터 저장소의 도서 목록입니다."""
+        stage_bits, challenge_bits = seed_bits_from_matrix(books_df)
+        stage_bits |= similarity_bits(vector_index, stage_embeddings, STAGE_LABELS_PER_BOOK)
+        challenge_bits |= similarity_bits(vector_index, challenge_embeddings, CHALLENGE_LABELS_PER_BOOK)
+        return cls(stage_bits, challenge_bits, build_id=build_id)
+
+    def save(self, path):
+        np.savez(path, stage_bits=self.stage_bits, challenge_bits=self.challenge_bits,
+                 stages=np.array(self.stages), challenges=np.array(self.challenges),
+                 build_id=np.array(self.build_id or ''))
+
+    @classmethod
+    def load(cls, path):
+        data = load_npz(path)
+        return cls(data['stage_bits'], data['challenge_bits'], data['stages'].tolist(),
+                   data['challenges'].tolist(), str(data['build_id']) or None)
+
+    def mask(self, stage=None, challenge=None):
+        """(단계, 과제) 태그가 모두 붙은 책의 불리언 마스크를 반환합니다. 모르는 라벨이나 None은 조건에서 뺍니다."""
+        mask = np.ones(len(self), dtype=bool)
+        if stage in self.stages:
+            mask &= (self.stage_bits & (1 << self.stages.index(stage))) != 0
+        if challenge in self.challenges:
+            mask &= (self.challenge_bits & (1 << self.challenges.index(challenge))) != 0
+        return mask
+
+    def matches(self, rows, stage=None, challenge=None):
+        """rows(책 번호 배열)마다 (단계 태그가 붙었는지, 과제 태그가 붙었는지) 불리언 배열 두 개를 반환합니다."""
+        rows = np.asarray(rows, dtype=np.int64)
+        stage_match = np.zeros(len(rows), dtype=bool)
+        challenge_match = np.zeros(len(rows), dtype=bool)
+        if stage in self.stages:
+            stage_match = (self.stage_bits[rows] & (1 << self.stages.index(stage))) != 0
+        if challenge in self.challenges:
+            challenge_match = (self.challenge_bits[rows] & (1 << self.challenges.index(challenge))) != 0
+        return stage_match, challenge_match
+
+    def candidates(self, stage=None, challenge=None, min_books=MIN_FILTERED_BOOKS):
+        """
+        검색 대상으로 삼을 책 번호 배열을 반환합니다. 필터링 결과가 min_books권보다 적으면
+        과제만 → 단계만 순서로 조건을 완화하고, 그래도 부족하면 None(전체 검색)을 반환합니다.
+        """
+        min_books = min(min_books, len(self))
+        for conditions in ((stage, challenge), (None, challenge), (stage, None)):
+            if conditions == (None, None):
+                continue
+            rows = np.flatnonzero(self.mask(*conditions))
+            if len(rows) >= min_books:
+                return None if len(rows) == len(self) else rows
+        return None
+
+
+def load_book_tags(path):
+    """저장소 디렉터리에서 태그 파일을 엽니다. 파일이 없으면 FileNotFoundError를 발생시킵니다."""
+    return BookTags.load(os.path.join(path, BOOK_TAGS_FILE))
@@ -1,8 +1,17 @@
 import pandas as pd
 from openai import OpenAI
 import numpy as np
+import argparse
+import hashlib
 import os
 
+from ann_index import ANN_INDEX_PATH, ANN_MIN_CATALOG_SIZE, IVFIndex
+from book_tags import BOOK_TAGS_FILE, CHALLENGE_DESCRIPTIONS, STAGE_DESCRIPTIONS, BookTags
+from chunk_index import load_chunk_index, make_chunks, save_chunk_index
+from embedding_batcher import embed_texts
+from lexical_index import LEXICAL_INDEX_PATH, LexicalIndex
+from store_format import DEFAULT_STORE_DIR, STORE_DTYPES, load_store, save_store
+
 # .streamlit/secrets.toml 파일에서 API 키를 로드하기 위한 설정
 try:
     from dotenv import load_dotenv
@@ -18,23 +27,116 @@ if not api_key:
 # OpenAI 클라이언트 초기화
 client = OpenAI(api_key=api_key)
 EMBEDDING_MODEL = "text-embedding-3-small"
+VECTOR_STORE_DIR = DEFAULT_STORE_DIR
+
+def build_ann_index(store):
+    """카탈로그가 충분히 크면 근사 최근접 이웃(IVF) 인덱스를 만들어 저장소의 임베딩 행렬 옆에 저장합니다."""
+    if len(store) < ANN_MIN_CATALOG_SIZE:
+        return
+
+    ann_path = os.path.join(store.path, ANN_INDEX_PATH)
+    print(f"도서 {len(store):,}권에 대한 ANN 인덱스를 생성합니다...")
+    ann_index = IVFIndex.build(store.index())
+    ann_index.save(ann_path)
+    print(f"✅ '{ann_path}' 파일이 생성되었습니다. (클러스터 {ann_index.nlist:,}개)")
+    print("   python ann_index.py 로 nprobe 설정별 재현율/지연시간을 확인할 수 있습니다.")
+
+def build_lexical_index(store):
+    """책 제목·소개·목차로 BM25 역색인(문자 n-gram)을 만들어 저장소 디렉터리에 저장합니다."""
+    books = store.metadata
+    texts = (books['name'].fillna("").astype(str) + "\n" + books['intro'].fillna("").astype(str)
+             + "\n" + books['table'].fillna("").astype(str))
+    lexical_path = os.path.join(store.path, LEXICAL_INDEX_PATH)
+    lexical_index = LexicalIndex.build(texts.tolist())
+    lexical_index.save(lexical_path)
+    print(f"✅ '{lexical_path}' 파일이 생성되었습니다. (어휘 {len(lexical_index.terms):,}개)")
+
+def build_book_tags(store):
+    """
+    책마다 단계/과제 태그를 매겨 비트셋으로 저장합니다. book_matrix.py의 큐레이션 추천을 시드로 쓰고,
+    라벨 설명문 임베딩과 가장 가까운 라벨을 더합니다. 앱은 이 태그로 검색 대상을 먼저 좁힙니다.
+    """
+    descriptions = list(STAGE_DESCRIPTIONS.values()) + list(CHALLENGE_DESCRIPTIONS.values())
+    label_embeddings, errors = embed_texts(client, descriptions, model=EMBEDDING_MODEL, verbose=False)
+    if any(embedding is None for embedding in label_embeddings):
+        print(f"⚠️ 라벨 설명문 임베딩에 실패하여 단계/과제 태그를 만들지 않습니다: {[e for e in errors if e]}")
+        return
+
+    label_embeddings = np.array(label_embeddings, dtype=np.float32)
+    n_stages = len(STAGE_DESCRIPTIONS)
+    tags = BookTags.build(store.metadata, store.index(),
+                          label_embeddings[:n_stages], label_embeddings[n_stages:], build_id=store.build_id)
+    tags_path = os.path.join(store.path, BOOK_TAGS_FILE)
+    tags.save(tags_path)
+    print(f"✅ '{tags_path}' 파일이 생성되었습니다. (책 {len(tags):,}권의 단계/과제 태그)")
+
+def content_hash(text):
+    """책 텍스트(소개 + 목차)의 SHA-256 해시를 반환합니다. 변경 여부를 판단하는 키로 사용합니다."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def load_previous_embeddings():
+    """
+    이전 빌드 결과에서 {content_hash: 행 번호} 매핑과 검색 인덱스(행 벡터 조회용)를 불러옵니다.
+    이전 결과가 없거나, 해시가 없거나, 다른 임베딩 모델로 만들어졌다면 빈 매핑을 반환합니다.
+    """
+    try:
+        previous = load_store(VECTOR_STORE_DIR)
+    except (FileNotFoundError, ValueError):
+        return {}, None
+
+    if 'content_hash' not in previous.metadata.columns or previous.manifest.get('embedding_model') != EMBEDDING_MODEL:
+        return {}, None
+    return {h: row for row, h in enumerate(previous.metadata['content_hash'])}, previous.index()
 
-def get_embedding(text, model=EMBEDDING_MODEL):
-    """주어진 텍스트의 임베딩 벡터를 반환합니다."""
-    if not isinstance(text, str) or text.strip() == "":
-        return None
-    text = text.replace("\n", " ")
+def load_previous_chunk_embeddings():
+    """이전 빌드의 청크 인덱스에서 {content_hash: 청크 행 번호} 매핑과 벡터 인덱스를 불러옵니다."""
     try:
-        response = client.embeddings.create(input=[text], model=model)
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"임베딩 생성 중 오류 발생: {e}")
-        return None
+        previous = load_store(VECTOR_STORE_DIR)
+        previous_chunks = load_chunk_index(previous.path)
+    except (FileNotFoundError, ValueError):
+        return {}, None
+
+    if previous_chunks.content_hashes is None or previous.manifest.get('embedding_model') != EMBEDDING_MODEL:
+        return {}, None
+    return {h: row for row, h in enumerate(previous_chunks.content_hashes)}, previous_chunks.vector_index
+
+def embed_chunks(df, incremental=False):
+    """
+    책 소개와 목차를 청크로 나눠 임베딩합니다. 증분 모드에서는 내용 해시가 같은 청크의 이전 임베딩을 재사용합니다.
+    임베딩에 실패한 청크는 제외하고 (chunks, embeddings_matrix)를 반환합니다.
+    """
+    chunks = make_chunks(df)
+    for chunk in chunks:
+        chunk['content_hash'] = content_hash(chunk['embedding_text'])
+    print(f"책 {len(df):,}권을 청크 {len(chunks):,}개로 나눠 임베딩합니다...")
+
+    previous_rows, previous_index = load_previous_chunk_embeddings() if incremental else ({}, None)
+    vectors = [None] * len(chunks)
+    reused_positions = [pos for pos, chunk in enumerate(chunks) if chunk['content_hash'] in previous_rows]
+    if reused_positions:
+        reused_vectors = previous_index.rows(np.array([previous_rows[chunks[pos]['content_hash']] for pos in reused_positions]))
+        for pos, vector in zip(reused_positions, reused_vectors):
+            vectors[pos] = vector
 
-def build_vector_store():
+    new_positions = [pos for pos, vector in enumerate(vectors) if vector is None]
+    if incremental:
+        print(f"증분 모드(청크): 재사용 {len(reused_positions):,}개 · 새로 임베딩 {len(new_positions):,}개")
+    if new_positions:
+        new_embeddings, _ = embed_texts(client, [chunks[pos]['embedding_text'] for pos in new_positions], model=EMBEDDING_MODEL)
+        for pos, embedding in zip(new_positions, new_embeddings):
+            vectors[pos] = embedding
+
+    kept = [pos for pos, vector in enumerate(vectors) if vector is not None]
+    if len(kept) < len(chunks):
+        print(f"⚠️ 청크 {len(chunks) - len(kept):,}개의 임베딩 생성에 실패하여 청크 인덱스에서 제외합니다.")
+    return [chunks[pos] for pos in kept], np.array([vectors[pos] for pos in kept], dtype=np.float32)
+
+def build_vector_store(incremental=False, dtype='float32'):
     """
     books_data_new.csv를 읽어 'intro'와 'table'을 합친 텍스트의 임베딩을 생성하고,
     데이터프레임과 임베딩 행렬을 파일로 저장합니다.
+    incremental=True이면 내용 해시가 같은 책은 이전 임베딩을 재사용하고, 새로 추가되거나 바뀐 책만 임베딩합니다.
+    dtype으로 임베딩 행렬의 저장 형식(float32 / float16 / int8)을 고를 수 있습니다.
     """
     # 1. 새로운 CSV 파일 로드
     try:
@@ -52,23 +154,66 @@ def build_vector_store():
     # 2. [핵심 수정] intro와 table 텍스트를 하나로 합칩니다.
     # 각 컬럼을 문자열로 변환한 후 합쳐서, 'combined_text'라는 새 컬럼을 만듭니다.
     df['combined_text'] = "책 소개: " + df['intro'].astype(str) + "\n\n목차: " + df['table'].astype(str)
-    
-    # 3. 합쳐진 텍스트를 기반으로 임베딩을 생성합니다.
-    df['embedding'] = df['combined_text'].apply(get_embedding)
-    
-    # 임베딩 생성에 실패한 행이 있다면 제거합니다.
-    df.dropna(subset=['embedding'], inplace=True)
+    df['content_hash'] = df['combined_text'].map(content_hash)
+
+    # 3. 내용이 바뀌지 않은 책은 이전 임베딩을 재사용합니다. (증분 모드)
+    previous_rows, previous_index = load_previous_embeddings() if incremental else ({}, None)
+    reused = df['content_hash'].isin(previous_rows).to_numpy()
+    vectors = [None] * len(df)
+    if reused.any():
+        reused_positions = np.flatnonzero(reused)
+        reused_vectors = previous_index.rows(df['content_hash'].iloc[reused_positions].map(previous_rows).to_numpy())
+        for pos, vector in zip(reused_positions, reused_vectors):
+            vectors[pos] = vector
+
+    if incremental:
+        n_deleted = len(set(previous_rows) - set(df['content_hash']))
+        print(f"증분 모드: 재사용 {int(reused.sum()):,}권 · 새로 임베딩 {int((~reused).sum()):,}권 · "
+              f"삭제되거나 바뀐 이전 벡터 {n_deleted:,}개 제거")
+
+    # 4. 새로 추가되었거나 바뀐 책만 여러 개씩 묶어 동시에 임베딩합니다.
+    new_positions = np.flatnonzero(~reused)
+    errors = [None] * len(df)
+    if len(new_positions):
+        new_embeddings, new_errors = embed_texts(client, df['combined_text'].iloc[new_positions].tolist(), model=EMBEDDING_MODEL)
+        for pos, embedding, error in zip(new_positions, new_embeddings, new_errors):
+            vectors[pos] = embedding
+            errors[pos] = error
+
+    # 임베딩 생성에 실패한 행은 어떤 책인지 알린 뒤 제거합니다.
+    failed = np.array([v is None for v in vectors], dtype=bool)
+    if failed.any():
+        print(f"⚠️ {int(failed.sum())}권의 임베딩 생성에 실패하여 벡터 저장소에서 제외합니다:")
+        for pos in np.flatnonzero(failed):
+            print(f"  - {df['name'].iloc[pos]}: {errors[pos]}")
+    df = df[~failed].reset_index(drop=True)
+    embeddings_matrix = np.array([v for v in vectors if v is not None], dtype=np.float32)
+
+    # 5. 책 소개와 목차를 청크로 나눠 따로 임베딩합니다. (질의와 가장 가까운 부분만 LLM에 보내기 위함)
+    chunks, chunk_matrix = embed_chunks(df, incremental=incremental)
 
     print("임베딩 생성 완료!")
 
-    # 4. 데이터 저장 (기존과 동일)
-    df.to_pickle('vector_store.pkl')
-    embeddings_matrix = np.array(df['embedding'].tolist())
-    np.save('embeddings_matrix.npy', embeddings_matrix)
+    # 6. 데이터 저장: 임베딩 행렬과 도서 정보를 버전이 있는 저장소 형식으로 저장합니다.
+    #    청크 인덱스, BM25 역색인, 태그, ANN 인덱스까지 새 빌드 디렉터리에 쓴 뒤에 게시하므로,
+    #    그 사이에 저장소를 다시 연 앱이 인덱스 없는 빌드를 새 build_id로 캐시하지 않습니다.
+    save_store(VECTOR_STORE_DIR, df, embeddings_matrix, dtype=dtype, embedding_model=EMBEDDING_MODEL, writers=(
+        lambda store: save_chunk_index(store.path, chunks, chunk_matrix, n_books=len(df), dtype=dtype,
+                                       build_id=store.build_id),
+        build_lexical_index,
+        build_book_tags,
+        build_ann_index,
+    ))
 
-    print("✅ 'vector_store.pkl'과 'embeddings_matrix.npy' 파일이 성공적으로 업데이트되었습니다.")
+    print(f"✅ '{VECTOR_STORE_DIR}' 벡터 저장소가 성공적으로 업데이트되었습니다. (임베딩 형식: {dtype})")
     print("이제 챗봇 앱을 실행할 수 있습니다.")
 
 
 if __name__ == "__main__":
-    build_vector_store()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="도서 벡터 저장소를 생성합니다.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="이전 빌드 결과를 재사용하여 새로 추가되었거나 바뀐 책만 임베딩합니다.")
+    parser.add_argument('--dtype', choices=STORE_DTYPES, default='float32',
+                        help="임베딩 행렬 저장 형식 (float16/int8은 용량과 메모리를 줄입니다)")
+    args = parser.parse_args()
+    build_vector_store(incremental=args.incremental, dtype=args.dtype)
@@ -0,0 +1,221 @@
+import json
+import os
+import re
+
+import numpy as np
+
+from retrieval import VectorIndex, normalize_rows, top_k
+from store_format import STORE_DTYPES, quantize_int8
+from tokens import count_tokens, truncate_to_tokens
+
+# --- 청크 인덱스 파일 (벡터 저장소 디렉터리 안에 함께 저장합니다) ---
+#   chunk_embeddings.npy   청크 임베딩 행렬 (책 번호 순으로 정렬, 저장소와 같은 dtype)
+#   chunk_scales.npy       int8일 때만: 행별 역양자화 스케일
+#   chunks.json            저장소 build_id, 책별 청크 구간(book_offsets), 청크별 field/text/content_hash
+CHUNK_EMBEDDINGS_FILE = 'chunk_embeddings.npy'
+CHUNK_SCALES_FILE = 'chunk_scales.npy'
+CHUNKS_FILE = 'chunks.json'
+
+CHUNK_MAX_TOKENS = 200           # 청크 하나의 최대 토큰 수
+CHUNK_FIELDS = {'intro': '책 소개', 'table': '목차'}
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def _split_long_unit(unit, max_tokens):
+    """한 문장(한 줄)이 청크 한도보다 길면 단어 단위로 나눕니다."""
+    pieces, current = [], ""
+    for word in unit.split():
+        candidate = f"{current} {word}" if current else word
+        if current and count_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            candidate = word
+        current = candidate
+    if current:
+        pieces.append(current)
+    return [truncate_to_tokens(piece, max_tokens) for piece in pieces]
+
+
+def split_into_chunks(text, max_tokens=CHUNK_MAX_TOKENS):
+    """
+    텍스트를 문장(목차는 줄) 단위로 나눈 뒤, max_tokens를 넘지 않도록 이어 붙여 청크 목록을 만듭니다.
+    """
+    if not isinstance(text, str):
+        return []
+    units = []
+    for unit in _SENTENCE_BOUNDARY.split(text):
+        unit = ' '.join(unit.split())
+        if not unit:
+            continue
+        units.extend(_split_long_unit(unit, max_tokens) if count_tokens(unit) > max_tokens else [unit])
+
+    chunks, current = [], ""
+    for unit in units:
+        candidate = f"{current}\n{unit}" if current else unit
+        if current and count_tokens(candidate) > max_tokens:
+            chunks.append(current)
+            candidate = unit
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def make_chunks(books_df, max_tokens=CHUNK_MAX_TOKENS):
+    """
+    도서 데이터프레임의 intro/table을 청크로 나눕니다. 책 번호 순으로 정렬된 dict 리스트를 반환합니다.
+    embedding_text에는 검색 품질을 위해 책 제목과 필드 이름을 앞에 붙입니다.
+    """
+    chunks = []
+    for book, row in enumerate(books_df.to_dict('records')):
+        for field, label in CHUNK_FIELDS.items():
+            for text in split_into_chunks(row.get(field), max_tokens):
+                chunks.append({
+                    'book': book,
+                    'field': field,
+                    'text': text,
+                    'embedding_text': f"{row.get('name', '')} - {label}: {text}",
+                })
+    return chunks
+
+
+class ChunkIndex:
+    """
+    청크 단위 검색 인덱스입니다. 청크는 책 번호 순으로 정렬되어 있어
+    book_offsets[b]:book_offsets[b+1] 구간이 책 b의 청크입니다.
+    질의 시에는 모든 청크 점수를 한 번에 계산한 뒤 책별 최고 점수로 모읍니다.
+    """
+
+    def __init__(self, vector_index, book_offsets, fields, texts, content_hashes=None, build_id=None):
+        self.vector_index = vector_index
+        self.book_offsets = np.asarray(book_offsets, dtype=np.int64)
+        self.fields = list(fields)
+        self.texts = list(texts)
+        self.content_hashes = list(content_hashes) if content_hashes is not None else None
+        self.build_id = build_id
+        # 청크별 책 번호 (책 필터를 청크 필터로 바꿀 때 사용)
+        self.chunk_books = np.repeat(np.arange(self.n_books), np.diff(self.book_offsets))
+        # 필드별 청크 마스크 (목차 청크만 따로 볼 때 사용)
+        self.field_masks = {field: np.array([f == field for f in self.fields], dtype=bool) for field in CHUNK_FIELDS}
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def n_books(self):
+        return len(self.book_offsets) - 1
+
+    def score(self, query_embedding, books=None):
+        """
+        질의 벡터와 청크 사이의 코사인 유사도를 계산합니다.
+        books(책 번호 배열)를 넘기면 그 책들의 청크만 계산하고, 나머지 청크의 점수는 -inf로 둡니다.
+        """
+        return self.score_many(np.asarray(query_embedding, dtype=np.float32)[np.newaxis, :], books)[0]
+
+    def score_many(self, queries, books=None):
+        """score()의 배치 버전입니다. 질의 벡터 행렬(질의 수, 차원)의 청크 점수를 행렬 곱 한 번으로 계산합니다."""
+        queries = np.asarray(queries, dtype=np.float32)
+        if books is None:
+            return self.vector_index.score(queries)
+
+        allowed = np.zeros(self.n_books, dtype=bool)
+        allowed[np.asarray(books, dtype=np.int64)] = True
+        rows = np.flatnonzero(allowed[self.chunk_books])
+        scores = np.full((len(queries), len(self)), -np.inf, dtype=np.float32)
+        if len(rows):
+            scores[:, rows] = normalize_rows(queries) @ self.vector_index.rows(rows).T
+        return scores
+
+    def book_scores(self, chunk_scores):
+        """청크 점수를 책별 최고 점수로 모읍니다. 청크가 없는 책은 -inf입니다."""
+        scores = np.full(self.n_books, -np.inf, dtype=np.float32)
+        has_chunks = np.diff(self.book_offsets) > 0
+        if has_chunks.any():
+            starts = self.book_offsets[:-1][has_chunks]
+            scores[has_chunks] = np.maximum.reduceat(chunk_scores, starts)
+        return scores
+
+    def best_scores(self, chunk_scores, books, field=None):
+        """
+        books(책 번호 배열)마다 가장 높은 청크 점수를 반환합니다. 청크가 없는 책은 -inf입니다.
+        field('intro' 또는 'table')를 주면 그 필드의 청크만 봅니다. (재순위화 특징용, 후보 수만큼만 계산)
+        """
+        mask = self.field_masks[field] if field is not None else None
+        scores = np.full(len(books), -np.inf, dtype=np.float32)
+        for i, book in enumerate(np.asarray(books).tolist()):
+            start, stop = self.book_offsets[book], self.book_offsets[book + 1]
+            book_chunk_scores = chunk_scores[start:stop] if mask is None else chunk_scores[start:stop][mask[start:stop]]
+            if len(book_chunk_scores):
+                scores[i] = book_chunk_scores.max()
+        return scores
+
+    def top_books(self, chunk_scores, k=5):
+        """청크 점수에서 책별 최고 점수 기준 상위 k권의 (book_indices, book_scores)를 반환합니다."""
+        scores = self.book_scores(chunk_scores)
+        indices = top_k(scores, k)
+        indices = indices[np.isfinite(scores[indices])]
+        return indices, scores[indices]
+
+    def search(self, query_embedding, k=5, subset=None):
+        """
+        책 단위 Top-K 검색입니다. (book_indices, book_scores, chunk_scores)를 반환하며,
+        chunk_scores는 best_chunks()에서 책별 대표 청크를 고를 때 다시 사용합니다.
+        subset(책 번호 배열)을 넘기면 그 책들의 청크만 점수를 계산합니다.
+        """
+        chunk_scores = self.score(query_embedding, books=subset)
+        indices, scores = self.top_books(chunk_scores, k)
+        return indices, scores, chunk_scores
+
+    def best_chunks(self, chunk_scores, book, n=2):
+        """책 하나에서 질의와 가장 가까운 청크 n개의 (field, text)를 원문 순서대로 반환합니다."""
+        start, stop = self.book_offsets[book], self.book_offsets[book + 1]
+        if start == stop:
+            return []
+        local = np.sort(top_k(chunk_scores[start:stop], n))
+        return [(self.fields[start + i], self.texts[start + i]) for i in local]
+
+
+def save_chunk_index(path, chunks, embeddings_matrix, n_books, dtype='float32', build_id=None):
+    """make_chunks() 결과와 청크 임베딩을 저장소 디렉터리(path)에 저장합니다."""
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"지원하지 않는 dtype입니다: {dtype} (가능한 값: {', '.join(STORE_DTYPES)})")
+    if len(chunks) != len(embeddings_matrix):
+        raise ValueError("청크 수와 임베딩 행렬의 행 수가 일치하지 않습니다.")
+
+    matrix = normalize_rows(embeddings_matrix)
+    if dtype == 'int8':
+        matrix, scales = quantize_int8(matrix)
+        np.save(os.path.join(path, CHUNK_SCALES_FILE), scales)
+    else:
+        matrix = matrix.astype(dtype)
+    np.save(os.path.join(path, CHUNK_EMBEDDINGS_FILE), matrix)
+
+    books = np.array([chunk['book'] for chunk in chunks], dtype=np.int64)
+    book_offsets = np.concatenate([[0], np.cumsum(np.bincount(books, minlength=n_books))])
+    payload = {
+        'build_id': build_id,
+        'dtype': dtype,
+        'book_offsets': book_offsets.tolist(),
+        'columns': {
+            'field': [chunk['field'] for chunk in chunks],
+            'text': [chunk['text'] for chunk in chunks],
+            'content_hash': [chunk.get('content_hash') for chunk in chunks],
+        },
+    }
+    with open(os.path.join(path, CHUNKS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_chunk_index(path, mmap=True):
+    """저장소 디렉터리에서 청크 인덱스를 엽니다. 파일이 없으면 FileNotFoundError를 발생시킵니다."""
+    with open(os.path.join(path, CHUNKS_FILE), encoding='utf-8') as f:
+        payload = json.load(f)
+
+    matrix = np.load(os.path.join(path, CHUNK_EMBEDDINGS_FILE), mmap_mode='r' if mmap else None)
+    scales = None
+    if payload['dtype'] == 'int8':
+        scales = np.load(os.path.join(path, CHUNK_SCALES_FILE), mmap_mode='r' if mmap else None)
+
+    columns = payload['columns']
+    return ChunkIndex(VectorIndex(matrix, normalized=True, scales=scales), payload['book_offsets'],
+                      columns['field'], columns['text'], columns.get('content_hash'), payload.get('build_id'))
@@ -0,0 +1,83 @@
+from tokens import count_tokens, truncate_to_tokens
+
+DEFAULT_TOKEN_BUDGET = 3000      # 도서 목록 부분에 쓸 최대 토큰 수
+MIN_INTRO_TOKENS = 60            # 책 소개를 이보다 짧게 자르느니 후보 수를 줄입니다.
+TRUNCATION_MARK = "…"
+
+
+class BookFragment:
+    """프롬프트에 들어갈 책 한 권의 조각입니다. 머리말(책 ID, 제목)과 소개글, 각각의 토큰 수를 미리 계산해 둡니다."""
+
+    def __init__(self, book_id, header, intro):
+        self.book_id = book_id
+        self.header = header
+        self.intro = intro
+        self.header_tokens = count_tokens(header)
+        self.intro_tokens = count_tokens(intro)
+
+    @property
+    def tokens(self):
+        return self.header_tokens + self.intro_tokens
+
+    def render(self, intro_token_limit=None):
+        """소개글을 intro_token_limit 토큰으로 잘라 프롬프트 한 줄을 만듭니다."""
+        if intro_token_limit is None or self.intro_tokens <= intro_token_limit:
+            return f"{self.header}{self.intro}\n"
+        # 말줄임표가 차지할 토큰 하나를 남겨 두고 자릅니다.
+        return f"{self.header}{truncate_to_tokens(self.intro, intro_token_limit - 1)}{TRUNCATION_MARK}\n"
+
+
+class ContextBuilder:
+    """
+    전체 도서 목록 프롬프트 대신, 후보 도서만 토큰 예산 안에 담아 프롬프트 컨텍스트를 만듭니다.
+    책별 프롬프트 조각과 토큰 수는 로드 시점에 한 번만 계산합니다.
+    book_ids(책마다 하나, 예: BookCatalog.ids)를 주면 머리말과 build() 결과에 그 ID를 쓰고, 없으면 DataFrame 인덱스를 씁니다.
+    """
+
+    def __init__(self, books_df, book_ids=None):
+        self.fragments = []
+        book_ids = books_df.index if book_ids is None else book_ids
+        for book_id, row in zip(book_ids, books_df.to_dict('records')):
+            name = row.get('name') or '이름 없음'
+            intro = row.get('intro')
+            intro = '소개 없음' if not isinstance(intro, str) or not intro.strip() else intro
+            self.fragments.append(BookFragment(book_id, f"[{book_id}] **{name}**: ", intro))
+        self._by_id = {fragment.book_id: fragment for fragment in self.fragments}
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def build(self, candidate_ids=None, token_budget=DEFAULT_TOKEN_BUDGET):
+        """
+        후보 도서(우선순위 순서)를 토큰 예산 안에 담은 컨텍스트를 만듭니다.
+        먼저 모든 후보에게 예산을 고르게 나눠 소개글을 자르고, 남는 예산은 우선순위가 높은 책부터 돌려줍니다.
+        예산이 부족하면 우선순위가 낮은 후보부터 제외합니다.
+        (context_text, 포함된 book_id 리스트, 컨텍스트 토큰 수)를 반환합니다.
+        """
+        if candidate_ids is None:
+            fragments = list(self.fragments)
+        else:
+            fragments = [self._by_id[book_id] for book_id in candidate_ids if book_id in self._by_id]
+
+        # 모든 후보가 최소 분량의 소개글을 가질 수 있을 때까지 후보 수를 줄입니다.
+        while fragments and sum(min(f.tokens, f.header_tokens + MIN_INTRO_TOKENS) for f in fragments) > token_budget:
+            fragments.pop()
+
+        if not fragments:
+            return "", [], 0
+
+        # 1차: 예산을 고르게 나눠 소개글 길이를 정합니다.
+        share = token_budget // len(fragments)
+        limits = [max(min(f.intro_tokens, share - f.header_tokens), min(f.intro_tokens, MIN_INTRO_TOKENS)) for f in fragments]
+
+        # 2차: 남은 예산을 우선순위가 높은 책부터, 잘린 소개글에 돌려줍니다.
+        remaining = token_budget - sum(f.header_tokens + limit for f, limit in zip(fragments, limits))
+        for i, fragment in enumerate(fragments):
+            if remaining <= 0:
+                break
+            extra = min(fragment.intro_tokens - limits[i], remaining)
+            limits[i] += extra
+            remaining -= extra
+
+        context = "".join(f.render(limit) for f, limit in zip(fragments, limits))
+        return context, [f.book_id for f in fragments], count_tokens(context)
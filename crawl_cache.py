@@ -0,0 +1,66 @@
+import json
+import os
+import time
+
+DEFAULT_CACHE_DIR = 'crawl_cache'
+
+
+def _write_atomically(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class CrawlCache:
+    """
+    상품 코드별로 원본 HTML과 ETag/Last-Modified 정보를 디스크에 저장하는 크롤링 캐시입니다.
+    crawl_cache/{code}.html 에 본문을, crawl_cache/{code}.json 에 응답 메타데이터를 보관합니다.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _html_path(self, code):
+        return os.path.join(self.directory, f"{code}.html")
+
+    def _meta_path(self, code):
+        return os.path.join(self.directory, f"{code}.json")
+
+    def load(self, code):
+        """캐시된 (html, meta)를 반환합니다. 없으면 (None, None)을 반환합니다."""
+        try:
+            with open(self._html_path(code), encoding='utf-8') as f:
+                html = f.read()
+            with open(self._meta_path(code), encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None, None
+        return html, meta
+
+    def conditional_headers(self, code):
+        """캐시된 응답이 있으면 조건부 요청 헤더(If-None-Match / If-Modified-Since)를 만듭니다."""
+        _, meta = self.load(code)
+        if not meta:
+            return {}
+        conditional = {}
+        if meta.get('etag'):
+            conditional['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            conditional['If-Modified-Since'] = meta['last_modified']
+        return conditional
+
+    def save(self, code, url, html, etag=None, last_modified=None):
+        """새로 받은 본문과 메타데이터를 저장합니다."""
+        _write_atomically(self._html_path(code), html)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified,
+                'fetched_at': time.time(), 'validated_at': time.time()}
+        _write_atomically(self._meta_path(code), json.dumps(meta, ensure_ascii=False))
+
+    def mark_validated(self, code):
+        """304 응답으로 캐시된 본문이 여전히 유효함을 확인한 시각을 기록합니다."""
+        _, meta = self.load(code)
+        if meta is not None:
+            meta['validated_at'] = time.time()
+            _write_atomically(self._meta_path(code), json.dumps(meta, ensure_ascii=False))
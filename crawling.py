@@ -1,130 +1,212 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import asyncio
 import time # 예의를 지키는 크롤링을 위해 time 라이브러리 추가
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import aiohttp
 import pandas as pd
 
-# 크롤링을 위한 코드 리스트
-code_list = [7921251,103990890,91868851,11928450,89707566,146284662,148175776,147973900,116255710,145757238,120242691,142637189,150108736,130167416,148063482,147976182,125313295,126338963,123878435,116605554]
+from book_catalog import COVER_URL
+from crawl_cache import DEFAULT_CACHE_DIR, CrawlCache
+from extraction import extract_fields
+
+# 크롤링할 도서 목록: yes24 상품 코드 → (책 이름, 저자)
+BOOKS = {
+    7921251: ('린 스타트업', '에릭 리스'),
+    103990890: ('제로 투 원', '피터 틸, 블레이크 매스터스'),
+    91868851: ('비즈니스 아이디어의 탄생', '데이비드 블랜드, 알렉산더 오스터왈더'),
+    11928450: ('기업 창업가 매뉴얼', '스티브 블랭크, 밥 도프'),
+    89707566: ('아이디어 불패의 법칙', '알베르토 사보이아'),
+    146284662: ('그냥 하는 사람', '김한균'),
+    148175776: ('브랜드 창업 마스터', '이종구'),
+    147973900: ('창업이 막막할 때 필요한 책', '이건호, 강주현'),
+    116255710: ('마케팅 설계자', '러셀 브런슨'),
+    145757238: ('스타트업 설계자', '제프 워커'),
+    120242691: ('브랜드 설계자', '러셀 브런슨'),
+    142637189: ('24시간 완성! 챗GPT 스타트업 프롬프트 설계', '박희용'),
+    150108736: ('투자자는 무엇에 꽂히는가', '비드리머 컨설팅 그룹'),
+    130167416: ('스토리 설계자', '짐 에드워즈'),
+    148063482: ('스타트업 30분 회계', '박순웅'),
+    147976182: ('세균무기의 스타트업 바운스백', '세균무기'),
+    125313295: ('VC 스타트업', '김기영'),
+    126338963: ('스타트업 HR 팀장들', '강정욱, 김민교, 윤명훈'),
+    123878435: ('스타트업 자금조달 바이블', '이영보, 서은경, 박찬우, 김봉윤, 신상열, 최준호, 이현권, 이윤주, 임정우'),
+    116605554: ('스타트업 디자인 씽킹', '고은희'),
+}
+
+PRODUCT_URL = 'https://www.yes24.com/product/goods/{code}'
 
-#리스트 생성
-name = ['린 스타트업', '제로 투 원', '비즈니스 아이디어의 탄생', '기업 창업가 매뉴얼', '아이디어 불패의 법칙', '그냥 하는 사람', '브랜드 창업 마스터', '창업이 막막할 때 필요한 책', '마케팅 설계자', '스타트업 설계자', '브랜드 설계자', '24시간 완성! 챗GPT 스타트업 프롬프트 설계', '투자자는 무엇에 꽂히는가', '스토리 설계자', '스타트업 30분 회계', '세균무기의 스타트업 바운스백', 'VC 스타트업', '스타트업 HR 팀장들', '스타트업 자금조달 바이블', '스타트업 디자인 씽킹']
-author = ['에릭 리스', '피터 틸, 블레이크 매스터스', '데이비드 블랜드, 알렉산더 오스터왈더', '스티브 블랭크, 밥 도프', '알베르토 사보이아', '김한균', '이종구', '이건호, 강주현', '러셀 브런슨', '제프 워커', '러셀 브런슨', '박희용', '비드리머 컨설팅 그룹', '짐 에드워즈', '박순웅', '세균무기', '김기영', '강정욱, 김민교, 윤명훈', '이영보, 서은경, 박찬우, 김봉윤, 신상열, 최준호, 이현권, 이윤주, 임정우', '고은희']
-intro = []
-table = []
+# --- 크롤링 설정 ---
+MAX_CONCURRENCY = 8          # 동시에 진행할 요청 수
+REQUESTS_PER_SECOND = 2.0    # 호스트별 초당 최대 요청 수 (서버에 부담을 주지 않기 위한 제한)
+MAX_RETRIES = 3
+REQUEST_TIMEOUT_SECONDS = 30
 
 # User-Agent 헤더 추가 (봇으로 인식되는 것을 방지)
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
-for i in code_list:
-    # yes24 URL 구성
-    url = f'https://www.yes24.com/product/goods/{i}'
-
-    try:
-        # HTTP GET 요청을 통해 데이터 가져오기
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        # BeautifulSoup을 사용하여 HTML 파싱
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # [수정] 새로운 클래스 이름으로 소개글 요소를 찾습니다.
-        intro_element = soup.find('div', class_="infoWrap_txtInner")
-
-        # 소개글 요소가 존재하는지 확인 후 리스트에 추가합니다.
-        if intro_element:
-            # \n(줄바꿈)을 띄어쓰기로 바꾸고, \r(커서이동)은 완전히 삭제한 후, 양 끝 공백을 제거합니다.
-            clean_text = intro_element.text.replace('\n', '').replace('\r', '').strip()
-            intro.append(clean_text)
-                
-        else:
-            intro.append("소개 정보를 찾을 수 없습니다.")
-
-    except requests.exceptions.RequestException as e:
-        print(f"HTTP 요청 오류 (코드: {i}): {e}")
-        intro.append("페이지를 불러올 수 없습니다.")
-        
-    # 서버에 부담을 주지 않기 위해 각 요청 사이에 짧은 지연시간을 둡니다.
-    time.sleep(1)
-
-code_list_table = [7921251,103990890,91868851,11928450,146284662,147973900,116255710,145757238,120242691,142637189,150108736,148063482,147976182,125313295,126338963,123878435,116605554]
-
-for i in code_list_table:
-    # yes24 URL 구성
-    url = f'https://www.yes24.com/product/goods/{i}'
 
+class HostRateLimiter:
+    """호스트별로 요청 사이의 최소 간격을 보장하는 비동기 속도 제한기입니다."""
+
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND):
+        self.interval = 1.0 / requests_per_second
+        self._next_slot = {}
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        async with self._locks[host]:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+def parse_book_page(code, html):
+    """
+    상품 페이지 HTML을 한 번만 파싱하여 소개글, 목차, 표지 URL을 함께 추출합니다.
+    (선택자는 extraction.py의 FIELD_SELECTORS에서 관리합니다)
+    """
+    fields = extract_fields(html, code)
+
+    if fields['intro'] is not None:
+        # \n(줄바꿈)과 \r(커서이동)을 삭제한 후, 양 끝 공백을 제거합니다.
+        intro = fields['intro'].replace('\n', '').replace('\r', '').strip()
+    else:
+        intro = "소개 정보를 찾을 수 없습니다."
+
+    if fields['table'] is not None:
+        table = fields['table'].strip()
+    else:
+        table = "목차 정보를 찾을 수 없습니다."
+
+    # 표지 이미지는 og:image 메타 태그에서 가져오고, 없으면 yes24의 표지 URL 규칙을 사용합니다.
+    cover = fields['cover'] or COVER_URL.format(code=code)
+
+    return {'intro': intro, 'table': table, 'cover': cover}
+
+
+async def fetch_page(session, url, semaphore, rate_limiter, extra_headers=None):
+    """
+    동시 요청 수와 호스트별 속도를 제한하면서 페이지를 가져옵니다. 일시적인 오류는 재시도합니다.
+    (상태 코드, 본문, 응답 헤더)를 반환하며, 조건부 요청에 304로 응답하면 본문은 None입니다.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        async with semaphore:
+            await rate_limiter.wait(url)
+            try:
+                async with session.get(url, headers=extra_headers) as response:
+                    if response.status == 304:
+                        return response.status, None, response.headers
+                    if response.status == 429 or response.status >= 500:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                          status=response.status, message=response.reason)
+                    response.raise_for_status()
+                    return response.status, await response.text(), response.headers
+            except aiohttp.ClientResponseError as e:
+                if (e.status != 429 and e.status < 500) or attempt == MAX_RETRIES:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == MAX_RETRIES:
+                    raise
+        await asyncio.sleep(2 ** attempt)
+
+
+def _unavailable(code):
+    return {'intro': "페이지를 불러올 수 없습니다.", 'table': "페이지를 불러올 수 없습니다.",
+            'cover': COVER_URL.format(code=code)}
+
+
+async def crawl_book(session, code, semaphore, rate_limiter, cache=None, stats=None):
+    """
+    책 한 권의 상품 페이지를 한 번만 가져와 도서 레코드를 만듭니다.
+    캐시가 있으면 조건부 요청을 보내고, 304(변경 없음)이면 캐시된 본문을 다시 파싱합니다.
+    """
+    name, author = BOOKS.get(code, (None, None))
+    record = {'code': code, 'name': name, 'author': author}
+    url = PRODUCT_URL.format(code=code)
+
+    conditional = cache.conditional_headers(code) if cache else {}
     try:
-        # HTTP GET 요청을 통해 데이터 가져오기
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        # BeautifulSoup을 사용하여 HTML 파싱
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # [수정] 새로운 클래스 이름으로 목차 요소를 찾습니다.
-        table_element = soup.find_all('div', class_="infoWrap_txt")[1]
-
-        # 목차 요소가 존재하는지 확인 후 리스트에 추가합니다.
-        if table_element:
-            #양 끝 공백을 제거합니다.
-            clean_text = table_element.text.strip()
-            table.append(clean_text)
-                
+        status, html, response_headers = await fetch_page(session, url, semaphore, rate_limiter, conditional)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"HTTP 요청 오류 (코드: {code}): {e}")
+        record.update(_unavailable(code))
+        return record
+
+    if status == 304:
+        html, _ = cache.load(code)
+        cache.mark_validated(code)
+        if stats is not None:
+            stats['not_modified'] += 1
+    else:
+        if cache:
+            cache.save(code, url, html, etag=response_headers.get('ETag'),
+                       last_modified=response_headers.get('Last-Modified'))
+        if stats is not None:
+            stats['downloaded'] += 1
+
+    record.update(parse_book_page(code, html))
+    return record
+
+
+def crawl_offline(codes, cache):
+    """네트워크 요청 없이 캐시된 HTML만 다시 파싱합니다. (선택자 수정 후 재파싱 등)"""
+    records = {}
+    for code in codes:
+        name, author = BOOKS.get(code, (None, None))
+        record = {'code': code, 'name': name, 'author': author}
+        html, _ = cache.load(code)
+        if html is None:
+            print(f"캐시에 페이지가 없습니다 (코드: {code})")
+            record.update(_unavailable(code))
         else:
-            table.append("목차 정보를 찾을 수 없습니다.")
-
-    except requests.exceptions.RequestException as e:
-        print(f"HTTP 요청 오류 (코드: {i}): {e}")
-        table.append("페이지를 불러올 수 없습니다.")
-        
-    # 서버에 부담을 주지 않기 위해 각 요청 사이에 짧은 지연시간을 둡니다.
-    time.sleep(1)
-
-url = f'https://www.yes24.com/product/goods/89707566'
-
-response = requests.get(url, headers=headers)
-response.raise_for_status()
-
-soup = BeautifulSoup(response.text, 'html.parser')
-
-table_element = soup.find_all('div', class_="infoWrap_txt")[2]
-clean_text = table_element.text.strip()
-
-table.insert(4, clean_text)
-
-url = f'https://www.yes24.com/product/goods/148175776'
-
-response = requests.get(url, headers=headers)
-response.raise_for_status()
-
-soup = BeautifulSoup(response.text, 'html.parser')
-
-table_element = soup.find_all('div', class_="infoWrap_txt")[2]
-clean_text = table_element.text.strip()
-
-table.insert(6, clean_text)
-
-url = f'https://www.yes24.com/product/goods/130167416'
-
-response = requests.get(url, headers=headers)
-response.raise_for_status()
-
-soup = BeautifulSoup(response.text, 'html.parser')
-
-table_element = soup.find_all('div', class_="infoWrap_txt")[2]
-clean_text = table_element.text.strip()
-
-table.insert(13, clean_text)
-
-data = {
-        'name': name,
-        'author': author,
-        'intro': intro,
-        'table': table
-    }
-
-df_total = pd.DataFrame(data)
-print(df_total)
-
-df_total.to_csv('books_data_new.csv', index=False, encoding='utf-8-sig')
\ No newline at end of file
+            record.update(parse_book_page(code, html))
+        records[code] = record
+    return records
+
+
+async def crawl(codes, max_concurrency=MAX_CONCURRENCY, requests_per_second=REQUESTS_PER_SECOND, cache=None):
+    """여러 상품 코드를 비동기로 크롤링하여 {상품 코드: 도서 레코드} 딕셔너리를 반환합니다."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    rate_limiter = HostRateLimiter(requests_per_second)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+    stats = {'downloaded': 0, 'not_modified': 0}
+
+    async with aiohttp.ClientSession(headers=headers, connector=connector, timeout=timeout) as session:
+        records = await asyncio.gather(*(crawl_book(session, code, semaphore, rate_limiter, cache, stats)
+                                         for code in codes))
+    print(f"새로 받은 페이지 {stats['downloaded']}개 · 변경 없음(304) {stats['not_modified']}개")
+    return {record['code']: record for record in records}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="yes24 도서 페이지를 크롤링하여 books_data_new.csv를 만듭니다.")
+    parser.add_argument('--offline', action='store_true', help="네트워크 요청 없이 캐시된 HTML만 다시 파싱합니다.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help="HTML 캐시를 사용하지 않고 모든 페이지를 새로 받습니다.")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else CrawlCache(args.cache_dir)
+    start = time.perf_counter()
+    if args.offline:
+        if cache is None:
+            parser.error("--offline은 --no-cache와 함께 사용할 수 없습니다.")
+        records = crawl_offline(list(BOOKS), cache)
+    else:
+        records = asyncio.run(crawl(list(BOOKS), cache=cache))
+    print(f"{len(records)}권 크롤링 완료 ({time.perf_counter() - start:.1f}초)")
+
+    df_total = pd.DataFrame(list(records.values()), columns=['code', 'name', 'author', 'intro', 'table', 'cover'])
+    print(df_total)
+
+    df_total.to_csv('books_data_new.csv', index=False, encoding='utf-8-sig')
+
+
+if __name__ == "__main__":
+    main()
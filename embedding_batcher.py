@@ -0,0 +1,134 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+
+from tokens import count_tokens, truncate_to_tokens
+
+# --- 배치 임베딩 설정 ---
+MAX_INPUTS_PER_REQUEST = 2048      # embeddings API가 한 요청에 허용하는 최대 입력 수
+MAX_TOKENS_PER_REQUEST = 100_000   # 한 요청에 담을 토큰 예산
+MAX_TOKENS_PER_INPUT = 8191        # text-embedding-3-* 모델의 입력당 최대 토큰
+MAX_WORKERS = 4                    # 동시에 진행할 요청 수
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# 재시도하면 성공할 수 있는 오류 (속도 제한, 일시적인 네트워크/서버 오류)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+# 특정 입력 때문에 요청 전체가 거절되는 오류. 이때만 한 건씩 다시 보내 문제가 된 텍스트를 골라냅니다.
+# (인증 오류나 재시도를 다 쓴 일시적 오류는 한 건씩 보내도 똑같이 실패하므로 요청만 늘어납니다)
+INPUT_ERRORS = (
+    openai.BadRequestError,
+    openai.UnprocessableEntityError,
+)
+
+
+def pack_batches(token_counts, max_tokens=MAX_TOKENS_PER_REQUEST, max_inputs=MAX_INPUTS_PER_REQUEST):
+    """입력 순서를 유지하면서, 토큰 예산과 입력 수 한도 안에서 텍스트 인덱스를 요청 단위로 묶습니다."""
+    batches = []
+    current, current_tokens = [], 0
+    for i, n_tokens in enumerate(token_counts):
+        if current and (current_tokens + n_tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _backoff_delay(attempt):
+    """지수 백오프에 지터를 더한 대기 시간을 반환합니다."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def _request_embeddings(client, texts, model, max_retries):
+    """한 번의 embeddings 요청을 보내고, 속도 제한 등 일시적 오류는 백오프 후 재시도합니다."""
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.embeddings.create(input=texts, model=model)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            time.sleep(_backoff_delay(attempt))
+
+
+def _embed_batch(client, texts, model, max_retries):
+    """
+    배치 하나를 임베딩합니다. 입력 때문에 요청이 거절되면(INPUT_ERRORS) 문제가 된 텍스트만 골라내기 위해
+    한 건씩 다시 요청하고, 그 밖의 오류(재시도를 다 쓴 속도 제한, 인증 오류 등)는 배치 전체를 실패로 표시합니다.
+    (embeddings, errors) 튜플을 반환하며 실패한 위치의 임베딩은 None입니다.
+    """
+    try:
+        return _request_embeddings(client, texts, model, max_retries), [None] * len(texts)
+    except INPUT_ERRORS as e:
+        if len(texts) == 1:
+            return [None], [e]
+    except Exception as e:
+        return [None] * len(texts), [e] * len(texts)
+
+    embeddings, errors = [], []
+    for text in texts:
+        try:
+            embeddings.append(_request_embeddings(client, [text], model, max_retries)[0])
+            errors.append(None)
+        except Exception as e:
+            embeddings.append(None)
+            errors.append(e)
+    return embeddings, errors
+
+
+def embed_texts(client, texts, model, max_workers=MAX_WORKERS, max_tokens_per_request=MAX_TOKENS_PER_REQUEST,
+                max_retries=MAX_RETRIES, verbose=True):
+    """
+    여러 텍스트를 토큰 예산 단위의 배치로 묶어, 제한된 수의 요청을 동시에 보내 임베딩합니다.
+    입력과 같은 순서의 (embeddings, errors) 리스트를 반환하며, 실패하거나 비어 있는 텍스트의 임베딩은 None입니다.
+    """
+    texts = [truncate_to_tokens(str(text).replace("\n", " "), MAX_TOKENS_PER_INPUT) for text in texts]
+    embeddings = [None] * len(texts)
+    errors = [None] * len(texts)
+
+    valid = [i for i, text in enumerate(texts) if text.strip()]
+    for i in set(range(len(texts))) - set(valid):
+        errors[i] = ValueError("빈 텍스트는 임베딩할 수 없습니다.")
+
+    token_counts = [count_tokens(texts[i]) for i in valid]
+    tokens_by_index = dict(zip(valid, token_counts))
+    batches = [[valid[j] for j in batch] for batch in pack_batches(token_counts, max_tokens=max_tokens_per_request)]
+    total_tokens = sum(token_counts)
+
+    if verbose:
+        print(f"텍스트 {len(valid):,}개(약 {total_tokens:,} 토큰)를 {len(batches):,}개 요청으로 나눠 임베딩합니다. (동시 요청 {max_workers}개)")
+
+    start = time.perf_counter()
+    done_texts, done_tokens = 0, 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_embed_batch, client, [texts[i] for i in batch], model, max_retries): batch
+            for batch in batches
+        }
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            batch = futures[future]
+            batch_embeddings, batch_errors = future.result()
+            for i, embedding, error in zip(batch, batch_embeddings, batch_errors):
+                embeddings[i] = embedding
+                errors[i] = error
+
+            done_texts += len(batch)
+            done_tokens += sum(tokens_by_index[i] for i in batch)
+            if verbose:
+                elapsed = max(time.perf_counter() - start, 1e-9)
+                print(f"  [{n_done}/{len(batches)} 요청] {done_texts:,}/{len(valid):,}개 완료 · "
+                      f"{done_texts / elapsed:,.1f}개/초 · {done_tokens / elapsed:,.0f} 토큰/초")
+
+    return embeddings, errors
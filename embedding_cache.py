@@ -0,0 +1,127 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = 'embedding_cache.sqlite3'
+DEFAULT_MAX_MEMORY_ENTRIES = 2048
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60   # 30일
+PURGE_EVERY_N_PUTS = 500                  # 이 횟수만큼 저장할 때마다 만료된 행을 정리합니다.
+
+
+def normalize_text(text):
+    """캐시 키를 만들기 위해 텍스트를 정규화합니다. (유니코드 NFKC, 연속 공백/줄바꿈 → 공백 하나, 양끝 공백 제거)"""
+    text = unicodedata.normalize('NFKC', str(text))
+    return ' '.join(text.split())
+
+
+def cache_key(model, text):
+    """모델 이름과 정규화된 텍스트로 캐시 키를 만듭니다."""
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    질의 임베딩을 위한 2단계 캐시입니다.
+    1단계는 프로세스 안의 크기 제한 LRU, 2단계는 TTL이 있는 SQLite 파일이며,
+    같은 문장을 다시 제출하거나 오류 후 재시도할 때 임베딩 API 호출을 건너뜁니다.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_memory_entries=DEFAULT_MAX_MEMORY_ENTRIES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self.purge_expired()
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model, text):
+        """캐시된 임베딩(np.float32 배열)을 반환합니다. 없거나 만료되었으면 None을 반환합니다."""
+        key = cache_key(model, text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return embedding
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT embedding FROM embeddings WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    embedding = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, embedding)
+                    self.hits_disk += 1
+                    return embedding
+
+            self.misses += 1
+            return None
+
+    def put(self, model, text, embedding):
+        """임베딩을 메모리와 디스크 캐시에 저장합니다."""
+        key = cache_key(model, text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, embedding)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+                    (key, model, embedding.tobytes(), time.time()),
+                )
+                self._db.commit()
+                self._puts += 1
+        if self._puts % PURGE_EVERY_N_PUTS == 0:
+            self.purge_expired()
+        return embedding
+
+    def get_or_compute(self, model, text, compute):
+        """캐시에 있으면 그대로 반환하고, 없으면 compute(text)로 임베딩을 만들어 저장한 뒤 반환합니다."""
+        embedding = self.get(model, text)
+        if embedding is None:
+            embedding = self.put(model, text, compute(text))
+        return embedding
+
+    def purge_expired(self):
+        """TTL이 지난 디스크 캐시 항목을 삭제합니다."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._db.commit()
+
+    def stats(self):
+        """적중/미스 카운터를 반환합니다."""
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'hit_rate': (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
@@ -0,0 +1,908 @@
+"""
+스트림릿 화면과 분리된 추천 엔진입니다.
+저장소 로드 → 질의 임베딩 → 검색 → 프롬프트 구성 → 생성 → 파싱의 전체 파이프라인을 담고 있으며,
+두 스트림릿 앱(new_app.py, app.py)과 HTTP 서버(engine_server.py)가 함께 사용합니다.
+
+    engine = RecommendationEngine(api_key="sk-...")
+    result = engine.recommend('아이디어 검증', '마케팅/영업', "초기 유저 100명을 모으고 싶어요")
+    result['recommendation']
+
+추천 결과의 형식은 style로 고릅니다.
+  - 'ranked' (new_app.py): 1~3순위 책, 추천 이유, 적용 방향, 목차
+    순위는 재순위화기(reranker.py)가 정하고, LLM은 1순위 책 한 권에 대한 추천 이유와 적용 방향만 씁니다.
+  - 'single' (app.py): 책 한 권과 추천 이유
+"""
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from ann_index import ANN_INDEX_PATH, ANN_MIN_CATALOG_SIZE, IVFIndex
+from book_catalog import BookCatalog
+from book_matrix import get_curated_book, get_curated_recommendation
+from book_tags import load_book_tags
+from chunk_index import load_chunk_index
+from context_builder import ContextBuilder
+from embedding_batcher import embed_texts
+from lexical_index import LEXICAL_INDEX_PATH, LexicalIndex
+from llm_client import LLMUnavailableError
+from resources import (get_embedding_cache, get_llm_guard, get_llm_slots, get_openai_client, get_prefetch_executor,
+                       get_request_log, get_response_cache, shared_versioned)
+from reranker import Reranker, feature_matrix
+from retrieval import VectorIndex, normalize_rows, reciprocal_rank_fusion
+from store_format import DEFAULT_STORE_DIR, load_store, read_build_id, resolve_store_path
+from streaming_json import IncrementalJSONObjectParser
+from tokens import truncate_to_tokens
+
+# --- 모델 / 캐시 설정 ---
+EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4o-mini"
+EMBEDDING_CACHE_PATH = 'embedding_cache.sqlite3'
+# 벡터 저장소가 없을 때 'single' 추천에 사용할 도서 목록
+BOOKS_CSV_PATH = 'books_data_new.csv'
+# 추천 결과 캐시: 같은 단계/과제에서 질의 임베딩의 코사인 유사도가 이 값 이상이면 이전 답변을 재사용합니다.
+RESPONSE_CACHE_SIMILARITY = 0.95
+
+# --- LLM 부하 제한 ---
+# 프로세스 전체에서 동시에 진행하는 추천 생성 수와 응답 제한 시간(초, 재시도 포함).
+# 한도를 넘으면 큐레이션 추천(book_matrix.py)으로 응답합니다. 생성이 실패하거나 서킷 브레이커(llm_client.py)가 열려 있으면
+# 검색까지 마친 경우 검색 상위 책으로, 그렇지 않으면 큐레이션 추천으로 응답합니다. (degraded mode)
+LLM_MAX_CONCURRENCY = 8
+LLM_TIMEOUT_SECONDS = 30
+SHED_NOTICE = "요청이 많아 AI 맞춤 추천 대신 추천 도서를 먼저 보여드립니다."
+DEGRADED_NOTICE = "AI 응답이 지연되어 추천 도서를 대신 보여드립니다. 잠시 후 다시 시도해주세요."
+RETRIEVAL_NOTICE = "AI 응답이 지연되어 고민과 가장 가까운 책을 검색 결과로 먼저 보여드립니다. 잠시 후 다시 시도하면 AI 맞춤 추천을 받을 수 있습니다."
+RETRIEVAL_REASON = "입력하신 고민과 책 소개·목차가 가장 가까운 책입니다."
+RETRIEVAL_APPLICATION_POINTS = "AI 응답이 복구되면 같은 고민으로 다시 요청해 이 책의 맞춤 적용 방향을 받아보세요."
+
+# --- 검색 설정 ---
+# 근사 검색(ANN) 설정: nprobe를 키우면 재현율이 오르고 지연시간이 늘어납니다.
+ANN_NPROBE = 8
+# 하이브리드 검색: 벡터 검색과 BM25 검색에서 각각 후보를 뽑아 RRF로 합친 뒤,
+# 융합 상위 RERANK_CANDIDATES권을 재순위화기로 다시 정렬합니다. 'ranked' 추천은 그중 상위 3권을 그대로 씁니다.
+HYBRID_CANDIDATE_POOL = 50
+RRF_K = 60
+RERANK_CANDIDATES = 20
+RECOMMENDATION_CANDIDATES = 3
+# 1순위 책 프롬프트에 넣을, 질의와 가장 가까운 청크(소개/목차 일부) 수와 청크가 없을 때 넣을 소개/목차의 최대 토큰 수
+CHUNKS_PER_BOOK = 2
+BOOK_FIELD_TOKEN_BUDGET = 600
+# 'single' 추천: 프롬프트의 도서 목록 부분에 쓸 최대 토큰 수와 미리 고를 후보 도서 수
+CONTEXT_TOKEN_BUDGET = 3000
+CANDIDATE_POOL_SIZE = 20
+# 카탈로그마다 보관할 (단계, 과제)별 후보 풀 수. 풀 하나는 후보 책과 청크의 float32 벡터를 담습니다.
+CANDIDATE_POOL_CACHE_SIZE = 16
+
+# 배치 요청에서 동시에 생성할 추천 수
+BATCH_MAX_CONCURRENCY = 4
+
+RECOMMENDATION_STYLES = ('ranked', 'single')
+
+
+# --- 저장소와 검색 인덱스 ---
+def _open_vector_index(store):
+    """카탈로그가 크고 ANN 인덱스 파일이 있으면 근사 검색 인덱스를, 아니면 정확 검색 인덱스를 엽니다."""
+    index = store.index()
+    if len(index) >= ANN_MIN_CATALOG_SIZE:
+        try:
+            return IVFIndex.load(index, os.path.join(store.path, ANN_INDEX_PATH), nprobe=ANN_NPROBE)
+        except (FileNotFoundError, ValueError):
+            pass
+    return index
+
+
+def _open_lexical_index(store):
+    """BM25 역색인을 엽니다. 없거나 책 수가 맞지 않으면 None(벡터 검색만 사용)을 반환합니다."""
+    try:
+        lexical_index = LexicalIndex.load(os.path.join(store.path, LEXICAL_INDEX_PATH))
+    except FileNotFoundError:
+        return None
+    return lexical_index if len(lexical_index) == len(store) else None
+
+
+def _open_chunk_index(store):
+    """청크 인덱스를 엽니다. 없거나 다른 빌드에서 만들어졌다면 None(책 단위 검색만 사용)을 반환합니다."""
+    try:
+        chunk_index = load_chunk_index(store.path)
+    except FileNotFoundError:
+        return None
+    return chunk_index if chunk_index.build_id == store.build_id and chunk_index.n_books == len(store) else None
+
+
+def _open_book_tags(store):
+    """단계/과제 태그 비트셋을 엽니다. 없거나 다른 빌드에서 만들어졌다면 None(필터 없이 검색)을 반환합니다."""
+    try:
+        tags = load_book_tags(store.path)
+    except FileNotFoundError:
+        return None
+    return tags if tags.build_id == store.build_id and len(tags) == len(store) else None
+
+
+class CandidatePool:
+    """
+    (단계, 과제) 하나로 좁힌 검색 대상입니다. 태그 필터 결과(subset)와 그 책들·청크들의 float32 벡터를 미리 모아 두어,
+    질의마다 전체 행렬에서 행을 골라 복원하지 않고 작은 행렬과 곱하기만 합니다.
+    태그가 없거나 필터가 전체 카탈로그면 subset은 None이고 원래 인덱스로 전체 검색합니다.
+    근사 검색(IVF) 인덱스는 클러스터 단위로 후보를 고르므로 책 벡터는 모으지 않습니다.
+    """
+
+    def __init__(self, catalog, stage=None, challenge=None):
+        self.vector_index = catalog.vector_index
+        self.chunk_index = catalog.chunk_index
+        self.subset = catalog.book_tags.candidates(stage, challenge) if catalog.book_tags is not None else None
+        self.book_vectors = None
+        self.chunk_rows = None
+        self.chunk_vectors = None
+        if self.subset is None:
+            return
+        if isinstance(self.vector_index, VectorIndex):
+            self.book_vectors = VectorIndex(self.vector_index.rows(self.subset), normalized=True)
+        if self.chunk_index is not None:
+            allowed = np.zeros(self.chunk_index.n_books, dtype=bool)
+            allowed[self.subset] = True
+            self.chunk_rows = np.flatnonzero(allowed[self.chunk_index.chunk_books])
+            self.chunk_vectors = VectorIndex(self.chunk_index.vector_index.rows(self.chunk_rows), normalized=True)
+
+    def search_books(self, queries, k):
+        """질의 벡터 행렬의 책 단위 Top-K 행 번호 (질의 수, k)를 반환합니다. 후보가 k권보다 적으면 -1로 채울 수 있습니다."""
+        if self.book_vectors is None:
+            return self.vector_index.search(queries, k=k, subset=self.subset)[0]
+        indices, _ = self.book_vectors.search(queries, k=k)
+        return self.subset[indices]
+
+    def chunk_scores(self, queries):
+        """질의 벡터 행렬의 청크 점수 (질의 수, 청크 수)를 반환합니다. 후보가 아닌 책의 청크는 -inf입니다."""
+        if self.chunk_vectors is None:
+            return self.chunk_index.score_many(queries, books=self.subset)
+        scores = np.full((len(queries), len(self.chunk_index)), -np.inf, dtype=np.float32)
+        if len(self.chunk_rows):
+            scores[:, self.chunk_rows] = self.chunk_vectors.score(queries)
+        return scores
+
+    def dense_scores(self, query, books):
+        """질의 벡터 하나와 books(책 번호 배열)의 코사인 유사도를 반환합니다. (재순위화 특징용, 후보 수만큼만 계산)"""
+        vector_index = self.vector_index
+        if isinstance(vector_index, IVFIndex):
+            vector_index = vector_index.vector_index
+        query = normalize_rows(np.asarray(query, dtype=np.float32)[None, :])[0]
+        return vector_index.rows(books) @ query
+
+
+class Catalog:
+    """
+    build_id 하나에 해당하는 도서 목록과 검색 인덱스 묶음입니다. 저장소가 다시 빌드되면 엔진이 새로 엽니다.
+    books(BookCatalog)는 책 ID·제목 색인과 표지 URL을 담은 책 레코드로, 열 때 한 번만 만듭니다.
+    벡터 저장소 없이 CSV 도서 목록만 있으면 검색 인덱스는 모두 None입니다.
+    """
+
+    def __init__(self, books_df, build_id=None, vector_index=None, lexical_index=None, chunk_index=None, book_tags=None):
+        self.books_df = books_df
+        self.books = BookCatalog(books_df)
+        self.build_id = build_id
+        self.vector_index = vector_index
+        self.lexical_index = lexical_index
+        self.chunk_index = chunk_index
+        self.book_tags = book_tags
+        self._context_builder = None
+        self._candidate_pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.books_df)
+
+    @classmethod
+    def load(cls, store_dir=DEFAULT_STORE_DIR, books_csv_path=BOOKS_CSV_PATH):
+        """벡터 저장소를 엽니다. 저장소가 없으면 CSV 도서 목록으로 대신하고, 둘 다 없으면 None을 반환합니다."""
+        try:
+            store = load_store(store_dir)
+        except FileNotFoundError:
+            try:
+                return cls(pd.read_csv(books_csv_path))
+            except FileNotFoundError:
+                return None
+        return cls(store.metadata, store.build_id, _open_vector_index(store), _open_lexical_index(store),
+                   _open_chunk_index(store), _open_book_tags(store))
+
+    @property
+    def context_builder(self):
+        """'single' 추천에 쓰는 컨텍스트 빌더입니다. 책별 토큰 수 계산이 필요하므로 처음 사용할 때 만듭니다."""
+        with self._lock:
+            if self._context_builder is None:
+                self._context_builder = ContextBuilder(self.books_df, book_ids=self.books.ids)
+            return self._context_builder
+
+    def candidate_pool(self, stage=None, challenge=None):
+        """(단계, 과제)의 CandidatePool을 반환합니다. 최근에 쓴 CANDIDATE_POOL_CACHE_SIZE개까지 보관합니다."""
+        key = (stage, challenge)
+        with self._lock:
+            pool = self._candidate_pools.get(key)
+            if pool is not None:
+                self._candidate_pools.move_to_end(key)
+                return pool
+        pool = CandidatePool(self, stage, challenge)
+        with self._lock:
+            self._candidate_pools[key] = pool
+            while len(self._candidate_pools) > CANDIDATE_POOL_CACHE_SIZE:
+                self._candidate_pools.popitem(last=False)
+        return pool
+
+    def find_book(self, title, author=None):
+        """제목으로 책 레코드를 찾습니다. 표기가 조금 다른 제목도 찾으며, 없으면 None을 반환합니다. (BookCatalog.find)"""
+        return self.books.find(title, author)
+
+    def attach_book_info(self, recommendation):
+        """
+        큐레이션 추천처럼 제목만 있는 추천 결과에, 도서 목록에 있는 책이면 책 ID(book_id)와 표지(cover)를 붙입니다.
+        'ranked' 형식이면 1~3순위 책마다 붙이고, 1순위 책에는 소개글(intro)도 붙입니다. 목록에 없는 책은 그대로 둡니다.
+        """
+        if 'best_book' not in recommendation:
+            book = self.find_book(recommendation.get('name'), recommendation.get('author'))
+            if book is not None:
+                recommendation.update(book_id=book['book_id'], cover=book['cover'])
+            return
+        entries = [recommendation.get('best_book'), *(recommendation.get('second_and_third_books') or [])]
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict) or 'book_id' in entry:
+                continue
+            book = self.find_book(entry.get('title'), entry.get('author'))
+            if book is None:
+                continue
+            entry.update(book_id=book['book_id'], cover=book['cover'])
+            if position == 0 and isinstance(book.get('intro'), str):
+                entry.setdefault('intro', book['intro'])
+
+
+# --- 프롬프트 ---
+def build_ranked_prompt(stage, challenge, user_problem, book_str, include_table_of_contents=False):
+    """
+    new_app.py의 1순위 책 추천사 프롬프트입니다. 순위는 재순위화기가 이미 정했으므로 1순위 책 정보만 넣습니다.
+    도서 목록에 목차가 없는 책이면 include_table_of_contents=True로 목차 정리도 함께 요청합니다.
+    """
+    missions = [
+        "[근거 강화 리서치] 이 책의 추천 신뢰도를 높일 **구체적인 근거**를 제시하세요. 'OOO 스타트업' 같은 모호한 표현은 절대 사용하지 마세요. 실제 사례를 찾기 어렵다면, 저자의 다른 아티클, 유명인의 긍정적인 리뷰 등을 **가상의 웹 검색 결과**처럼 만들어 근거로 제시하세요.",
+        "[맞춤 추천 이유] 책 소개와 목차 중 사용자의 고민과 맞닿는 부분을 짚어, 사용자의 '성장 단계'와 '당면 과제'에 맞춘 추천 이유를 작성하세요.",
+    ]
+    json_fields = ['"new_reason": "<근거 강화 리서치 결과를 포함한, 새롭게 생성된 맞춤 추천 이유>"']
+    if include_table_of_contents:
+        missions.append("[목차 검색] 이 책의 **실제 목차**를 가상의 웹 검색을 통해 찾아서, 내용에 맞게 줄바꿈(\\n)을 포함한 텍스트로 정리해주세요.")
+        json_fields.append('"table_of_contents": "<검색으로 찾은, 줄바꿈으로 정리된 목차 텍스트>"')
+    missions += [
+        "[적용 방향 제안] 목차를 참고하여, 사용자가 자신의 스타트업에 **어떻게 적용해볼 수 있을지** 구체적인 예시를 2~3가지 제안해주세요. **반드시 각 제안을 \"1. \", \"2. \" 와 같이 숫자로 시작하고 줄바꿈(\\n)으로 구분된 명확한 리스트 형식으로 작성해야 합니다.**",
+        "[최종 답변 생성] 위의 모든 정보를 종합하여, 아래 JSON 형식에 맞춰 최종 답변을 생성하세요.",
+    ]
+    json_fields.append('"application_points": "<숫자 리스트 형식으로 작성된 구체적인 적용 방향 제안>"')
+    missions_str = "\n        ".join(f"{number}. {mission}" for number, mission in enumerate(missions, start=1))
+    json_str = ",\n          ".join(json_fields)
+    return f"""
+        당신은 스타트업 창업가를 돕는 세계 최고의 컨설턴트입니다.
+
+        [사용자 정보]
+        - 성장 단계: '{stage}'
+        - 당면 과제: '{challenge}'
+        - 구체적인 고민: "{user_problem}"
+
+        [추천 도서: 사용자의 고민에 가장 적합한 책으로 이미 선정되었습니다]
+        {book_str}
+
+        [최종 미션]
+        {missions_str}
+
+        ```json
+        {{
+          {json_str}
+        }}
+        ```
+        """
+
+
+def build_single_prompt(stage, challenge, user_problem, book_list_str, id_choices):
+    """app.py의 책 한 권 추천 프롬프트입니다."""
+    return f"""
+            당신은 스타트업 창업가를 돕는 전문 컨설턴트입니다.
+
+            [사용자 정보]
+            - 성장 단계: '{stage}'
+            - 당면 과제: '{challenge}'
+            - 구체적인 고민: "{user_problem}"
+
+            [후보 도서 목록]
+            {book_list_str}
+
+            [미션]
+            1. 사용자의 '구체적인 고민'을 '후보 도서 목록'의 책 소개(intro) 내용과 비교하여, 고민 해결에 가장 적합한 책 **단 한 권**을 선택하고, 그 책의 ID(목록에서 제목 앞 대괄호 안의 값)를 답하세요.
+            2. 그 책을 추천하는 새로운 추천 이유를 생성해주세요. 이때, 사용자의 '성장 단계'와 '당면 과제' 정보를 반드시 활용하여 더욱 개인화된 조언을 해주세요.
+
+            답변은 반드시 아래의 JSON 형식으로만 출력해야 합니다.
+            ```json
+            {{
+              "chosen_book_id": "<선택한 책의 ID ({id_choices} 중 하나)>",
+              "new_reason": "<새롭게 생성한 맞춤 추천 이유>"
+            }}
+            ```
+            """
+
+
+def curated_result(stage, challenge, style='ranked', notice=None, status='ok', request_id=None, catalog=None):
+    """
+    큐레이션 추천으로 엔진 응답을 만듭니다. 큐레이션 추천이 없으면 None을 반환합니다.
+    catalog를 주면 도서 목록에 있는 책에 책 ID와 표지를 붙입니다. (Catalog.attach_book_info)
+    엔진 서버에 연결할 수 없을 때 클라이언트(engine_client.py)도 이 함수로 응답합니다.
+    """
+    if style == 'single':
+        recommendation = get_curated_book(stage, challenge)
+    else:
+        recommendation = get_curated_recommendation(stage, challenge)
+    if recommendation is None:
+        return None
+    recommendation['notice'] = notice
+    if catalog is not None:
+        catalog.attach_book_info(recommendation)
+    return {'request_id': request_id, 'status': status, 'source': 'curated', 'notice': notice,
+            'recommendation': recommendation, 'error': None}
+
+
+class RecommendationEngine:
+    """
+    추천 파이프라인 전체를 담당하는 엔진입니다. 검색 인덱스, OpenAI 클라이언트, LLM 호출 정책, 임베딩/응답 캐시,
+    LLM 동시 호출 슬롯, 요청 로그는 resources.py에서 프로세스 전체가 공유하는 객체를 받아 쓰므로, 엔진을 여러 개 만들어도 한 번씩만 로드됩니다.
+    """
+
+    def __init__(self, api_key=None, store_dir=DEFAULT_STORE_DIR, books_csv_path=BOOKS_CSV_PATH, client=None,
+                 embedding_cache=None, response_cache=None, request_log=None, llm_max_concurrency=LLM_MAX_CONCURRENCY,
+                 llm=None, reranker=None):
+        self.client = client or get_openai_client(api_key)
+        # 채팅 호출의 재시도, 속도 제한, 서킷 브레이커, 단일 비행은 공유 LLM 호출 정책이 맡습니다.
+        self.llm = llm or get_llm_guard()
+        self.chat_client = self.client.with_options(max_retries=0) if self.client is not None else None
+        self.store_dir = store_dir
+        self.books_csv_path = books_csv_path
+        self.embedding_cache = embedding_cache or get_embedding_cache(EMBEDDING_CACHE_PATH)
+        self.response_cache = response_cache or get_response_cache(RESPONSE_CACHE_SIMILARITY)
+        self.request_log = request_log or get_request_log()
+        self.llm_slots = get_llm_slots(llm_max_concurrency)
+        self.reranker = reranker or Reranker()
+
+    # --- 1. 저장소 로드 ---
+    def catalog(self):
+        """
+        현재 저장소의 Catalog를 반환합니다. 같은 저장소를 쓰는 엔진들은 프로세스에서 하나의 Catalog를 공유하며,
+        저장소가 다시 빌드되어 build_id가 바뀌었으면 새로 엽니다. 진행 중인 요청은 시작할 때 받은 Catalog를 끝까지 사용합니다.
+        """
+        # 빌드 디렉터리를 한 번만 구해, 그 사이에 새 빌드가 게시되어도 다른 빌드를 이 build_id로 저장하지 않게 합니다.
+        store_path = resolve_store_path(self.store_dir)
+        return shared_versioned(('catalog', os.path.abspath(self.store_dir), self.books_csv_path),
+                                read_build_id(store_path),
+                                lambda: Catalog.load(store_path, self.books_csv_path))
+
+    def _catalog_or_none(self):
+        """큐레이션 추천에 책 ID와 표지를 붙일 Catalog를 반환합니다. 저장소를 열 수 없으면 None을 반환합니다."""
+        try:
+            return self.catalog()
+        except Exception as e:
+            print(f"⚠️ 도서 목록을 열지 못해 표지 없이 큐레이션 추천을 보여드립니다: {e}")
+            return None
+
+    def status(self):
+        """엔진 상태(도서 수, build_id, 검색 인덱스와 LLM 사용 가능 여부, 서킷 브레이커 상태)를 반환합니다."""
+        catalog = self.catalog()
+        return {
+            'build_id': catalog.build_id if catalog is not None else None,
+            'books': len(catalog) if catalog is not None else 0,
+            'retrieval': catalog is not None and catalog.vector_index is not None,
+            'llm': self.client is not None,
+            'llm_circuit': self.llm.breaker.state,
+        }
+
+    # --- 2. 질의 임베딩 ---
+    def embed(self, text, trace=None):
+        """
+        같은 (모델, 정규화된 텍스트)의 임베딩은 캐시에서 꺼내고, 없을 때만 API를 호출합니다.
+        prefetch()가 같은 텍스트를 이미 요청 중이면 새로 요청하지 않고 그 응답을 기다립니다.
+        """
+        text = str(text).replace("\n", " ")
+        if trace is not None:
+            trace.set(embedding_cached=True)
+
+        def request_embedding(text):
+            response = self.client.embeddings.create(input=[text], model=EMBEDDING_MODEL)
+            if trace is not None:
+                trace.set(embedding_cached=False)
+                trace.record_usage(EMBEDDING_MODEL, response.usage.prompt_tokens if response.usage else 0)
+            return response.data[0].embedding
+
+        def request_shared(text):
+            embedding, shared = self.llm.single_flight.do((EMBEDDING_MODEL, text), lambda: request_embedding(text))
+            if shared and trace is not None:
+                trace.set(embedding_cached=False, embedding_prefetched=True)
+            return embedding
+
+        return self.embedding_cache.get_or_compute(EMBEDDING_MODEL, text, request_shared)
+
+    def embed_many(self, texts):
+        """
+        여러 질의를 한꺼번에 임베딩합니다. 캐시에 없는 텍스트만 embed_texts()로 묶어 요청하고 캐시에 넣습니다.
+        입력과 같은 순서의 임베딩 리스트를 반환하며, 실패한 텍스트는 None입니다.
+        """
+        texts = [str(text).replace("\n", " ") for text in texts]
+        embeddings = [self.embedding_cache.get(EMBEDDING_MODEL, text) for text in texts]
+        missing = sorted({text for text, embedding in zip(texts, embeddings) if embedding is None})
+        if missing:
+            computed, errors = embed_texts(self.client, missing, EMBEDDING_MODEL, verbose=False)
+            computed_by_text = {}
+            for text, embedding, error in zip(missing, computed, errors):
+                if error is None:
+                    computed_by_text[text] = self.embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+            embeddings = [embedding if embedding is not None else computed_by_text.get(text)
+                          for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+    # --- 미리 준비 (단계 1~3) ---
+    def prefetch(self, stage, challenge, user_problem=None, style='ranked'):
+        """
+        사용자가 고민을 입력하기 전에 할 수 있는 일을 백그라운드에서 시작하고 바로 반환합니다.
+        단계와 과제를 고른 직후(단계 2 → 3)와 고민을 제출한 직후(단계 3 → 4)에 부르면,
+        단계 4의 recommend()는 마지막 생성 비용만 치르게 됩니다.
+          - 카탈로그와 검색 인덱스 열기, (단계, 과제) 후보 풀(CandidatePool) 만들기
+          - 'single' 형식이면 컨텍스트 빌더(책별 프롬프트 조각과 토큰 수) 만들기
+          - user_problem이 있으면 질의 임베딩 요청 (recommend()는 캐시나 진행 중인 요청에서 받아 갑니다)
+        """
+        get_prefetch_executor().submit(self._prefetch, stage, challenge, user_problem, style)
+
+    def _prefetch(self, stage, challenge, user_problem, style):
+        try:
+            if user_problem and self.client is not None:
+                self.embed(user_problem)
+            catalog = self.catalog()
+            if catalog is None:
+                return
+            if catalog.vector_index is not None:
+                catalog.candidate_pool(stage, challenge)
+            if style == 'single':
+                catalog.context_builder
+        except Exception as e:
+            # 미리 준비하지 못해도 recommend()가 같은 일을 다시 하므로 경고만 남깁니다.
+            print(f"⚠️ 추천 사전 준비 실패: {e}")
+
+    # --- 3. 검색 ---
+    def retrieve(self, catalog, user_problem, query_embedding, stage=None, challenge=None, k=RECOMMENDATION_CANDIDATES):
+        """
+        책 단위 벡터 검색, 청크 단위 벡터 검색(책별 최고 점수), BM25 검색 결과를 Reciprocal Rank Fusion으로 합쳐
+        상위 k권의 행 번호를 반환합니다. 'LTV', '시리즈 A'처럼 정확한 용어가 들어간 고민은 BM25가,
+        표현이 다른 고민은 벡터 검색이, 긴 목차의 한 부분과 맞는 고민은 청크 검색이 찾아냅니다.
+        태그가 있으면 점수를 계산하기 전에 사용자가 고른 (단계, 과제) 태그가 붙은 책으로 검색 대상을 좁힙니다.
+        융합 상위 후보는 재순위화기(reranker.py)로 다시 정렬하므로 반환하는 순서가 곧 최종 추천 순위입니다.
+        (indices, chunk_scores)를 반환하며, 청크 인덱스가 없으면 chunk_scores는 None입니다.
+        """
+        return self.retrieve_many(catalog, [user_problem], [query_embedding], [stage], [challenge], k=k)[0]
+
+    def retrieve_many(self, catalog, user_problems, query_embeddings, stages, challenges, k=RECOMMENDATION_CANDIDATES):
+        """
+        retrieve()의 배치 버전입니다. 같은 (단계, 과제)의 질의를 묶어 책/청크 벡터 점수를 행렬 곱 한 번으로 계산하고,
+        BM25 검색과 RRF 융합만 질의마다 합니다. 입력과 같은 순서의 (indices, chunk_scores) 리스트를 반환합니다.
+        (단계, 과제)별 후보 풀은 카탈로그에 보관되므로, prefetch()로 미리 만들어 두었다면 그대로 사용합니다.
+        """
+        chunk_index, lexical_index = catalog.chunk_index, catalog.lexical_index
+        groups = {}
+        for position, key in enumerate(zip(stages, challenges)):
+            groups.setdefault(key, []).append(position)
+
+        results = [None] * len(user_problems)
+        for (stage, challenge), positions in groups.items():
+            pool = catalog.candidate_pool(stage, challenge)
+            queries = np.asarray([query_embeddings[position] for position in positions], dtype=np.float32)
+            dense_indices = pool.search_books(queries, k=HYBRID_CANDIDATE_POOL)
+            chunk_scores = pool.chunk_scores(queries) if chunk_index is not None else None
+
+            for row, position in enumerate(positions):
+                dense = dense_indices[row][dense_indices[row] >= 0]
+                rankings = [dense]
+                row_chunk_scores = chunk_scores[row] if chunk_index is not None else None
+                if chunk_index is not None:
+                    rankings.append(chunk_index.top_books(row_chunk_scores, k=HYBRID_CANDIDATE_POOL)[0])
+                lexical_scores = None
+                if lexical_index is not None:
+                    lexical_scores = lexical_index.score(user_problems[position])
+                    rankings.append(lexical_index.top(lexical_scores, k=HYBRID_CANDIDATE_POOL, subset=pool.subset)[0])
+                fused_indices, fused_scores = reciprocal_rank_fusion(rankings, k=RRF_K)
+                n_candidates = max(k, RERANK_CANDIDATES)
+                candidates = fused_indices[:n_candidates]
+                features = self._rerank_features(catalog, pool, queries[row], candidates, fused_scores[:n_candidates],
+                                                 row_chunk_scores, lexical_scores, stage, challenge)
+                results[position] = (candidates[self.reranker.rank(features)][:k], row_chunk_scores)
+        return results
+
+    @staticmethod
+    def _rerank_features(catalog, pool, query, candidates, fused_scores, chunk_scores, lexical_scores, stage, challenge):
+        """후보 책들의 재순위화 특징 행렬을 만듭니다. 저장소에 없는 인덱스의 특징은 0으로 둡니다."""
+        features = {'dense': pool.dense_scores(query, candidates), 'fusion': fused_scores}
+        if chunk_scores is not None:
+            features['chunk'] = catalog.chunk_index.best_scores(chunk_scores, candidates)
+            features['table'] = catalog.chunk_index.best_scores(chunk_scores, candidates, field='table')
+        if lexical_scores is not None:
+            features['lexical'] = lexical_scores[candidates]
+        if catalog.book_tags is not None:
+            features['stage_tag'], features['challenge_tag'] = catalog.book_tags.matches(candidates, stage, challenge)
+        return feature_matrix(len(candidates), **features)
+
+    # --- 4. 프롬프트 구성 ---
+    def format_chosen_book(self, catalog, index, chunk_scores):
+        """
+        LLM에 보낼 1순위 책 정보를 만듭니다. 청크 인덱스가 있으면 질의와 가장 가까운 소개/목차 청크만 넣어
+        프롬프트 토큰을 줄이고, 청크가 없을 때만 소개와 목차를 BOOK_FIELD_TOKEN_BUDGET 토큰까지 잘라 넣습니다.
+        """
+        book = catalog.books_df.iloc[index]
+        book_str = f"- **{book['name']}** (저자: {book['author']})\n"
+        passages = catalog.chunk_index.best_chunks(chunk_scores, index, n=CHUNKS_PER_BOOK) if chunk_scores is not None else []
+        if passages:
+            for field, text in passages:
+                label = '목차 일부' if field == 'table' else '소개 일부'
+                book_str += f"  - [{label}] {' '.join(text.split())}\n"
+            return book_str
+        for field, label in (('intro', '소개'), ('table', '목차')):
+            text = book.get(field)
+            if isinstance(text, str) and text.strip():
+                book_str += f"  - [{label}] {' '.join(truncate_to_tokens(text, BOOK_FIELD_TOKEN_BUDGET).split())}\n"
+        return book_str
+
+    # --- 5~6. 생성 / 파싱 ---
+    def complete_json(self, prompt, trace, on_field=None):
+        """
+        JSON 형식의 응답을 요청해 dict로 파싱합니다.
+        on_field(field, fields)가 주어지면 응답을 토큰 스트림으로 받아 증분 파싱하고,
+        최상위 필드가 완성될 때마다 (필드 이름, 지금까지 완성된 필드 dict)로 호출합니다.
+        같은 프롬프트의 호출이 이미 진행 중이면 그 결과를 함께 받고(단일 비행), 받은 필드를 순서대로 on_field에 넘깁니다.
+        재시도와 제한 시간을 넘기거나 서킷 브레이커가 열려 있으면 LLMUnavailableError를 발생시킵니다.
+        """
+        emitted = []
+
+        def on_emit(field, fields):
+            emitted.append(field)
+            on_field(field, fields)
+
+        def request(timeout):
+            # 스트리밍으로 필드를 이미 보낸 뒤 끊겼다면 처음부터 다시 보내지 않습니다.
+            if emitted:
+                raise LLMUnavailableError("AI 응답 스트림이 중간에 끊겼습니다.")
+            trace.set(llm_attempts=trace.record.get('llm_attempts', 0) + 1)
+            return self._request_json(prompt, trace, on_emit if on_field is not None else None, timeout)
+
+        result, shared = self.llm.call_shared((CHAT_MODEL, prompt), request, LLM_TIMEOUT_SECONDS)
+        if not shared:
+            return result
+        trace.set(coalesced=True)
+        result = copy.deepcopy(result)
+        if on_field is not None:
+            fields = {}
+            for field, value in result.items():
+                fields[field] = value
+                on_field(field, fields)
+        return result
+
+    def _request_json(self, prompt, trace, on_field, timeout):
+        """chat completion 요청 한 번을 보냅니다. 재시도와 속도 제한은 호출하는 쪽(self.llm)이 맡습니다."""
+        if on_field is None:
+            with trace.span('chat_completion'):
+                response = self.chat_client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=[{"role": "system", "content": prompt}],
+                    response_format={"type": "json_object"},
+                    timeout=timeout
+                )
+            if response.usage:
+                trace.record_usage(CHAT_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
+            with trace.span('json_parse'):
+                return json.loads(response.choices[0].message.content)
+
+        parser = IncrementalJSONObjectParser()
+        start = time.perf_counter()
+        parse_seconds = 0.0
+        with trace.span('chat_completion'):
+            stream = self.chat_client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[{"role": "system", "content": prompt}],
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
+            )
+            for chunk in stream:
+                # 마지막 청크에는 choices 없이 토큰 사용량만 들어 있습니다.
+                if chunk.usage:
+                    trace.record_usage(CHAT_MODEL, chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if not chunk.choices:
+                    continue
+                if 'first_token_ms' not in trace.record:
+                    trace.set(first_token_ms=(time.perf_counter() - start) * 1000)
+                parse_start = time.perf_counter()
+                completed_fields = parser.feed(chunk.choices[0].delta.content)
+                parse_seconds += time.perf_counter() - parse_start
+                for field, _ in completed_fields:
+                    on_field(field, parser.fields)
+
+        trace.add_span('json_parse', parse_seconds * 1000)
+        if not parser.done:
+            raise ValueError("AI 응답이 완전한 JSON 형식으로 끝나지 않았습니다.")
+        return parser.result()
+
+    # --- 전체 파이프라인 ---
+    def recommend(self, stage, challenge, user_problem=None, style='ranked', on_field=None, app='engine', shed_load=True,
+                  retrieval=None):
+        """
+        추천 하나를 만듭니다. 다음 키를 가진 dict를 반환합니다.
+          - status: 'ok' | 'shed'(동시 호출 한도 초과) | 'degraded'(생성 실패 후 검색 결과나 큐레이션 추천) | 'error'
+          - source: 'llm' | 'response_cache' | 'retrieval' | 'curated' | None
+          - recommendation: 추천 결과 dict (style 형식), 실패하면 None
+          - notice: 사용자에게 보여줄 안내 문구, error: 실패 이유, request_id: 요청 로그의 ID
+        user_problem이 비어 있으면 LLM 호출 없이 큐레이션 추천을 반환합니다.
+        shed_load가 False이면 동시 호출 한도를 넘었을 때 큐레이션 추천 대신 빈 슬롯을 기다립니다.
+        retrieval은 recommend_batch()가 미리 계산한 검색 결과 (catalog, indices, chunk_scores)이며,
+        그 사이 저장소가 다시 빌드되어 Catalog가 바뀌었으면 무시하고 다시 검색합니다.
+        """
+        if style not in RECOMMENDATION_STYLES:
+            raise ValueError(f"지원하지 않는 추천 형식입니다: {style} (가능한 값: {', '.join(RECOMMENDATION_STYLES)})")
+
+        # 요청 하나의 단계별 소요 시간, 토큰 수, 추정 비용을 기록합니다. (고민 내용 대신 길이만 남깁니다)
+        trace = self.request_log.start(app, stage=stage, challenge=challenge, style=style,
+                                       problem_chars=len(user_problem or ""))
+        request_id = trace.record['request_id']
+
+        if not user_problem:
+            result = curated_result(stage, challenge, style, request_id=request_id, catalog=self._catalog_or_none())
+            if result is not None:
+                trace.set(source='curated')
+                trace.finish()
+                return result
+        if self.client is None:
+            return self._error_result(trace, RuntimeError("OpenAI API 키가 설정되지 않았습니다. .streamlit/secrets.toml 파일을 확인해주세요."))
+        if not user_problem:
+            return self._error_result(trace, ValueError("고민 내용이 비어 있습니다."))
+
+        # 동시 호출 한도를 넘으면 기다리지 않고 큐레이션 추천으로 응답합니다.
+        if not self.llm_slots.acquire(blocking=not shed_load):
+            result = curated_result(stage, challenge, style, SHED_NOTICE, status='shed', request_id=request_id,
+                                    catalog=self._catalog_or_none())
+            if result is not None:
+                trace.set(source='curated')
+                trace.finish(status='shed')
+                return result
+            self.llm_slots.acquire()
+        catalog = None
+        try:
+            catalog = self.catalog()
+            if catalog is None:
+                raise FileNotFoundError(f"도서 데이터({self.store_dir} 또는 {self.books_csv_path})를 찾을 수 없습니다.")
+            if retrieval is not None and retrieval[0] is not catalog:
+                retrieval = None
+            if style == 'ranked':
+                recommendation, source, llm_error = self._recommend_ranked(catalog, stage, challenge, user_problem, trace,
+                                                                           on_field, retrieval)
+            else:
+                recommendation, source, llm_error = self._recommend_single(catalog, stage, challenge, user_problem, trace,
+                                                                           retrieval)
+        except Exception as e:
+            print(f"⚠️ AI 추천 생성 실패, 큐레이션 추천으로 대신합니다: {e}")
+            result = curated_result(stage, challenge, style, DEGRADED_NOTICE, status='degraded', request_id=request_id,
+                                    catalog=catalog)
+            if result is None:
+                return self._error_result(trace, e)
+            trace.set(source='curated')
+            trace.finish(status='degraded', error=e)
+            result['error'] = f"{type(e).__name__}: {e}"
+            return result
+        finally:
+            self.llm_slots.release()
+
+        trace.set(source=source)
+        if llm_error is not None:
+            trace.finish(status='degraded', error=llm_error)
+            return {'request_id': request_id, 'status': 'degraded', 'source': source, 'notice': RETRIEVAL_NOTICE,
+                    'recommendation': recommendation, 'error': f"{type(llm_error).__name__}: {llm_error}"}
+        trace.finish()
+        return {'request_id': request_id, 'status': 'ok', 'source': source, 'notice': None,
+                'recommendation': recommendation, 'error': None}
+
+    def recommend_batch(self, items, max_concurrency=BATCH_MAX_CONCURRENCY, app='engine_batch', on_result=None):
+        """
+        여러 추천 요청을 한 번에 처리합니다. items는 recommend()의 인자(stage, challenge, user_problem, style)를 담은
+        dict 리스트입니다. 고민 문장들의 임베딩을 먼저 배치 요청으로 한꺼번에 구해 캐시에 넣고, 검색도 retrieve_many()로
+        한꺼번에 한 뒤, 추천 생성은 최대 max_concurrency개씩 동시에 진행합니다. 결과는 items와 같은 순서입니다.
+        on_result(position, result)가 주어지면 추천이 하나 끝날 때마다 (작업 스레드에서) 호출합니다.
+        """
+        retrievals = [None] * len(items)
+        positions = [position for position, item in enumerate(items) if item.get('user_problem')]
+        if positions and self.client is not None:
+            try:
+                embeddings = self.embed_many([items[position]['user_problem'] for position in positions])
+                self._retrieve_batch(items, positions, embeddings, retrievals)
+            except Exception as e:
+                print(f"⚠️ 배치 임베딩/검색 실패, 요청별로 처리합니다: {e}")
+
+        def recommend_item(position):
+            item = items[position]
+            result = self.recommend(item['stage'], item['challenge'], item.get('user_problem'),
+                                    style=item.get('style', 'ranked'), app=app, shed_load=False,
+                                    retrieval=retrievals[position])
+            if on_result is not None:
+                on_result(position, result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(recommend_item, range(len(items))))
+
+    def _retrieve_batch(self, items, positions, embeddings, retrievals):
+        """임베딩이 있는 요청들의 검색 결과를 retrievals[position]에 채웁니다. 두 형식 모두 쓸 수 있게 더 긴 후보 목록을 구합니다."""
+        catalog = self.catalog()
+        if catalog is None or catalog.vector_index is None:
+            return
+        positions = [position for position, embedding in zip(positions, embeddings) if embedding is not None]
+        embeddings = [embedding for embedding in embeddings if embedding is not None]
+        if not positions:
+            return
+        results = self.retrieve_many(catalog, [items[position]['user_problem'] for position in positions], embeddings,
+                                     [items[position]['stage'] for position in positions],
+                                     [items[position]['challenge'] for position in positions],
+                                     k=max(RECOMMENDATION_CANDIDATES, CANDIDATE_POOL_SIZE))
+        for position, (indices, chunk_scores) in zip(positions, results):
+            retrievals[position] = (catalog, indices, chunk_scores)
+
+    def _recommend_ranked(self, catalog, stage, challenge, user_problem, trace, on_field=None, retrieval=None):
+        """
+        1~3순위 추천(new_app.py 형식)을 만듭니다. (추천 결과, source, LLM 오류)를 반환합니다.
+        1~3순위는 검색·재순위화 결과 그대로이며, LLM은 1순위 책의 추천 이유와 적용 방향만 씁니다.
+        검색 뒤 생성에 실패하면 같은 1~3순위로 만든 추천과 그 오류를 반환합니다. (source 'retrieval')
+        """
+        if catalog.vector_index is None:
+            raise FileNotFoundError(f"도서 벡터 저장소({self.store_dir})를 찾을 수 없습니다. 먼저 build_vector_store.py를 실행해주세요.")
+
+        with trace.span('embedding'):
+            query_embedding = self.embed(user_problem, trace=trace)
+
+        # 같은 단계/과제에서 거의 같은 고민에 대한 답변이 있으면 LLM 호출 없이 재사용합니다.
+        with trace.span('response_cache'):
+            cached_recommendation = self.response_cache.get(stage, challenge, query_embedding, store_version=catalog.build_id)
+        if cached_recommendation is not None:
+            return cached_recommendation, 'response_cache', None
+
+        if retrieval is not None:
+            _, top_k_indices, chunk_scores = retrieval
+            top_k_indices = top_k_indices[:RECOMMENDATION_CANDIDATES]
+        else:
+            with trace.span('retrieval'):
+                top_k_indices, chunk_scores = self.retrieve(catalog, user_problem, query_embedding, stage, challenge)
+        trace.set(candidates=len(top_k_indices))
+        if not len(top_k_indices):
+            raise ValueError("고민과 관련된 후보 도서를 찾지 못했습니다.")
+
+        # 순위는 재순위화 결과로 확정하고, LLM에는 1순위 책만 보내 추천 이유와 적용 방향(목차가 없으면 목차도)을 받습니다.
+        recommendation = self._ranked_skeleton(catalog, top_k_indices)
+        with trace.span('prompt_assembly'):
+            book_str = self.format_chosen_book(catalog, top_k_indices[0], chunk_scores)
+            prompt = build_ranked_prompt(stage, challenge, user_problem, book_str,
+                                         include_table_of_contents=recommendation['table_of_contents'] is None)
+
+        stream_callback = None
+        if on_field is not None:
+            # 생성을 기다리지 않고 이미 정해진 1~3순위 책과 목차를 먼저 보냅니다.
+            fields = {}
+            for field in ('best_book', 'table_of_contents', 'second_and_third_books'):
+                if recommendation[field] is not None:
+                    fields[field] = recommendation[field]
+                    on_field(field, fields)
+
+            def stream_callback(field, generated_fields):
+                # 이미 정해진 필드를 LLM이 다시 쓰더라도 재순위화 결과를 유지합니다.
+                if field in fields:
+                    return
+                fields[field] = generated_fields[field]
+                on_field(field, fields)
+
+        try:
+            generated = self.complete_json(prompt, trace, stream_callback)
+        except Exception as e:
+            print(f"⚠️ AI 추천 생성 실패, 검색 결과로 대신합니다: {e}")
+            return self._retrieval_only_ranked(catalog, top_k_indices, chunk_scores), 'retrieval', e
+        recommendation['new_reason'] = generated.get('new_reason')
+        if recommendation['table_of_contents'] is None:
+            recommendation['table_of_contents'] = generated.get('table_of_contents')
+        recommendation['application_points'] = generated.get('application_points')
+        # 함께 받은(단일 비행) 결과는 먼저 호출한 요청이 이미 캐시에 넣었습니다.
+        if not trace.record.get('coalesced'):
+            self.response_cache.put(stage, challenge, query_embedding, recommendation, store_version=catalog.build_id)
+        return recommendation, 'llm', None
+
+    def _recommend_single(self, catalog, stage, challenge, user_problem, trace, retrieval=None):
+        """
+        책 한 권 추천(app.py 형식)을 만듭니다. (추천 결과, source, LLM 오류)를 반환합니다.
+        검색 뒤 생성에 실패하면 검색 1순위 책과 그 오류를 반환합니다. (source 'retrieval')
+        """
+        # 벡터 저장소가 있으면 고민과 가까운 후보만, 없으면 전체 목록을 예산 안에서 순서대로 사용합니다.
+        candidate_ids = None
+        if retrieval is not None:
+            candidate_ids = [catalog.books.ids[row] for row in retrieval[1][:CANDIDATE_POOL_SIZE]]
+        elif catalog.vector_index is not None:
+            with trace.span('embedding'):
+                query_embedding = self.embed(user_problem, trace=trace)
+            with trace.span('retrieval'):
+                top_indices, _ = self.retrieve(catalog, user_problem, query_embedding, stage, challenge,
+                                               k=CANDIDATE_POOL_SIZE)
+            candidate_ids = [catalog.books.ids[row] for row in top_indices]
+
+        # 후보 도서만 토큰 예산 안에 담아 AI에게 전달합니다. (책 소개는 예산에 맞춰 잘립니다)
+        with trace.span('prompt_assembly'):
+            book_list_str, included_ids, context_tokens = catalog.context_builder.build(
+                candidate_ids, token_budget=CONTEXT_TOKEN_BUDGET)
+            if not included_ids:
+                raise ValueError("프롬프트에 담을 후보 도서가 없습니다.")
+            id_choices = ", ".join(included_ids)
+            prompt = build_single_prompt(stage, challenge, user_problem, book_list_str, id_choices)
+
+        try:
+            result = self.complete_json(prompt, trace)
+        except Exception as e:
+            if not candidate_ids:
+                raise
+            print(f"⚠️ AI 추천 생성 실패, 검색 결과로 대신합니다: {e}")
+            final_book = catalog.books.get(candidate_ids[0])
+            final_book.update(ai_reason=RETRIEVAL_REASON, source='retrieval', notice=RETRIEVAL_NOTICE)
+            return final_book, 'retrieval', e
+        usage = trace.record['tokens'].get(CHAT_MODEL, {})
+        trace.set(candidates=len(included_ids), context_tokens=context_tokens)
+
+        # AI가 고른 책 ID가 후보 목록에 있는지 확인합니다. ID 대신 제목을 답했으면 제목으로 찾고,
+        # 그래도 후보가 아니거나 잘못된 값이면 1순위 후보로 설정합니다.
+        chosen_id = str(result.get('chosen_book_id')).strip()
+        if chosen_id not in included_ids:
+            book = catalog.find_book(result.get('chosen_book_id'))
+            chosen_id = book['book_id'] if book is not None and book['book_id'] in included_ids else included_ids[0]
+
+        final_book = catalog.books.get(chosen_id)
+        final_book['ai_reason'] = result.get('new_reason')
+        final_book['token_usage'] = {
+            'candidates': len(included_ids),
+            'context_tokens': context_tokens,
+            'prompt_tokens': usage.get('prompt'),
+            'completion_tokens': usage.get('completion'),
+        }
+        return final_book, 'llm', None
+
+    @staticmethod
+    def _ranked_skeleton(catalog, indices):
+        """
+        재순위화 상위 3권으로 'ranked' 형식의 추천 틀을 만듭니다. 책마다 책 ID와 표지를, 1순위 책에는 도서 목록의 소개글을,
+        목차(table_of_contents)에는 도서 목록의 목차를 넣고 (없으면 None), 추천 이유와 적용 방향은 비워 둡니다.
+        """
+        books = [catalog.books.record(row) for row in indices[:3]]
+        entries = [{'book_id': book['book_id'], 'title': book.get('name'), 'author': book.get('author'),
+                    'cover': book['cover']} for book in books]
+        if isinstance(books[0].get('intro'), str):
+            entries[0]['intro'] = books[0]['intro']
+        table = books[0].get('table')
+        return {
+            'best_book': entries[0],
+            'new_reason': None,
+            'table_of_contents': table if isinstance(table, str) and table.strip() else None,
+            'application_points': None,
+            'second_and_third_books': entries[1:],
+        }
+
+    def _retrieval_only_ranked(self, catalog, indices, chunk_scores):
+        """LLM 없이 재순위화 상위 3권으로 'ranked' 형식의 추천을 만듭니다. 추천 이유에는 고민과 가장 가까운 청크를 인용합니다."""
+        recommendation = self._ranked_skeleton(catalog, indices)
+        reason = RETRIEVAL_REASON
+        passages = catalog.chunk_index.best_chunks(chunk_scores, indices[0], n=1) if chunk_scores is not None else []
+        if passages:
+            reason += f"\n\n> {' '.join(passages[0][1].split())}"
+        recommendation.update(new_reason=reason, application_points=RETRIEVAL_APPLICATION_POINTS,
+                              source='retrieval', notice=RETRIEVAL_NOTICE)
+        return recommendation
+
+    @staticmethod
+    def _error_result(trace, error):
+        trace.finish(status='error', error=error)
+        return {'request_id': trace.record['request_id'], 'status': 'error', 'source': None, 'notice': None,
+                'recommendation': None, 'error': str(error)}
@@ -0,0 +1,144 @@
+"""
+엔진 서버(engine_server.py)의 HTTP API를 RecommendationEngine과 같은 방식으로 호출하는 클라이언트입니다.
+스트림릿 앱은 connect_engine()으로 엔진을 얻으므로, ENGINE_URL 설정만으로 프로세스 안 엔진과 원격 엔진을 바꿔 쓸 수 있습니다.
+"""
+import http.client
+import json
+import threading
+import urllib.parse
+
+from engine import RecommendationEngine, curated_result
+
+# 이 환경 변수(또는 secrets의 같은 키)에 엔진 서버 주소를 지정하면 앱이 원격 엔진을 사용합니다.
+ENGINE_URL_ENV = 'ENGINE_URL'
+# 스트리밍 응답은 필드 사이 간격에만 적용됩니다. 엔진의 LLM 제한 시간(30초)보다 여유 있게 둡니다.
+ENGINE_TIMEOUT_SECONDS = 60
+UNAVAILABLE_NOTICE = "추천 서버에 연결할 수 없어 추천 도서를 대신 보여드립니다. 잠시 후 다시 시도해주세요."
+
+
+class EngineClient:
+    """
+    RecommendationEngine의 recommend / recommend_batch / prefetch / status를 HTTP로 호출합니다. (표준 라이브러리만 사용)
+    스레드(스트림릿 세션)마다 keep-alive 연결을 하나씩 열어 두고 재사용하므로, 요청마다 새로 연결하지 않습니다.
+    """
+
+    def __init__(self, base_url, timeout=ENGINE_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        url = urllib.parse.urlsplit(self.base_url)
+        self._connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = url.netloc
+        self._path_prefix = url.path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connection_class(self._netloc, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _close_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _send(self, method, path, payload=None):
+        """
+        요청을 보내고 응답을 반환합니다. 재사용하던 연결을 서버가 먼저 닫았다면 새로 연결해 한 번 더 보냅니다.
+        응답 본문을 끝까지 읽어야 다음 요청에 연결을 재사용할 수 있습니다.
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, self._path_prefix + path, body=body, headers=headers)
+                return connection.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._close_connection()
+                if attempt:
+                    raise
+            except (OSError, http.client.HTTPException):
+                self._close_connection()
+                raise
+
+    def _request_json(self, method, path, payload=None, allow_error=False):
+        response = self._send(method, path, payload)
+        try:
+            data = json.loads(response.read())
+        except (OSError, http.client.HTTPException):
+            self._close_connection()
+            raise
+        if response.status >= 400 and not allow_error:
+            raise ValueError(f"추천 서버 오류 ({response.status}): {data.get('error') if isinstance(data, dict) else data}")
+        return data
+
+    def status(self):
+        try:
+            # 도서 데이터가 없으면 서버가 503과 함께 상태를 돌려줍니다.
+            return self._request_json('GET', '/healthz', allow_error=True)
+        except (OSError, ValueError, http.client.HTTPException):
+            return {'build_id': None, 'books': 0, 'retrieval': False, 'llm': False, 'llm_circuit': None}
+
+    def recommend(self, stage, challenge, user_problem=None, style='ranked', on_field=None, app='engine_client'):
+        """
+        엔진 서버에 추천을 요청합니다. on_field가 주어지면 스트리밍으로 받아 필드가 도착할 때마다 호출합니다.
+        서버에 연결할 수 없으면 큐레이션 추천으로 응답합니다.
+        """
+        payload = {'stage': stage, 'challenge': challenge, 'user_problem': user_problem, 'style': style,
+                   'app': app, 'stream': on_field is not None}
+        try:
+            if on_field is None:
+                return self._request_json('POST', '/v1/recommend', payload)
+            return self._stream_recommend(payload, on_field)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            print(f"⚠️ 추천 서버 요청 실패 ({self.base_url}): {e}")
+            result = curated_result(stage, challenge, style, UNAVAILABLE_NOTICE, status='degraded')
+            if result is None:
+                return {'request_id': None, 'status': 'error', 'source': None, 'notice': None,
+                        'recommendation': None, 'error': str(e)}
+            result['error'] = str(e)
+            return result
+
+    def _stream_recommend(self, payload, on_field):
+        response = self._send('POST', '/v1/recommend', payload)
+        if response.status >= 400:
+            raise ValueError(f"추천 서버 오류 ({response.status}): {response.read().decode('utf-8', 'replace')}")
+        fields = {}
+        try:
+            while line := response.readline():
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event['event'] == 'field':
+                    fields[event['field']] = event['value']
+                    on_field(event['field'], fields)
+                elif event['event'] == 'result':
+                    response.read()
+                    return event['result']
+        except BaseException:
+            # 스트림을 끝까지 읽지 못한 연결은 재사용할 수 없습니다.
+            self._close_connection()
+            raise
+        raise ValueError("추천 서버의 응답이 결과 없이 끝났습니다.")
+
+    def prefetch(self, stage, challenge, user_problem=None, style='ranked'):
+        """엔진 서버에 사전 준비를 요청합니다. 서버는 준비를 백그라운드로 넘기고 바로 응답하며, 실패해도 추천에는 영향이 없습니다."""
+        payload = {'stage': stage, 'challenge': challenge, 'user_problem': user_problem, 'style': style}
+        try:
+            self._request_json('POST', '/v1/prefetch', payload)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            print(f"⚠️ 추천 사전 준비 요청 실패 ({self.base_url}): {e}")
+
+    def recommend_batch(self, items):
+        """여러 추천을 한 번에 요청합니다. 결과는 items와 같은 순서입니다."""
+        return self._request_json('POST', '/v1/recommend/batch', {'items': items})['results']
+
+
+def connect_engine(engine_url=None, api_key=None):
+    """engine_url이 있으면 원격 엔진 클라이언트를, 없으면 이 프로세스 안에서 실행하는 엔진을 만듭니다."""
+    if engine_url:
+        return EngineClient(engine_url)
+    return RecommendationEngine(api_key=api_key)
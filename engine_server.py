@@ -0,0 +1,204 @@
+"""
+추천 엔진(engine.py)을 비동기 HTTP API로 제공하는 서버입니다. 스트림릿 앱과 따로 띄워 여러 워커로 확장할 수 있습니다.
+
+    python engine_server.py --port 8080 --workers 4
+    ENGINE_URL=http://localhost:8080 streamlit run new_app.py
+
+엔드포인트
+  - POST /v1/recommend        {"stage", "challenge", "user_problem", "style": "ranked"|"single", "stream": false}
+                              stream이 true이면 필드가 완성될 때마다 한 줄씩 NDJSON으로 보냅니다.
+                              ({"event": "field", "field", "value"} ... 마지막 줄은 {"event": "result", "result"})
+  - POST /v1/recommend/batch  {"items": [{"stage", "challenge", "user_problem", "style"}, ...]}
+  - POST /v1/prefetch         {"stage", "challenge", "user_problem", "style"} 단계 1~3에서 미리 할 준비를 백그라운드로 시작하고
+                              바로 202로 응답합니다. (후보 풀은 요청을 받은 워커에만, 질의 임베딩은 공유 디스크 캐시에 남습니다)
+  - GET  /healthz             엔진 상태 (도서 수, build_id, 검색/LLM 사용 가능 여부)
+  - GET  /metrics             요청 수·토큰·비용·단계별 지연시간 (Prometheus 형식, 워커 프로세스별 집계)
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from aiohttp import web
+
+from engine import RECOMMENDATION_STYLES, RecommendationEngine
+from resources import load_api_key
+from store_format import DEFAULT_STORE_DIR
+
+DEFAULT_PORT = 8080
+# OpenAI 클라이언트는 동기 방식이므로 요청을 이 크기의 스레드 풀에서 처리합니다.
+# 실제 LLM 동시 호출 수는 엔진의 LLM_MAX_CONCURRENCY가 제한합니다.
+REQUEST_THREADS = 32
+MAX_BATCH_ITEMS = 100
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse_recommend_request(payload):
+    """요청 본문을 RecommendationEngine.recommend()의 인자로 바꿉니다. 형식이 맞지 않으면 ValueError를 발생시킵니다."""
+    if not isinstance(payload, dict):
+        raise ValueError("요청 본문은 JSON 객체여야 합니다.")
+    for field in ('stage', 'challenge'):
+        if not isinstance(payload.get(field), str) or not payload[field]:
+            raise ValueError(f"'{field}' 값이 필요합니다.")
+    user_problem = payload.get('user_problem')
+    if user_problem is not None and not isinstance(user_problem, str):
+        raise ValueError("'user_problem'은 문자열이어야 합니다.")
+    style = payload.get('style', 'ranked')
+    if style not in RECOMMENDATION_STYLES:
+        raise ValueError(f"'style'은 {', '.join(RECOMMENDATION_STYLES)} 중 하나여야 합니다.")
+    return {
+        'stage': payload['stage'],
+        'challenge': payload['challenge'],
+        'user_problem': user_problem,
+        'style': style,
+        'app': str(payload.get('app') or 'engine_server'),
+    }
+
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=_dumps({'error': "요청 본문이 올바른 JSON이 아닙니다."}),
+                                 content_type='application/json')
+
+
+def _bad_request(error):
+    return web.json_response({'error': str(error)}, status=400, dumps=_dumps)
+
+
+async def recommend(request):
+    payload = await _read_json(request)
+    try:
+        params = parse_recommend_request(payload)
+    except ValueError as e:
+        return _bad_request(e)
+
+    engine = request.app['engine']
+    loop = asyncio.get_running_loop()
+    if not payload.get('stream'):
+        result = await loop.run_in_executor(request.app['executor'], partial(engine.recommend, **params))
+        return web.json_response(result, dumps=_dumps)
+
+    # 생성은 스레드 풀에서 진행하고, 완성된 필드를 이벤트 루프의 큐로 넘겨 바로 클라이언트에 씁니다.
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+    await response.prepare(request)
+    events = asyncio.Queue()
+
+    def on_field(field, fields):
+        event = {'event': 'field', 'field': field, 'value': fields[field]}
+        loop.call_soon_threadsafe(events.put_nowait, _dumps(event))
+
+    future = loop.run_in_executor(request.app['executor'], partial(engine.recommend, on_field=on_field, **params))
+    future.add_done_callback(lambda _: events.put_nowait(None))
+    while (line := await events.get()) is not None:
+        await response.write(line.encode('utf-8') + b'\n')
+    result = await future
+    await response.write(_dumps({'event': 'result', 'result': result}).encode('utf-8') + b'\n')
+    await response.write_eof()
+    return response
+
+
+async def recommend_batch(request):
+    payload = await _read_json(request)
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return _bad_request("'items' 목록이 필요합니다.")
+    if len(items) > MAX_BATCH_ITEMS:
+        return _bad_request(f"한 번에 최대 {MAX_BATCH_ITEMS}개까지 요청할 수 있습니다.")
+    try:
+        items = [parse_recommend_request(item) for item in items]
+    except ValueError as e:
+        return _bad_request(e)
+
+    engine = request.app['engine']
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(request.app['executor'], engine.recommend_batch, items)
+    return web.json_response({'results': results}, dumps=_dumps)
+
+
+async def prefetch(request):
+    payload = await _read_json(request)
+    try:
+        params = parse_recommend_request(payload)
+    except ValueError as e:
+        return _bad_request(e)
+    request.app['engine'].prefetch(params['stage'], params['challenge'], params['user_problem'], params['style'])
+    return web.json_response({'status': 'accepted'}, status=202, dumps=_dumps)
+
+
+async def healthz(request):
+    engine = request.app['engine']
+    loop = asyncio.get_running_loop()
+    status = await loop.run_in_executor(request.app['executor'], engine.status)
+    return web.json_response(status, status=200 if status['books'] else 503, dumps=_dumps)
+
+
+async def metrics(request):
+    return web.Response(text=request.app['engine'].request_log.metrics.render_prometheus(),
+                        content_type='text/plain', charset='utf-8')
+
+
+def create_app(engine, request_threads=REQUEST_THREADS):
+    """엔진 하나를 공유하는 aiohttp 애플리케이션을 만듭니다."""
+    app = web.Application()
+    app['engine'] = engine
+    app['executor'] = ThreadPoolExecutor(max_workers=request_threads)
+
+    async def shutdown_executor(app):
+        app['executor'].shutdown(wait=False)
+
+    app.on_cleanup.append(shutdown_executor)
+    app.add_routes([
+        web.post('/v1/recommend', recommend),
+        web.post('/v1/recommend/batch', recommend_batch),
+        web.post('/v1/prefetch', prefetch),
+        web.get('/healthz', healthz),
+        web.get('/metrics', metrics),
+    ])
+    return app
+
+
+def serve(host, port, store_dir, reuse_port=False):
+    """워커 프로세스 하나에서 엔진을 만들고 서버를 실행합니다."""
+    engine = RecommendationEngine(api_key=load_api_key(), store_dir=store_dir)
+    print(f"🚀 추천 엔진 서버 (pid {os.getpid()}): http://{host}:{port} · 도서 {engine.status()['books']:,}권")
+    web.run_app(create_app(engine), host=host, port=port, reuse_port=reuse_port, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="추천 엔진을 HTTP API로 제공합니다.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="벡터 저장소 디렉터리")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="같은 포트를 공유(SO_REUSEPORT)하는 워커 프로세스 수. 저장소 행렬은 메모리 매핑되어 OS 페이지 캐시를 공유합니다.")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        serve(args.host, args.port, args.store)
+        return
+
+    workers = [multiprocessing.Process(target=serve, args=(args.host, args.port, args.store, True))
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    # 상위 프로세스가 종료 신호를 받으면 워커도 함께 종료합니다.
+    signal.signal(signal.SIGTERM, lambda *_: [worker.terminate() for worker in workers])
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxml이 설치되어 있으면 C로 구현된 빠른 파서를 사용하고, 없으면 내장 html.parser를 사용합니다.
+try:
+    import lxml  # noqa: F401
+    PARSER_BACKEND = 'lxml'
+except ImportError:
+    PARSER_BACKEND = 'html.parser'
+
+# --- 필드별 선택자 (한 곳에서 관리합니다) ---
+# section: 'head'(<head> 부분만 파싱) 또는 'body'(대상 블록만 골라 파싱)
+# index:   같은 선택자에 여러 요소가 걸릴 때 몇 번째 요소를 쓸지
+# attr:    텍스트 대신 읽을 속성 이름
+FIELD_SELECTORS = {
+    'intro': {'section': 'body', 'name': 'div', 'class': 'infoWrap_txtInner', 'index': 0},
+    'table': {'section': 'body', 'name': 'div', 'class': 'infoWrap_txt', 'index': 1},
+    'cover': {'section': 'head', 'name': 'meta', 'attrs': {'property': 'og:image'}, 'index': 0, 'attr': 'content'},
+}
+
+# 페이지마다 블록 위치가 다른 경우의 상품 코드별 index 예외 (목차가 세 번째 'infoWrap_txt' 블록에 있는 책들)
+INDEX_OVERRIDES = {
+    'table': {
+        89707566: 2,
+        148175776: 2,
+        130167416: 2,
+    },
+}
+
+
+def _class_pattern(classes):
+    # 파싱 중에는 class 속성이 공백으로 나뉘기 전의 문자열이므로, 토큰 단위로 일치하는지 정규식으로 확인합니다.
+    alternatives = '|'.join(re.escape(c) for c in sorted(classes))
+    return re.compile(rf'(?:^|\s)(?:{alternatives})(?:\s|$)')
+
+
+_BODY_SELECTORS = [s for s in FIELD_SELECTORS.values() if s['section'] == 'body']
+_HEAD_SELECTORS = [s for s in FIELD_SELECTORS.values() if s['section'] == 'head']
+_BODY_STRAINER = SoupStrainer(
+    list({s['name'] for s in _BODY_SELECTORS}),
+    class_=_class_pattern({s['class'] for s in _BODY_SELECTORS}),
+)
+_HEAD_STRAINER = SoupStrainer(list({s['name'] for s in _HEAD_SELECTORS}))
+
+
+def _select(soup, selector, index):
+    attrs = dict(selector.get('attrs', {}))
+    if 'class' in selector:
+        attrs['class'] = selector['class']
+    elements = soup.find_all(selector['name'], attrs=attrs, limit=index + 1)
+    if len(elements) <= index:
+        return None
+    element = elements[index]
+    if 'attr' in selector:
+        return element.get(selector['attr'])
+    return element.text
+
+
+def extract_fields(html, code=None):
+    """
+    상품 페이지 HTML에서 FIELD_SELECTORS에 선언된 필드만 추출합니다.
+    전체 DOM을 만드는 대신, <head>와 대상 블록만 골라 트리를 만드는 제한 파싱을 사용합니다.
+    찾지 못한 필드의 값은 None입니다.
+    """
+    head_end = html.find('</head>')
+    head_html = html[:head_end] if head_end != -1 else html
+
+    soups = {
+        'head': BeautifulSoup(head_html, PARSER_BACKEND, parse_only=_HEAD_STRAINER),
+        'body': BeautifulSoup(html, PARSER_BACKEND, parse_only=_BODY_STRAINER),
+    }
+
+    fields = {}
+    for field, selector in FIELD_SELECTORS.items():
+        index = INDEX_OVERRIDES.get(field, {}).get(code, selector['index'])
+        fields[field] = _select(soups[selector['section']], selector, index)
+    return fields
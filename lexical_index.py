@@ -0,0 +1,121 @@
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from retrieval import top_k
+from store_format import load_npz
+
+LEXICAL_INDEX_PATH = 'lexical_index.npz'
+NGRAM_SIZES = (2, 3)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text, ngram_sizes=NGRAM_SIZES):
+    """
+    한국어에도 동작하는 문자 n-gram 토크나이저입니다. 형태소 분석기 없이,
+    단어(공백/문장부호 기준)마다 문자 2-gram과 3-gram을 만듭니다. n보다 짧은 단어는 단어 자체를 토큰으로 씁니다.
+    예) "시리즈 A" → ['시리', '리즈', '시리즈', 'a']
+    """
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    tokens = []
+    for word in _WORD_PATTERN.findall(text):
+        if len(word) < min(ngram_sizes):
+            tokens.append(word)
+            continue
+        for n in ngram_sizes:
+            tokens.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return tokens
+
+
+class LexicalIndex:
+    """
+    문자 n-gram 기반 BM25 역색인입니다. 배열 기반(CSR)으로 저장합니다.
+      terms[t]                          : 어휘 (정렬된 문자열 배열)
+      doc_ids[offsets[t]:offsets[t+1]]  : 용어 t가 나오는 문서 번호
+      tfs[offsets[t]:offsets[t+1]]      : 해당 문서에서의 출현 빈도
+    """
+
+    def __init__(self, terms, offsets, doc_ids, tfs, doc_lengths, k1=BM25_K1, b=BM25_B):
+        self.terms = np.asarray(terms)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.tfs = np.asarray(tfs, dtype=np.float32)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+        self._term_ids = {term: i for i, term in enumerate(self.terms.tolist())}
+
+        n_docs = len(self.doc_lengths)
+        doc_freq = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        avg_length = self.doc_lengths.mean() if n_docs else 1.0
+        # BM25 분모의 문서 길이 정규화 항은 문서마다 고정이므로 미리 계산해 둡니다.
+        self._length_norm = (k1 * (1 - b + b * self.doc_lengths / max(avg_length, 1e-9))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts):
+        """문서 텍스트 목록으로부터 역색인을 만듭니다."""
+        counters = [Counter(tokenize(text)) for text in texts]
+        terms = sorted(set().union(*counters)) if counters else []
+        term_ids = {term: i for i, term in enumerate(terms)}
+
+        postings_term, postings_doc, postings_tf = [], [], []
+        for doc_id, counter in enumerate(counters):
+            postings_term.extend(term_ids[term] for term in counter)
+            postings_doc.extend([doc_id] * len(counter))
+            postings_tf.extend(counter.values())
+
+        postings_term = np.asarray(postings_term, dtype=np.int64)
+        order = np.argsort(postings_term, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(postings_term, minlength=len(terms)))])
+        doc_lengths = [sum(counter.values()) for counter in counters]
+        return cls(np.array(terms, dtype=str), offsets, np.asarray(postings_doc)[order],
+                   np.asarray(postings_tf)[order], doc_lengths)
+
+    def save(self, path=LEXICAL_INDEX_PATH):
+        np.savez(path, terms=self.terms, offsets=self.offsets, doc_ids=self.doc_ids,
+                 tfs=self.tfs, doc_lengths=self.doc_lengths)
+
+    @classmethod
+    def load(cls, path=LEXICAL_INDEX_PATH):
+        """역색인 파일을 엽니다. 배열은 메모리 매핑되어 여러 프로세스가 OS 페이지 캐시를 공유합니다."""
+        data = load_npz(path)
+        return cls(data['terms'], data['offsets'], data['doc_ids'], data['tfs'], data['doc_lengths'])
+
+    def score(self, query):
+        """질의 텍스트에 대한 모든 문서의 BM25 점수를 계산합니다."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term, query_tf in Counter(tokenize(query)).items():
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:stop]
+            tf = self.tfs[start:stop]
+            scores[docs] += query_tf * self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def search(self, query, k=5, subset=None):
+        """
+        BM25 점수 상위 k개 문서의 (indices, scores)를 반환합니다. 점수가 0인 문서는 제외합니다.
+        subset(행 번호 배열)을 넘기면 그 문서들 중에서만 고릅니다.
+        """
+        return self.top(self.score(query), k=k, subset=subset)
+
+    def top(self, scores, k=5, subset=None):
+        """score()로 계산해 둔 점수에서 search()와 같은 결과를 고릅니다. (점수를 재순위화 특징으로도 쓸 때)"""
+        if subset is not None:
+            allowed = np.zeros(len(self), dtype=bool)
+            allowed[np.asarray(subset, dtype=np.int64)] = True
+            scores = np.where(allowed, scores, 0)
+        indices = top_k(scores, k)
+        indices = indices[scores[indices] > 0]
+        return indices, scores[indices]
@@ -0,0 +1,234 @@
+"""
+LLM 호출을 감싸는 공유 계층입니다. 프로세스 안의 모든 추천 요청이 같은 객체(resources.get_llm_guard)를 사용합니다.
+  - 단일 비행(single-flight): 같은 프롬프트로 진행 중인 호출이 있으면 새로 호출하지 않고 그 결과를 함께 받습니다.
+  - 토큰 버킷: 분당 요청 한도(쿼터)에 맞춰 호출 속도를 제한합니다. 순간적인 몰림은 LLM_BURST개까지 허용합니다.
+  - 재시도: 429, 시간 초과, 연결 오류, 5xx는 지터를 섞은 지수 백오프로 다시 시도하되 호출 전체 제한 시간 안에서만 합니다.
+  - 서킷 브레이커: 연속 실패가 쌓이면 한동안 호출하지 않고 바로 LLMUnavailableError를 발생시켜,
+    장애 중에는 사용자가 제한 시간을 다 기다리지 않고 대체 응답(검색 결과, 큐레이션 추천)을 받습니다.
+여러 워커 프로세스(engine_server.py --workers)는 각자 토큰 버킷을 가지므로 분당 한도를 워커 수로 나누어 설정합니다.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import openai
+
+from embedding_batcher import INPUT_ERRORS
+
+# --- 쿼터 / 재시도 / 서킷 브레이커 설정 ---
+# 분당 요청 한도는 OPENAI_REQUESTS_PER_MINUTE 환경 변수로 계정 쿼터에 맞춥니다.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '500'))
+LLM_BURST = 20
+LLM_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_BASE_SECONDS = 0.5
+RETRY_BACKOFF_MAX_SECONDS = 8.0
+# 연속 실패가 이 횟수에 이르면 BREAKER_RESET_SECONDS 동안 호출을 멈춥니다. 그 뒤 첫 호출의 성패로 다시 열지 닫을지 정합니다.
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+# 다시 시도할 만한 일시적인 오류 (쿼터 초과, 시간 초과, 연결 오류, 서버 오류)
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class LLMUnavailableError(RuntimeError):
+    """제한 시간 안에 LLM 응답을 받지 못했습니다. 호출한 쪽은 대체 응답으로 응답합니다."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """서킷 브레이커가 열려 있어 호출하지 않았습니다."""
+
+
+class TokenBucket:
+    """초당 rate개씩 토큰이 차고 최대 capacity개까지 쌓이는 토큰 버킷입니다. (스레드 안전)"""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """토큰 하나를 꺼냅니다. timeout(초) 안에 토큰이 생기지 않으면 기다리지 않고 False를 반환합니다."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold번 쌓이면 열리고(open), reset_seconds 동안 호출을 막습니다.
+    시간이 지나면 시험 호출 하나만 허용하며(half-open), 그 호출이 성공하면 닫히고 실패하면 곧바로 다시 열립니다.
+    시험 호출이 진행 중인 동안 다른 호출은 열린 상태와 같이 막습니다.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        # 시험 호출을 시작한 시각. 결과를 기록하지 못하고 끝난 시험 호출은 reset_seconds가 지나면 무시합니다.
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return 'closed'
+        if now - self._opened_at < self.reset_seconds:
+            return 'open'
+        if self._probe_started_at is not None and now - self._probe_started_at < self.reset_seconds:
+            return 'open'
+        return 'half_open'
+
+    @property
+    def state(self):
+        """'closed' | 'open' | 'half_open'"""
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def allow(self):
+        """호출해도 되면 True를 반환합니다. half-open에서는 처음 물어본 호출 하나만 시험 호출로 허용합니다."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == 'half_open':
+                self._probe_started_at = now
+            return state != 'open'
+
+    def release_probe(self):
+        """성패를 기록하지 않고 끝난 시험 호출을 풀어, 다음 호출이 곧바로 다시 시험 호출을 할 수 있게 합니다."""
+        with self._lock:
+            self._probe_started_at = None
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print("✅ AI 서비스가 복구되어 호출을 다시 시작합니다.")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is None and self._failures >= self.failure_threshold:
+                print(f"⚠️ AI 호출이 {self._failures}번 연속 실패해 {self.reset_seconds}초 동안 호출을 멈춥니다.")
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probe_started_at = None
+
+
+class SingleFlight:
+    """같은 key로 진행 중인 호출이 있으면 새로 호출하지 않고 그 결과(또는 예외)를 함께 받습니다."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """fn()의 결과와 다른 호출의 결과를 받아 왔는지 여부를 (result, shared)로 반환합니다."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class ResilientLLM:
+    """토큰 버킷, 재시도, 제한 시간, 서킷 브레이커, 단일 비행을 한데 묶은 LLM 호출 정책입니다."""
+
+    def __init__(self, rate_limiter=None, breaker=None, max_attempts=LLM_MAX_ATTEMPTS,
+                 backoff_base=RETRY_BACKOFF_BASE_SECONDS, backoff_max=RETRY_BACKOFF_MAX_SECONDS):
+        self.rate_limiter = rate_limiter or TokenBucket(LLM_REQUESTS_PER_MINUTE / 60, LLM_BURST)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.single_flight = SingleFlight()
+
+    def _backoff(self, attempt, error):
+        """full jitter 지수 백오프. 429 응답에 Retry-After가 있으면 그보다 일찍 다시 보내지 않습니다."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        response = getattr(error, 'response', None)
+        try:
+            retry_after = float(response.headers.get('retry-after'))
+        except (AttributeError, TypeError, ValueError):
+            retry_after = 0.0
+        return max(delay, retry_after)
+
+    def call(self, fn, timeout):
+        """
+        fn(remaining_seconds)를 호출해 결과를 반환합니다. timeout은 속도 제한 대기와 재시도를 모두 포함한
+        전체 제한 시간(초)이며, fn에는 매번 남은 시간을 넘겨 API 요청의 제한 시간으로 쓰게 합니다.
+        제한 시간 안에 성공하지 못하거나 서킷 브레이커가 열려 있으면 LLMUnavailableError를 발생시킵니다.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("AI 서비스 장애가 이어져 잠시 호출을 멈췄습니다.")
+        deadline = time.monotonic() + timeout
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.rate_limiter.acquire(timeout=remaining):
+                break
+            try:
+                result = fn(deadline - time.monotonic())
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+            except (*INPUT_ERRORS, ValueError):
+                # API가 요청을 처리했으므로(잘못된 요청, 응답 형식 오류 등) 장애로 세지 않습니다.
+                self.breaker.record_success()
+                raise
+            except Exception:
+                # 인증 오류(401, 403), 없는 모델(404) 등은 다시 호출해도 실패하므로 장애로 세어 브레이커를 엽니다.
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+            if attempt == self.max_attempts:
+                break
+            delay = self._backoff(attempt, last_error)
+            if time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+
+        if last_error is None:
+            # 이 프로세스의 요청 한도에 걸린 것이므로 API 장애로 세지 않고, 시험 호출이었다면 다음 호출에 넘깁니다.
+            self.breaker.release_probe()
+            raise LLMUnavailableError(f"요청 한도(분당 {LLM_REQUESTS_PER_MINUTE}회)에 걸려 {timeout}초 안에 호출하지 못했습니다.")
+        self.breaker.record_failure()
+        raise LLMUnavailableError(f"AI 응답을 받지 못했습니다 ({attempt}번 시도): {type(last_error).__name__}: {last_error}") from last_error
+
+    def call_shared(self, key, fn, timeout):
+        """
+        call()과 같지만, 같은 key(예: 모델과 프롬프트)로 진행 중인 호출이 있으면 그 결과를 함께 받습니다.
+        (result, shared)를 반환하며, shared가 True이면 다른 요청의 결과이므로 고치기 전에 복사해야 합니다.
+        """
+        return self.single_flight.do(key, lambda: self.call(fn, timeout))
@@ -0,0 +1,70 @@
+"""
+검색 후보를 CPU에서 다시 정렬하는 재순위화기입니다. 최종 1~3순위는 이 점수로 정하고, LLM은 1순위 책의 추천사만 씁니다.
+같은 입력이면 항상 같은 순서를 돌려주므로 LLM 없이 오프라인으로 순위를 검증하고 가중치를 조정할 수 있습니다.
+
+후보 책마다 다음 특징을 계산해 가중합합니다. (RERANK_FEATURES 순서)
+  - dense          질의와 책 임베딩의 코사인 유사도
+  - chunk          책의 청크(소개/목차 조각) 중 질의와 가장 가까운 청크의 코사인 유사도
+  - table          목차 청크 중 질의와 가장 가까운 청크의 코사인 유사도 (목차가 고민과 직접 맞닿는 책을 올립니다)
+  - lexical        BM25 점수를 후보 중 최고 점수로 나눈 값 (0~1)
+  - fusion         RRF 융합 점수를 후보 중 최고 점수로 나눈 값 (여러 검색기의 합의)
+  - stage_tag      사용자가 고른 성장 단계 태그가 붙어 있으면 1
+  - challenge_tag  사용자가 고른 당면 과제 태그가 붙어 있으면 1
+저장소에 없는 특징(청크 인덱스, BM25 역색인, 태그)과 -inf 값은 0으로 둡니다.
+"""
+import numpy as np
+
+RERANK_FEATURES = ('dense', 'chunk', 'table', 'lexical', 'fusion', 'stage_tag', 'challenge_tag')
+# 기본 가중치: 코사인 유사도 특징이 순서를 정하고, 나머지는 점수가 비슷한 후보 사이의 순서를 바꾸는 정도로 둡니다.
+DEFAULT_WEIGHTS = {
+    'dense': 1.0,
+    'chunk': 0.5,
+    'table': 0.2,
+    'lexical': 0.15,
+    'fusion': 0.15,
+    'stage_tag': 0.03,
+    'challenge_tag': 0.05,
+}
+# 후보 안에서 최고값으로 나누어 0~1로 맞추는 특징 (척도가 질의마다 다른 점수)
+_MAX_SCALED_FEATURES = ('lexical', 'fusion')
+
+
+def feature_matrix(n_candidates, **features):
+    """
+    특징 이름별 값 배열(후보 수 길이)을 (후보 수, len(RERANK_FEATURES)) float32 행렬로 모읍니다.
+    주지 않은 특징과 유한하지 않은 값은 0으로 두고, lexical과 fusion은 후보 중 최고값으로 나눕니다.
+    """
+    unknown = set(features) - set(RERANK_FEATURES)
+    if unknown:
+        raise ValueError(f"알 수 없는 재순위화 특징입니다: {', '.join(sorted(unknown))}")
+    matrix = np.zeros((n_candidates, len(RERANK_FEATURES)), dtype=np.float32)
+    for column, name in enumerate(RERANK_FEATURES):
+        values = features.get(name)
+        if values is None:
+            continue
+        values = np.asarray(values, dtype=np.float32)
+        values = np.where(np.isfinite(values), values, 0.0)
+        if name in _MAX_SCALED_FEATURES:
+            top = values.max(initial=0.0)
+            values = values / top if top > 0 else np.zeros_like(values)
+        matrix[:, column] = values
+    return matrix
+
+
+class Reranker:
+    """특징 행렬을 가중합해 후보 순서를 정하는 선형 재순위화기입니다."""
+
+    def __init__(self, weights=None):
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        unknown = set(weights) - set(RERANK_FEATURES)
+        if unknown:
+            raise ValueError(f"알 수 없는 재순위화 특징입니다: {', '.join(sorted(unknown))}")
+        self.weights = np.array([weights[name] for name in RERANK_FEATURES], dtype=np.float32)
+
+    def score(self, features):
+        """특징 행렬 (후보 수, 특징 수) 또는 배치 (질의 수, 후보 수, 특징 수)의 후보별 점수를 반환합니다."""
+        return np.asarray(features, dtype=np.float32) @ self.weights
+
+    def rank(self, features):
+        """점수 내림차순의 후보 순서(특징 행렬의 행 번호)를 반환합니다. 동점이면 원래 순서(검색 융합 순위)를 유지합니다."""
+        return np.argsort(-self.score(features), axis=-1, kind='stable')
@@ -0,0 +1,102 @@
+"""
+프로세스 전체에서 한 번만 만들어 공유하는 자원입니다. (카탈로그와 검색 인덱스, OpenAI 클라이언트, LLM 호출 정책, 캐시, 요청 로그, LLM 슬롯)
+같은 프로세스 안의 여러 엔진(두 스트림릿 앱, 서버의 요청 스레드, 배치 실행기)이 같은 객체를 사용하므로
+스크립트가 다시 실행되거나 세션이 늘어나도 저장소를 다시 읽거나 HTTP 연결을 새로 맺지 않습니다.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from embedding_cache import EmbeddingCache
+from llm_client import ResilientLLM
+from response_cache import SemanticResponseCache
+from tracing import REQUEST_LOG_PATH, create_request_log
+
+# OpenAI 클라이언트 설정: 클라이언트 하나가 keep-alive 연결 풀을 가지며, 모든 요청이 이 풀을 함께 사용합니다.
+# (채팅 호출의 재시도는 llm_client.ResilientLLM이 맡으므로 엔진은 재시도 없는 사본을 씁니다)
+OPENAI_MAX_RETRIES = 2
+# 단계 1~3에서 미리 하는 준비 작업(후보 풀, 질의 임베딩)을 실행할 스레드 수
+PREFETCH_THREADS = 4
+
+_resources = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _lock_for(name):
+    with _registry_lock:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def shared_resource(name, factory):
+    """name마다 factory()로 자원을 한 번만 만들어 프로세스 전체에서 공유합니다."""
+    return shared_versioned(name, None, factory)
+
+
+def shared_versioned(name, version, factory):
+    """
+    name마다 하나의 자원을 공유하되, version이 바뀌면(예: 저장소 build_id) 새로 만들어 교체합니다.
+    교체 전의 자원을 사용 중인 요청은 그대로 끝까지 사용합니다. factory()가 None을 반환하면 저장하지 않습니다.
+    """
+    with _lock_for(name):
+        entry = _resources.get(name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = factory()
+        if value is not None:
+            _resources[name] = (version, value)
+        return value
+
+
+def load_api_key():
+    """OPENAI_API_KEY 환경 변수, 없으면 .streamlit/secrets.toml에서 API 키를 읽습니다. (서버와 배치 실행기용)"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path='.streamlit/secrets.toml')
+    except ImportError:
+        pass
+    return os.getenv('OPENAI_API_KEY')
+
+
+def get_openai_client(api_key=None):
+    """API 키마다 OpenAI 클라이언트를 하나만 만들어 재사용합니다. 키가 없으면 None을 반환합니다."""
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        return None
+    key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+    return shared_resource(('openai', key_hash), lambda: OpenAI(api_key=api_key, max_retries=OPENAI_MAX_RETRIES))
+
+
+def get_embedding_cache(path):
+    """질의 임베딩 캐시(메모리 LRU + SQLite)를 파일마다 하나만 엽니다."""
+    return shared_resource(('embedding_cache', path), lambda: EmbeddingCache(path))
+
+
+def get_response_cache(similarity_threshold):
+    """추천 결과 캐시를 하나만 만듭니다. (모든 사용자 세션이 공유)"""
+    return shared_resource(('response_cache', similarity_threshold),
+                           lambda: SemanticResponseCache(similarity_threshold=similarity_threshold))
+
+
+def get_request_log(path=REQUEST_LOG_PATH):
+    """요청 로그를 파일마다 하나만 만듭니다. (METRICS_PORT가 있으면 /metrics 엔드포인트도 한 번만 엽니다)"""
+    return shared_resource(('request_log', path), lambda: create_request_log(path))
+
+
+def get_llm_guard():
+    """LLM 호출 정책(토큰 버킷, 서킷 브레이커, 단일 비행)을 하나만 만듭니다. 모든 요청이 같은 쿼터와 장애 상태를 봅니다."""
+    return shared_resource('llm_guard', ResilientLLM)
+
+
+def get_prefetch_executor():
+    """추천 사전 준비(RecommendationEngine.prefetch)에 쓰는 백그라운드 스레드 풀입니다."""
+    return shared_resource('prefetch_executor',
+                           lambda: ThreadPoolExecutor(max_workers=PREFETCH_THREADS, thread_name_prefix='prefetch'))
+
+
+def get_llm_slots(max_concurrency):
+    """프로세스 전체에서 공유하는 LLM 동시 호출 슬롯입니다."""
+    return shared_resource(('llm_slots', max_concurrency), lambda: threading.BoundedSemaphore(max_concurrency))
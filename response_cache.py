@@ -0,0 +1,101 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from retrieval import normalize_rows
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES_PER_KEY = 256
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_TTL_SECONDS = 6 * 60 * 60   # 6시간
+
+
+class SemanticResponseCache:
+    """
+    추천 결과(LLM 응답 JSON)를 위한 의미 기반 캐시입니다.
+    (성장 단계, 당면 과제)는 정확히 일치해야 하고, 그 안에서 질의 임베딩의 코사인 유사도가
+    임계값 이상인 이전 질의가 있으면 그 답변을 재사용합니다.
+    벡터 저장소의 build_id가 바뀌면 모든 항목을 무효화합니다.
+    """
+
+    def __init__(self, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_entries_per_key=DEFAULT_MAX_ENTRIES_PER_KEY, ttl_seconds=DEFAULT_TTL_SECONDS, store_version=None):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.max_entries_per_key = max_entries_per_key
+        self.ttl_seconds = ttl_seconds
+        self.store_version = store_version
+        # (stage, challenge) → OrderedDict[entry_id → (정규화된 질의 벡터, 응답, 저장 시각)]
+        self._buckets = {}
+        self._lru = OrderedDict()   # entry_id → (stage, challenge), 전체 항목의 LRU 순서
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._lru)
+
+    def _check_store_version(self, store_version):
+        if store_version != self.store_version:
+            self._buckets.clear()
+            self._lru.clear()
+            self.store_version = store_version
+
+    def _remove(self, entry_id):
+        key = self._lru.pop(entry_id)
+        bucket = self._buckets[key]
+        del bucket[entry_id]
+        if not bucket:
+            del self._buckets[key]
+
+    def get(self, stage, challenge, query_embedding, store_version=None):
+        """조건을 만족하는 캐시된 응답의 복사본을 반환합니다. 없으면 None을 반환합니다."""
+        query = normalize_rows(query_embedding)
+        with self._lock:
+            self._check_store_version(store_version)
+            bucket = self._buckets.get((stage, challenge))
+            if bucket:
+                now = time.time()
+                for entry_id in [eid for eid, (_, _, created) in bucket.items() if now - created > self.ttl_seconds]:
+                    self._remove(entry_id)
+                bucket = self._buckets.get((stage, challenge))
+
+            if bucket:
+                entry_ids = list(bucket)
+                vectors = np.stack([bucket[eid][0] for eid in entry_ids])
+                similarities = vectors @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    entry_id = entry_ids[best]
+                    bucket.move_to_end(entry_id)
+                    self._lru.move_to_end(entry_id)
+                    self.hits += 1
+                    return copy.deepcopy(bucket[entry_id][1])
+
+            self.misses += 1
+            return None
+
+    def put(self, stage, challenge, query_embedding, response, store_version=None):
+        """응답을 저장합니다. 전체/키별 한도를 넘으면 가장 오래 사용되지 않은 항목부터 제거합니다."""
+        query = normalize_rows(query_embedding)
+        with self._lock:
+            self._check_store_version(store_version)
+            key = (stage, challenge)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._buckets.setdefault(key, OrderedDict())[entry_id] = (query, copy.deepcopy(response), time.time())
+            self._lru[entry_id] = key
+
+            bucket = self._buckets[key]
+            while len(bucket) > self.max_entries_per_key:
+                self._remove(next(iter(bucket)))
+            while len(self._lru) > self.max_entries:
+                self._remove(next(iter(self._lru)))
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._lru)}
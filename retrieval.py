@@ -0,0 +1,120 @@
+import numpy as np
+
+# float16/int8 행렬은 이 행 수만큼씩 float32로 변환하며 점수를 계산합니다. (메모리 사용량 제한)
+SCORE_CHUNK_ROWS = 8192
+
+
+def normalize_rows(matrix):
+    """각 행을 L2 노름으로 나눈 float32 행렬을 반환합니다. (노름이 0인 행은 그대로 둡니다)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores, k):
+    """
+    점수 배열(1차원 또는 2차원)에서 상위 k개의 인덱스를 점수 내림차순으로 반환합니다.
+    전체 정렬 대신 argpartition으로 k개만 골라낸 뒤, 그 k개만 정렬합니다.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+
+    if k < n:
+        candidates = np.argpartition(scores, n - k, axis=-1)[..., n - k:]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class VectorIndex:
+    """
+    코사인 유사도 기반의 정확(exact) Top-K 검색 인덱스입니다.
+    도서 임베딩 행렬은 로드 시점에 한 번만 정규화하여 연속된 float32 배열로 보관하고,
+    질의 시에는 행렬-벡터 곱 한 번으로 모든 책의 점수를 계산합니다.
+
+    normalized=True로 이미 정규화된 행렬(예: 메모리 매핑된 float16/int8 행렬)을 넘기면 복사하지 않고 그대로 사용합니다.
+    int8 행렬은 행별 스케일(scales)을 곱해 원래 값으로 복원합니다.
+    """
+
+    def __init__(self, embeddings, normalized=False, scales=None):
+        if normalized:
+            matrix = embeddings
+        else:
+            matrix = normalize_rows(embeddings)
+        self.matrix = np.ascontiguousarray(matrix)
+        self.scales = None if scales is None else np.asarray(scales, dtype=np.float32)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def rows(self, indices):
+        """지정한 행들을 float32 벡터로 반환합니다. (양자화된 행렬이면 스케일을 곱해 복원합니다)"""
+        vectors = self.matrix[indices].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[indices][..., np.newaxis]
+        return vectors
+
+    def score(self, queries):
+        """정규화된 질의 벡터(들)와 모든 책 사이의 코사인 유사도를 계산합니다."""
+        queries = normalize_rows(queries)
+        if self.matrix.dtype == np.float32 and self.scales is None:
+            return queries @ self.matrix.T
+
+        scores = np.empty(queries.shape[:-1] + (len(self),), dtype=np.float32)
+        for start in range(0, len(self), SCORE_CHUNK_ROWS):
+            stop = min(start + SCORE_CHUNK_ROWS, len(self))
+            scores[..., start:stop] = queries @ self.rows(slice(start, stop)).T
+        return scores
+
+    def search(self, queries, k=5, subset=None):
+        """
+        질의 벡터 하나(1차원) 또는 여러 개(2차원)에 대해 Top-K 검색을 수행합니다.
+        (indices, scores)를 반환하며, 단일 질의면 (k,), 배치면 (질의 수, k) 모양입니다.
+        subset(행 번호 배열)을 넘기면 그 행들만 점수를 계산해 검색합니다. (메타데이터 필터링)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        if single:
+            queries = queries[np.newaxis, :]
+
+        if subset is None:
+            scores = self.score(queries)
+        else:
+            subset = np.asarray(subset, dtype=np.int64)
+            scores = normalize_rows(queries) @ self.rows(subset).T
+        indices = top_k(scores, k)
+        top_scores = np.take_along_axis(scores, indices, axis=-1)
+        if subset is not None:
+            indices = subset[indices]
+
+        if single:
+            return indices[0], top_scores[0]
+        return indices, top_scores
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    여러 검색 결과(점수 내림차순 인덱스 배열들)를 Reciprocal Rank Fusion으로 합칩니다.
+    문서마다 sum(1 / (k + 순위))를 계산하므로, 점수 척도가 다른 검색기(BM25, 코사인)도 그대로 합칠 수 있습니다.
+    (indices, fused_scores)를 융합 점수 내림차순으로 반환합니다.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, index in enumerate(np.asarray(ranking).tolist(), start=1):
+            fused[index] = fused.get(index, 0.0) + 1.0 / (k + rank)
+
+    indices = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+    order = np.argsort(-scores, kind='stable')
+    return indices[order], scores[order]
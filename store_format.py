@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import shutil
+import struct
+import time
+import uuid
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from retrieval import VectorIndex, normalize_rows
+
+# --- 벡터 저장소 디렉터리 형식 (버전 1) ---
+# vector_store/
+#   CURRENT              지금 사용할 빌드의 build_id (한 줄). 이 파일을 원자적으로 바꿔 새 빌드를 게시합니다.
+#   <build_id>/          빌드 하나 (최근 STORE_KEEP_VERSIONS개까지 보관)
+#     manifest.json      형식 버전, 도서 수, 차원, 저장 dtype, 임베딩 모델, 빌드 ID
+#     embeddings.npy     정규화된 임베딩 행렬 (float32 / float16 / int8), 메모리 매핑으로 엽니다.
+#     scales.npy         int8일 때만: 행별 역양자화 스케일 (float32)
+#     metadata.json      name, author, intro, table 등 도서 정보를 컬럼 단위로 저장 (벡터는 포함하지 않음)
+#     (청크 인덱스, BM25 역색인, 태그 비트셋, ANN 인덱스 등 같은 빌드의 부속 파일)
+# CURRENT 없이 manifest.json이 vector_store/ 바로 아래에 있는 이전 배치도 그대로 읽습니다.
+STORE_FORMAT_VERSION = 1
+DEFAULT_STORE_DIR = 'vector_store'
+STORE_DTYPES = ('float32', 'float16', 'int8')
+
+MANIFEST_FILE = 'manifest.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+SCALES_FILE = 'scales.npy'
+METADATA_FILE = 'metadata.json'
+CURRENT_FILE = 'CURRENT'
+# 새 빌드를 게시한 뒤에도 남겨 둘 이전 빌드 수. 게시 직전에 저장소를 연 프로세스가 이전 빌드를 끝까지 읽을 수 있게 합니다.
+STORE_KEEP_VERSIONS = 2
+
+# 벡터 저장소에 넣지 않는 컬럼 (벡터 자체, 그리고 intro + table로 다시 만들 수 있는 텍스트)
+EXCLUDED_COLUMNS = ('embedding', 'combined_text', 'embedding_model')
+
+
+def quantize_int8(matrix):
+    """정규화된 행렬을 행별 스케일을 갖는 int8 행렬로 양자화합니다. (quantized, scales)를 반환합니다."""
+    max_abs = np.abs(matrix).max(axis=1)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(matrix / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+class VectorStore:
+    """디스크의 벡터 저장소를 나타냅니다. 임베딩 행렬은 메모리 매핑되어 여러 프로세스가 OS 페이지 캐시를 공유합니다."""
+
+    def __init__(self, path, manifest, metadata, matrix, scales=None):
+        self.path = path
+        self.manifest = manifest
+        self.metadata = metadata
+        self.matrix = matrix
+        self.scales = scales
+
+    def __len__(self):
+        return len(self.metadata)
+
+    @property
+    def build_id(self):
+        """빌드마다 바뀌는 식별자입니다. 저장소가 바뀌었는지 판단하는 데 사용합니다."""
+        return self.manifest['build_id']
+
+    def index(self):
+        """임베딩 행렬을 복사하지 않고 그대로 감싸는 VectorIndex를 반환합니다."""
+        return VectorIndex(self.matrix, normalized=True, scales=self.scales)
+
+
+def _write_metadata(path, df):
+    columns = {col: df[col].tolist() for col in df.columns if col not in EXCLUDED_COLUMNS}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'columns': columns}, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def save_store(path, df, embeddings_matrix, dtype='float32', embedding_model=None, writers=()):
+    """
+    도서 데이터프레임과 임베딩 행렬을 버전이 있는 저장소 형식으로 저장합니다.
+    새 빌드는 path/<build_id>/ 디렉터리에 모두 쓰고, writers의 각 함수를 writer(store)로 호출해 같은 디렉터리에
+    부속 파일(청크 인덱스, BM25 역색인 등)까지 쓴 뒤, 마지막에 CURRENT 파일 하나를 원자적으로 바꿔 게시합니다.
+    따라서 읽는 쪽은 이전 빌드나 부속 파일까지 완성된 새 빌드 중 하나만 보며, 저장소가 없는 순간도 없습니다.
+    writer가 예외를 발생시키면 새 빌드를 지우고 게시하지 않은 채 예외를 그대로 전달합니다.
+    """
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"지원하지 않는 dtype입니다: {dtype} (가능한 값: {', '.join(STORE_DTYPES)})")
+    if len(df) != len(embeddings_matrix):
+        raise ValueError("도서 수와 임베딩 행렬의 행 수가 일치하지 않습니다.")
+
+    matrix = normalize_rows(embeddings_matrix)
+    scales = None
+    if dtype == 'int8':
+        matrix, scales = quantize_int8(matrix)
+    else:
+        matrix = matrix.astype(dtype)
+
+    build_id = uuid.uuid4().hex
+    version_path = os.path.join(path, build_id)
+    os.makedirs(version_path)
+
+    np.save(os.path.join(version_path, EMBEDDINGS_FILE), matrix)
+    if scales is not None:
+        np.save(os.path.join(version_path, SCALES_FILE), scales)
+    _write_metadata(os.path.join(version_path, METADATA_FILE), df)
+
+    manifest = {
+        'format_version': STORE_FORMAT_VERSION,
+        'count': int(matrix.shape[0]),
+        'dim': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        'dtype': dtype,
+        'normalized': True,
+        'embedding_model': embedding_model,
+        'build_id': build_id,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    with open(os.path.join(version_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    if writers:
+        try:
+            store = load_store(version_path)
+            for writer in writers:
+                writer(store)
+        except BaseException:
+            shutil.rmtree(version_path, ignore_errors=True)
+            raise
+
+    previous_build_id = _read_current(path)
+    _publish(path, build_id)
+    _remove_old_versions(path, build_id, legacy_files=previous_build_id is not None)
+    return manifest
+
+
+def _read_current(path):
+    """CURRENT 파일의 build_id를 반환합니다. 파일이 없으면 None을 반환합니다."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _publish(path, build_id):
+    """CURRENT 파일을 임시 파일에 쓴 뒤 os.replace로 한 번에 바꿉니다. (같은 디렉터리 안의 원자적 교체)"""
+    tmp_path = os.path.join(path, f"{CURRENT_FILE}.{build_id}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(build_id + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, CURRENT_FILE))
+
+
+def _remove_old_versions(path, build_id, legacy_files=False):
+    """
+    지금 게시한 build_id를 포함해 최근 STORE_KEEP_VERSIONS개의 빌드만 남기고 이전 빌드 디렉터리를 지웁니다.
+    legacy_files=True이면 이전 배치(vector_store/ 바로 아래의 manifest.json 등)의 파일도 지웁니다.
+    이전 배치 파일은 CURRENT를 처음 만든 다음 빌드에서 지우므로, 그 사이에 이전 배치를 열고 있던 프로세스도 끝까지 읽습니다.
+    """
+    versions = []
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            if entry.name != build_id and os.path.exists(os.path.join(entry.path, MANIFEST_FILE)):
+                versions.append((entry.stat().st_mtime, entry.path))
+        elif legacy_files and entry.name != CURRENT_FILE and not entry.name.startswith(f"{CURRENT_FILE}."):
+            os.remove(entry.path)
+    for _, version_path in sorted(versions, reverse=True)[STORE_KEEP_VERSIONS - 1:]:
+        shutil.rmtree(version_path, ignore_errors=True)
+
+
+def resolve_store_path(path=DEFAULT_STORE_DIR):
+    """
+    CURRENT가 가리키는 빌드 디렉터리를 반환합니다. CURRENT가 없으면 이전 배치로 보고 path를 그대로 반환합니다.
+    저장소를 여는 쪽은 이 경로를 한 번만 구해 모든 파일을 읽어야 중간에 게시된 새 빌드와 섞이지 않습니다.
+    """
+    build_id = _read_current(path)
+    return os.path.join(path, build_id) if build_id is not None else path
+
+
+def read_build_id(path=DEFAULT_STORE_DIR):
+    """저장소의 build_id만 가볍게 읽습니다. 저장소가 없으면 None을 반환합니다."""
+    build_id = _read_current(path)
+    if build_id is not None:
+        return build_id
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f).get('build_id')
+    except FileNotFoundError:
+        return None
+
+
+def load_npz(path, mmap=True):
+    """
+    np.savez로 저장한 .npz 파일의 배열들을 dict로 읽습니다. (BM25 역색인, ANN 인덱스, 태그 비트셋)
+    mmap=True이면 압축하지 않고 저장된 배열을 파일 위의 읽기 전용 메모리 매핑으로 열어,
+    같은 호스트의 여러 프로세스가 복사본 없이 OS 페이지 캐시를 공유합니다.
+    압축되었거나 메모리 매핑할 수 없는 배열(object dtype, 빈 배열)은 메모리로 읽습니다.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if mmap and info.compress_type == zipfile.ZIP_STORED:
+                # 로컬 파일 헤더(30바이트 + 파일 이름 + 추가 필드) 바로 뒤에 .npy 파일이 그대로 들어 있습니다.
+                f.seek(info.header_offset)
+                name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                if not dtype.hasobject and int(np.prod(shape)) > 0:
+                    arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                             order='F' if fortran_order else 'C').view(np.ndarray)
+                    continue
+            with archive.open(info) as member:
+                arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+    return arrays
+
+
+def load_store(path=DEFAULT_STORE_DIR, mmap=True):
+    """
+    벡터 저장소를 엽니다. 임베딩 행렬은 기본적으로 메모리 매핑(읽기 전용)으로 열어 프로세스별 RSS를 줄입니다.
+    반환하는 VectorStore의 path는 CURRENT가 가리키는 빌드 디렉터리이며, 부속 파일도 이 경로에서 읽습니다.
+    저장소가 없으면 FileNotFoundError, 형식 버전이 다르면 ValueError를 발생시킵니다.
+    """
+    path = resolve_store_path(path)
+    with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != STORE_FORMAT_VERSION:
+        raise ValueError(f"지원하지 않는 벡터 저장소 형식 버전입니다: {manifest.get('format_version')} "
+                         f"(필요한 버전: {STORE_FORMAT_VERSION}). build_vector_store.py를 다시 실행해주세요.")
+
+    mmap_mode = 'r' if mmap else None
+    matrix = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode=mmap_mode)
+    scales = None
+    if manifest['dtype'] == 'int8':
+        scales = np.load(os.path.join(path, SCALES_FILE), mmap_mode=mmap_mode)
+
+    with open(os.path.join(path, METADATA_FILE), encoding='utf-8') as f:
+        metadata = pd.DataFrame(json.load(f)['columns'])
+
+    return VectorStore(path, manifest, metadata, matrix, scales)
+
+
+def convert_legacy_store(pickle_path, matrix_path, path=DEFAULT_STORE_DIR, dtype='float32', embedding_model=None):
+    """기존 vector_store.pkl + embeddings_matrix.npy 파일을 새 저장소 형식으로 변환합니다."""
+    df = pd.read_pickle(pickle_path)
+    matrix = np.load(matrix_path)
+    if embedding_model is None and 'embedding_model' in df.columns:
+        embedding_model = df['embedding_model'].iloc[0]
+    return save_store(path, df, matrix, dtype=dtype, embedding_model=embedding_model)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="기존 pkl/npy 벡터 저장소를 새 저장소 형식으로 변환합니다.")
+    parser.add_argument('--pickle', default='vector_store.pkl')
+    parser.add_argument('--matrix', default='embeddings_matrix.npy')
+    parser.add_argument('--out', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--dtype', choices=STORE_DTYPES, default='float32')
+    args = parser.parse_args()
+
+    manifest = convert_legacy_store(args.pickle, args.matrix, path=args.out, dtype=args.dtype)
+    print(f"✅ '{args.out}' 저장소가 생성되었습니다. (도서 {manifest['count']:,}권, {manifest['dtype']})")
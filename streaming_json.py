@@ -0,0 +1,77 @@
+import json
+
+
+class IncrementalJSONObjectParser:
+    """
+    스트리밍으로 도착하는 JSON 객체 텍스트를 조각 단위로 받아,
+    최상위 필드의 값이 완성되는 즉시 (key, value)로 돌려주는 증분 파서입니다.
+    전체 응답이 끝나기 전에 완성된 필드부터 화면에 그릴 수 있게 해줍니다.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._value_start = None
+        self.done = False
+
+    def feed(self, chunk):
+        """텍스트 조각을 추가하고, 이번 조각으로 새로 완성된 최상위 필드의 (key, value) 리스트를 반환합니다."""
+        if not chunk or self.done:
+            return []
+        self._text += chunk
+        completed = []
+
+        text = self._text
+        while self._pos < len(text):
+            pos = self._pos
+            char = text[pos]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._key = json.loads(text[self._string_start:pos + 1])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(text, pos, completed)
+                    self.done = True
+                    break
+            elif self._depth == 1:
+                if char == ':' and self._key is not None and self._value_start is None:
+                    self._value_start = pos + 1
+                elif char == ',':
+                    self._finish_value(text, pos, completed)
+
+        return completed
+
+    def _finish_value(self, text, end, completed):
+        if self._key is None or self._value_start is None:
+            return
+        value = json.loads(text[self._value_start:end])
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        self._key = None
+        self._value_start = None
+
+    def result(self):
+        """지금까지 완성된 필드들을 담은 dict를 반환합니다."""
+        return dict(self.fields)
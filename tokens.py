@@ -0,0 +1,35 @@
+# 토큰 수 계산 유틸리티
+# tiktoken이 설치되어 있으면 정확한 토큰 수를, 없으면 보수적인 추정치를 사용합니다.
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _ENCODING = None
+
+
+def count_tokens(text):
+    """텍스트의 토큰 수를 반환합니다. (tiktoken이 없으면 UTF-8 바이트 수의 절반으로 넉넉하게 추정)"""
+    text = str(text)
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text.encode("utf-8")) // 2 + 1
+
+
+def truncate_to_tokens(text, max_tokens):
+    """텍스트를 최대 max_tokens 토큰 길이로 자릅니다."""
+    text = str(text)
+    if max_tokens <= 0:
+        return ""
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return _ENCODING.decode(tokens[:max_tokens])
+
+    if count_tokens(text) <= max_tokens:
+        return text
+    # 추정치 기준으로 비례해서 자른 뒤, 한도 안에 들어올 때까지 조금씩 줄입니다.
+    cut = int(len(text) * max_tokens / count_tokens(text))
+    while cut > 0 and count_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut]
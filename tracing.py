@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- 요청 로그 / 지표 설정 ---
+# 추천 요청 하나당 한 줄의 JSON 레코드를 이 파일에 덧붙입니다.
+REQUEST_LOG_PATH = os.path.join('logs', 'request_log.jsonl')
+# 이 환경 변수에 포트를 지정하면 /metrics 엔드포인트(Prometheus 텍스트 형식)를 엽니다.
+METRICS_PORT_ENV = 'METRICS_PORT'
+
+# 모델별 100만 토큰당 가격(USD). 비용은 이 표로 추정한 값입니다.
+MODEL_PRICES_PER_1M_TOKENS = {
+    'gpt-4o-mini': {'input': 0.15, 'output': 0.60},
+    'text-embedding-3-small': {'input': 0.02, 'output': 0.0},
+}
+
+# 단계별 지연시간 히스토그램 버킷 상한(ms)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0):
+    """가격표에 있는 모델이면 추정 비용(USD)을, 없으면 0을 반환합니다."""
+    prices = MODEL_PRICES_PER_1M_TOKENS.get(model)
+    if prices is None:
+        return 0.0
+    return ((prompt_tokens or 0) * prices['input'] + (completion_tokens or 0) * prices['output']) / 1_000_000
+
+
+class RequestTrace:
+    """
+    추천 요청 하나의 추적 정보입니다. 단계(span)별 소요 시간, 모델별 토큰 수, 추정 비용을 모아
+    finish()에서 한 줄의 레코드로 만듭니다.
+
+        trace = request_log.start('new_app', stage=stage)
+        with trace.span('embedding'):
+            ...
+        trace.record_usage('gpt-4o-mini', prompt_tokens, completion_tokens)
+        trace.finish()
+    """
+
+    def __init__(self, request_log, app, **attributes):
+        self.request_log = request_log
+        self.record = {
+            'request_id': uuid.uuid4().hex,
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'app': app,
+            **attributes,
+            'spans': {},
+            'tokens': {},
+            'cost_usd': 0.0,
+        }
+        self._start = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def span(self, name):
+        """with 블록의 소요 시간(ms)을 name 단계로 기록합니다. 같은 이름이 여러 번 나오면 더합니다."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_span(name, (time.perf_counter() - start) * 1000)
+
+    def add_span(self, name, elapsed_ms):
+        self.record['spans'][name] = self.record['spans'].get(name, 0.0) + elapsed_ms
+
+    def set(self, **attributes):
+        self.record.update(attributes)
+
+    def record_usage(self, model, prompt_tokens=0, completion_tokens=0):
+        """모델 호출 한 번의 토큰 사용량을 더하고, 추정 비용을 갱신합니다."""
+        usage = self.record['tokens'].setdefault(model, {'prompt': 0, 'completion': 0})
+        usage['prompt'] += prompt_tokens or 0
+        usage['completion'] += completion_tokens or 0
+        self.record['cost_usd'] += estimate_cost(model, prompt_tokens, completion_tokens)
+
+    def finish(self, status='ok', error=None):
+        """요청을 마치고 레코드를 로그와 지표에 기록합니다. 두 번째 호출부터는 무시합니다."""
+        if self._finished:
+            return self.record
+        self._finished = True
+        self.record['status'] = status
+        if error is not None:
+            self.record['error'] = f"{type(error).__name__}: {error}"
+        self.record['total_ms'] = (time.perf_counter() - self._start) * 1000
+        self.request_log.append(self.record)
+        return self.record
+
+
+class Metrics:
+    """요청 수, 토큰 수, 비용 카운터와 단계별 지연시간 히스토그램을 프로세스 안에서 집계합니다."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self.requests = {}       # (app, status) -> count
+        self.tokens = {}         # (app, model, kind) -> count
+        self.cost_usd = {}       # app -> USD
+        self.histograms = {}     # (app, span) -> [bucket counts..., +Inf count, sum_ms]
+
+    def observe(self, record):
+        app = record.get('app', '')
+        with self._lock:
+            key = (app, record.get('status', ''))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.cost_usd[app] = self.cost_usd.get(app, 0.0) + record.get('cost_usd', 0.0)
+            for model, usage in record.get('tokens', {}).items():
+                for kind, count in usage.items():
+                    token_key = (app, model, kind)
+                    self.tokens[token_key] = self.tokens.get(token_key, 0) + count
+
+            spans = dict(record.get('spans', {}))
+            if 'total_ms' in record:
+                spans['total'] = record['total_ms']
+            for span, elapsed_ms in spans.items():
+                histogram = self.histograms.setdefault((app, span), [0] * (len(self.buckets_ms) + 1) + [0.0])
+                bucket = next((i for i, bound in enumerate(self.buckets_ms) if elapsed_ms <= bound), len(self.buckets_ms))
+                histogram[bucket] += 1
+                histogram[-1] += elapsed_ms
+
+    def render_prometheus(self):
+        """Prometheus 텍스트 노출 형식으로 지표를 출력합니다."""
+        lines = ['# TYPE recommendation_requests_total counter']
+        with self._lock:
+            for (app, status), count in sorted(self.requests.items()):
+                lines.append(f'recommendation_requests_total{{app="{app}",status="{status}"}} {count}')
+            lines.append('# TYPE recommendation_tokens_total counter')
+            for (app, model, kind), count in sorted(self.tokens.items()):
+                lines.append(f'recommendation_tokens_total{{app="{app}",model="{model}",kind="{kind}"}} {count}')
+            lines.append('# TYPE recommendation_cost_usd_total counter')
+            for app, cost in sorted(self.cost_usd.items()):
+                lines.append(f'recommendation_cost_usd_total{{app="{app}"}} {cost:.6f}')
+            lines.append('# TYPE recommendation_span_ms histogram')
+            for (app, span), histogram in sorted(self.histograms.items()):
+                labels = f'app="{app}",span="{span}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets_ms, histogram):
+                    cumulative += count
+                    lines.append(f'recommendation_span_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+                cumulative += histogram[len(self.buckets_ms)]
+                lines.append(f'recommendation_span_ms_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f'recommendation_span_ms_sum{{{labels}}} {histogram[-1]:.3f}')
+                lines.append(f'recommendation_span_ms_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestLog:
+    """요청 레코드를 JSONL 파일에 덧붙이고 Metrics에 집계합니다. 여러 세션(스레드)에서 함께 사용합니다."""
+
+    def __init__(self, path=REQUEST_LOG_PATH, metrics=None):
+        self.path = path
+        self.metrics = metrics or Metrics()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def start(self, app, **attributes):
+        return RequestTrace(self, app, **attributes)
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        self.metrics.observe(record)
+
+
+def start_metrics_server(metrics, port, host='0.0.0.0'):
+    """별도 스레드에서 /metrics 엔드포인트를 엽니다. 서버 객체를 반환합니다."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            payload = metrics.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 지표 엔드포인트: http://{host}:{port}/metrics")
+    return server
+
+
+def create_request_log(path=REQUEST_LOG_PATH):
+    """요청 로그를 만들고, METRICS_PORT 환경 변수가 있으면 지표 엔드포인트도 엽니다."""
+    request_log = RequestLog(path)
+    port = os.getenv(METRICS_PORT_ENV)
+    if port:
+        try:
+            start_metrics_server(request_log.metrics, int(port))
+        except OSError as e:
+            print(f"⚠️ 지표 엔드포인트를 열지 못했습니다 (포트 {port}): {e}")
+    return request_log